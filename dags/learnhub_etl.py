@@ -0,0 +1,103 @@
+"""
+LearnHub ETL DAG - PostgreSQL / MongoDB → GCS
+每個資料表 / collection 是一個動態映射 (dynamic task mapping) 的獨立任務：
+- 以 pool 限制同時連線到資料庫的任務數
+- 失敗重試只重跑該資料表，不會重跑整個迴圈
+- 每個任務透過 XCom 回報筆數、檔案大小與耗時
+"""
+import sys
+from datetime import datetime, timedelta
+
+from airflow.decorators import dag, task
+
+# scripts/ 掛載於容器內的 /opt/airflow/scripts
+# 資料庫連線由 common/db.py 依 compose.yaml 設定的環境變數建立，同一 worker 行程內重用
+sys.path.insert(0, '/opt/airflow/scripts')
+sys.path.insert(0, '/opt/airflow/scripts/etl')
+
+# 資料庫連線池（需先以 `airflow pools set` 建立，見 compose.yaml 的 airflow-init）
+POSTGRES_POOL = 'learnhub_postgres'
+MONGODB_POOL = 'learnhub_mongodb'
+
+# 預設參數
+default_args = {
+    'owner': 'learnhub',
+    'depends_on_past': False,
+    'email_on_failure': False,
+    'email_on_retry': False,
+    'retries': 3,
+    'retry_delay': timedelta(minutes=2),
+    'retry_exponential_backoff': True,
+}
+
+
+@dag(
+    dag_id='learnhub_etl',
+    default_args=default_args,
+    description='PostgreSQL / MongoDB 每日抽取到 GCS（每表一個任務）',
+    schedule='@daily',
+    start_date=datetime(2024, 1, 1),
+    catchup=False,
+    max_active_runs=1,
+    tags=['etl', 'gcs'],
+)
+def learnhub_etl():
+
+    @task
+    def list_tables():
+        from extract_postgres_to_gcs import TABLES
+        return TABLES
+
+    @task
+    def list_collections():
+        from extract_mongodb_to_gcs import COLLECTIONS
+        return list(COLLECTIONS)
+
+    @task(pool=POSTGRES_POOL)
+    def extract_postgres_table(table):
+        from common.db import pg_connection
+        from extract_postgres_to_gcs import process_table
+
+        with pg_connection() as conn:
+            return process_table(conn, table)
+
+    @task(pool=MONGODB_POOL)
+    def extract_mongodb_collection(collection):
+        from common.db import get_mongo_db
+        from extract_mongodb_to_gcs import process_collection
+
+        return process_collection(get_mongo_db(), collection)
+
+    @task(trigger_rule='all_done')
+    def summarize(pg_results, mongo_results):
+        """彙整所有任務的 XCom，依耗時排序找出瓶頸"""
+        results = [r for r in list(pg_results) + list(mongo_results) if r]
+
+        print("=" * 60)
+        print("ETL 完成總結（依耗時排序）")
+        print("=" * 60)
+        for r in sorted(results, key=lambda r: r['duration_seconds'], reverse=True):
+            throughput = r['rows'] / r['duration_seconds'] if r['duration_seconds'] else 0
+            note = "（未變更，沿用上次檔案）" if r.get('status') == 'unchanged' else ""
+            print(f"  {r['table']}: {r['rows']:,} 筆, {r['bytes'] / 1024 / 1024:.2f} MB, "
+                  f"{r['duration_seconds']:.1f}s ({throughput:,.0f} 筆/s){note}")
+            stages = r.get('metrics', {}).get('stage_seconds', {})
+            if stages:
+                print("    " + ", ".join(f"{k} {v:.1f}s" for k, v in stages.items()))
+
+        if results:
+            slowest = max(results, key=lambda r: r['duration_seconds'])
+            print(f"\n🐢 最慢：{slowest['table']} ({slowest['duration_seconds']:.1f}s)")
+
+        return {
+            'tables': len(results),
+            'rows': sum(r['rows'] for r in results),
+            'bytes': sum(r['bytes'] for r in results),
+        }
+
+    pg_results = extract_postgres_table.expand(table=list_tables())
+    mongo_results = extract_mongodb_collection.expand(collection=list_collections())
+    summarize(pg_results, mongo_results)
+
+
+learnhub_etl()
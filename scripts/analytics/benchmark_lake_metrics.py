@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+資料湖報表指標效能測試
+以抽取下來的 Parquet 為基礎，將事實表複製成 N 倍（主鍵與外鍵加上偏移量，維持參照關係），
+量測各引擎在不同資料量下的延遲；可選擇同時量測 PostgreSQL 視圖（僅原始資料量）
+
+用法：
+    python scripts/analytics/benchmark_lake_metrics.py --source ./data_lake/raw/ --scale-factors 1 2 4 8
+    python scripts/analytics/benchmark_lake_metrics.py --engines arrow duckdb --pg --output bench.json
+"""
+
+import sys
+import json
+import time
+import logging
+import argparse
+import statistics
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from lake_metrics import (DEFAULT_SOURCE, ARROW_METRICS, CROSSCHECK, load_tables, run_metrics, duckdb)
+
+logger = logging.getLogger(__name__)
+
+# ============================================
+# 放大規則：資料表 → {欄位: 該欄位參照的資料表}
+# 每一份複本的鍵加上「被參照資料表的最大鍵 × 複本編號」；維度表（課程、方案等）不放大
+# ============================================
+SCALE_KEYS = {
+    'users': {'user_id': 'users'},
+    'subscriptions': {'subscription_id': 'subscriptions', 'user_id': 'users'},
+    'payments': {'payment_id': 'payments', 'subscription_id': 'subscriptions', 'user_id': 'users'},
+    'course_enrollments': {'enrollment_id': 'course_enrollments', 'user_id': 'users'},
+}
+
+# 各資料表的主鍵（計算偏移量用）
+PRIMARY_KEYS = {
+    'users': 'user_id',
+    'subscriptions': 'subscription_id',
+    'payments': 'payment_id',
+    'course_enrollments': 'enrollment_id',
+}
+
+
+def scale_tables(tables, factor):
+    """回傳放大 factor 倍的資料表（factor=1 時直接回傳原資料）"""
+    if factor == 1:
+        return tables
+
+    max_keys = {name: pc.max(tables[name][pk]).as_py() or 0 for name, pk in PRIMARY_KEYS.items()}
+    scaled = dict(tables)
+    for name, key_columns in SCALE_KEYS.items():
+        base = tables[name]
+        copies = []
+        for i in range(factor):
+            copy = base
+            for column, referenced in key_columns.items():
+                idx = copy.schema.get_field_index(column)
+                offset = pa.scalar(max_keys[referenced] * i, type=pa.int64())
+                shifted = pc.add(pc.cast(copy.column(idx), pa.int64()), offset)
+                copy = copy.set_column(idx, column, shifted)
+            copies.append(copy)
+        scaled[name] = pa.concat_tables(copies)
+    return scaled
+
+
+def time_engine(tables, engine, repeat):
+    """每個指標執行 repeat 次，回傳 {指標: 中位數毫秒}"""
+    samples = {metric: [] for metric in ARROW_METRICS}
+    for _ in range(repeat):
+        for metric, (_, seconds) in run_metrics(tables, engine).items():
+            samples[metric].append(seconds * 1000)
+    return {metric: round(statistics.median(values), 2) for metric, values in samples.items()}
+
+
+def time_postgres_views(repeat):
+    """量測 PostgreSQL 視圖的查詢時間（含傳輸結果）"""
+    from common.db import pg_connection, close_all
+
+    timings = {}
+    with pg_connection() as conn:
+        with conn.cursor() as cursor:
+            for metric, (view, _, _) in CROSSCHECK.items():
+                samples = []
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    cursor.execute(f"SELECT * FROM {view};")
+                    cursor.fetchall()
+                    samples.append((time.perf_counter() - started) * 1000)
+                timings[metric] = round(statistics.median(samples), 2)
+    close_all()
+    return timings
+
+# ============================================
+# 主程式
+# ============================================
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='資料湖報表指標效能測試')
+    parser.add_argument('--source', default=DEFAULT_SOURCE,
+                        help='Parquet 根目錄（本地路徑或 gs://bucket/prefix/）')
+    parser.add_argument('--date', help='指定抽取日期（YYYYMMDD），預設使用最新檔案')
+    parser.add_argument('--scale-factors', nargs='+', type=int, default=[1, 2, 4, 8])
+    parser.add_argument('--engines', nargs='+', choices=['arrow', 'duckdb'], default=['arrow', 'duckdb'])
+    parser.add_argument('--repeat', type=int, default=3, help='每個指標重複次數（取中位數）')
+    parser.add_argument('--pg', action='store_true', help='同時量測 PostgreSQL 視圖（原始資料量）')
+    parser.add_argument('--output', help='將結果寫入 JSON 檔案')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    engines = args.engines
+    if 'duckdb' in engines and duckdb is None:
+        logger.warning("⚠️  未安裝 duckdb，略過 duckdb 引擎")
+        engines = [e for e in engines if e != 'duckdb']
+
+    base = load_tables(args.source, args.date)
+    results = []
+
+    for factor in args.scale_factors:
+        tables = scale_tables(base, factor)
+        rows = sum(t.num_rows for t in tables.values())
+        for engine in engines:
+            timings = time_engine(tables, engine, args.repeat)
+            results.append({'scale_factor': factor, 'engine': engine, 'rows': rows, 'ms': timings})
+            logger.info(f"SF {factor:>3} {engine:<7} {rows:>12,} 筆  " +
+                        "  ".join(f"{m} {ms:,.1f} ms" for m, ms in timings.items()))
+
+    if args.pg:
+        timings = time_postgres_views(args.repeat)
+        results.append({'scale_factor': 1, 'engine': 'postgres_views', 'ms': timings})
+        logger.info("SF   1 postgres " + "  ".join(f"{m} {ms:,.1f} ms" for m, ms in timings.items()))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'source': args.source, 'results': results}, f, ensure_ascii=False, indent=2)
+        logger.info(f"📝 結果已寫入：{args.output}")
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
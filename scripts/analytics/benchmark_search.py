@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+課程 / 評論搜尋延遲測試
+從全部課程與評論中抽樣查詢字串（固定 seed），比較 course_search 與原本的查詢方式：
+- zh     ：2–4 個中文字的子字串
+  - 課程：search_zh 片語比對  vs  title / description ILIKE（循序掃描）
+  - 評論：search_terms $all     vs  title / comment $regex
+- zh_char：單一中文字（課程走 pg_trgm 後備查詢）
+- en     ：標題中的英文單字
+  - 課程：search_en             vs  to_tsvector('english', title / description) 逐列計算
+  - 評論：search_terms $all     vs  $text 索引
+
+每種查詢回報 p50 / p95 延遲（毫秒）與平均命中筆數（上限 --limit）。
+
+用法：
+    python scripts/analytics/benchmark_search.py
+    python scripts/analytics/benchmark_search.py --queries 200 --output search.json
+"""
+
+import re
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import statistics
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from common.db import pg_connection, get_mongo_db, close_all
+from common.search_text import CJK_RUN
+from course_search import DEFAULT_LIMIT, search_courses, search_reviews, like_pattern
+
+logger = logging.getLogger(__name__)
+
+QUERY_KINDS = ('zh', 'zh_char', 'en')
+ENGLISH_WORD = re.compile(r'[A-Za-z]{4,}')
+
+# ============================================
+# 抽樣查詢
+# ============================================
+def sample_queries(texts, count, rng):
+    """由文字樣本抽出各類查詢字串，回傳 {類型: [查詢]}"""
+    cjk_runs = [run for text in texts for run in CJK_RUN.findall(text or '') if len(run) >= 2]
+    words = [word for text in texts for word in ENGLISH_WORD.findall(text or '')]
+
+    queries = {kind: [] for kind in QUERY_KINDS}
+    for _ in range(count if cjk_runs else 0):
+        run = rng.choice(cjk_runs)
+        length = rng.randint(2, min(4, len(run)))
+        start = rng.randint(0, len(run) - length)
+        queries['zh'].append(run[start:start + length])
+        queries['zh_char'].append(rng.choice(run))
+    for _ in range(count if words else 0):
+        queries['en'].append(rng.choice(words).lower())
+    return queries
+
+
+def percentiles(samples):
+    ordered = sorted(samples)
+    return {
+        'p50_ms': round(statistics.median(ordered), 2),
+        'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 2),
+    }
+
+
+def measure(func, queries):
+    """依序執行查詢，回傳延遲百分位數與平均命中筆數"""
+    samples, hits = [], []
+    for query in queries:
+        started = time.perf_counter()
+        hits.append(len(func(query)))
+        samples.append((time.perf_counter() - started) * 1000)
+    result = percentiles(samples)
+    result['avg_hits'] = round(sum(hits) / len(hits), 1)
+    return result
+
+# ============================================
+# 原本的查詢方式（對照組）
+# ============================================
+def baseline_courses(cursor, kind, limit):
+    if kind == 'en':
+        def run(query):
+            cursor.execute("""
+                SELECT course_id FROM courses
+                WHERE is_published
+                  AND (to_tsvector('english', title) @@ plainto_tsquery('english', %s)
+                       OR to_tsvector('english', description) @@ plainto_tsquery('english', %s))
+                LIMIT %s;
+            """, (query, query, limit))
+            return cursor.fetchall()
+    else:
+        def run(query):
+            pattern = like_pattern(query)
+            # 以 Seq Scan 模擬沒有 pg_trgm 索引時的 ILIKE
+            cursor.execute("SET LOCAL enable_bitmapscan = off;")
+            cursor.execute("""
+                SELECT course_id FROM courses
+                WHERE is_published AND (title ILIKE %s OR description ILIKE %s)
+                LIMIT %s;
+            """, (pattern, pattern, limit))
+            rows = cursor.fetchall()
+            cursor.execute("RESET enable_bitmapscan;")
+            return rows
+    return run
+
+
+def baseline_reviews(collection, kind, limit):
+    if kind == 'en':
+        return lambda query: list(collection.find({'$text': {'$search': query}}, {'_id': 1}).limit(limit))
+    return lambda query: list(collection.find(
+        {'$or': [{'title': {'$regex': re.escape(query)}}, {'comment': {'$regex': re.escape(query)}}]},
+        {'_id': 1}).limit(limit))
+
+# ============================================
+# 量測
+# ============================================
+def benchmark_courses(queries_per_kind, limit, rng):
+    results = []
+    with pg_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT title, description FROM courses ORDER BY course_id;")
+            texts = [text for row in cursor.fetchall() for text in row]
+            queries = sample_queries(texts, queries_per_kind, rng)
+
+            for kind in QUERY_KINDS:
+                if not queries[kind]:
+                    continue
+                methods = {'search': lambda q: search_courses(conn, q, limit)}
+                if kind != 'zh_char':
+                    methods['baseline'] = baseline_courses(cursor, kind, limit)
+                for method, func in methods.items():
+                    results.append(dict(target='courses', kind=kind, method=method, **measure(func, queries[kind])))
+        conn.rollback()
+    return results
+
+
+def benchmark_reviews(queries_per_kind, limit, rng, sample_size):
+    db = get_mongo_db()
+    collection = db.course_reviews
+    docs = collection.aggregate([{'$sample': {'size': sample_size}}, {'$project': {'title': 1, 'comment': 1}}])
+    texts = [text for doc in docs for text in (doc.get('title'), doc.get('comment'))]
+    queries = sample_queries(texts, queries_per_kind, rng)
+
+    results = []
+    for kind in ('zh', 'en'):
+        if not queries[kind]:
+            continue
+        methods = {
+            'search': lambda q: search_reviews(db, q, limit),
+            'baseline': baseline_reviews(collection, kind, limit),
+        }
+        for method, func in methods.items():
+            results.append(dict(target='reviews', kind=kind, method=method, **measure(func, queries[kind])))
+    return results
+
+# ============================================
+# 主程式
+# ============================================
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='課程 / 評論搜尋延遲測試')
+    parser.add_argument('--queries', type=int, default=100, help='每種查詢的數量')
+    parser.add_argument('--limit', type=int, default=DEFAULT_LIMIT)
+    parser.add_argument('--review-sample', type=int, default=2000, help='抽樣評論數（產生查詢字串用）')
+    parser.add_argument('--targets', nargs='+', choices=['courses', 'reviews'], default=['courses', 'reviews'])
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', help='將結果寫入 JSON 檔案')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    rng = random.Random(args.seed)
+
+    results = []
+    try:
+        if 'courses' in args.targets:
+            results += benchmark_courses(args.queries, args.limit, rng)
+        if 'reviews' in args.targets:
+            results += benchmark_reviews(args.queries, args.limit, rng, args.review_sample)
+    finally:
+        close_all()
+
+    logger.info(f"  {'對象':<8} {'查詢':<8} {'方式':<9} {'p50 ms':>9} {'p95 ms':>9} {'平均命中':>8}")
+    for r in results:
+        logger.info(f"  {r['target']:<8} {r['kind']:<8} {r['method']:<9} "
+                    f"{r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} {r['avg_hits']:>8.1f}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'queries': args.queries, 'limit': args.limit, 'results': results},
+                      f, ensure_ascii=False, indent=2)
+        logger.info(f"📝 結果已寫入：{args.output}")
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
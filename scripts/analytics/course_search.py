@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+課程與評論搜尋
+- 課程（PostgreSQL，需先執行 scripts/sql/04_create_search.sql）：
+  - 含中文的查詢：search_zh（CJK 二字組）以片語比對，'資料工程' → 資料 <-> 料工 <-> 工程
+  - 其他查詢    ：search_en（english 詞幹）以 websearch_to_tsquery 比對
+  - 以 ts_rank_cd 排序（標題權重 A > 描述 B）；全文檢索沒有結果時（單一中文字、拼錯字）
+    改用 pg_trgm：子字串 ILIKE 或 word_similarity（<%，門檻 pg_trgm.word_similarity_threshold），以相似度排序
+- 評論（MongoDB course_reviews）：
+  - search_terms 陣列（common.search_text 切分的二字組與英文單字，多鍵索引）以 $all 比對
+  - 分數 = 標題含完整查詢字串 2 分 + 評論含完整查詢字串 1 分 + ln(有幫助數 + 1) / 10
+
+既有評論需先以 --backfill-reviews 補上 search_terms；generate_mongodb_data.py 新生成的評論已包含。
+
+用法：
+    python scripts/analytics/course_search.py courses 資料工程
+    python scripts/analytics/course_search.py courses "machine learning" --language en-US
+    python scripts/analytics/course_search.py reviews 非常實用 --course-id 42
+    python scripts/analytics/course_search.py --backfill-reviews
+
+    from course_search import search_courses, search_reviews
+    with pg_connection() as conn:
+        search_courses(conn, '資料工程', limit=10)
+"""
+
+import re
+import sys
+import time
+import logging
+import argparse
+from pathlib import Path
+
+from pymongo import UpdateOne
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from common.db import pg_connection, get_mongo_db, close_all
+from common.search_text import CJK_RUN, WORD, cjk_bigrams, contains_cjk, search_terms, query_terms
+
+# 設定日誌
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# ============================================
+# 配置
+# ============================================
+DEFAULT_LIMIT = 20
+
+BACKFILL_BATCH = 1000
+
+# ============================================
+# 課程（PostgreSQL）
+# ============================================
+def quote_lexeme(term):
+    return "'" + term.replace('\\', '\\\\').replace("'", "''") + "'"
+
+
+def zh_tsquery(query):
+    """
+    含中文的查詢 → to_tsquery('simple', ...) 的查詢字串
+    每段 CJK 文字為二字組片語（<->），與英文單字以 & 連接：
+    '資料工程 Python' → ('資料' <-> '料工' <-> '工程') & ('python')
+    """
+    parts = []
+    position = 0
+    for match in CJK_RUN.finditer(query):
+        parts.extend(quote_lexeme(word.lower()) for word in WORD.findall(query, position, match.start()))
+        parts.append(' <-> '.join(quote_lexeme(bigram) for bigram in cjk_bigrams(match.group())))
+        position = match.end()
+    parts.extend(quote_lexeme(word.lower()) for word in WORD.findall(query, position))
+    return ' & '.join(f"({part})" for part in parts)
+
+
+def like_pattern(query):
+    """ILIKE 子字串樣式（跳脫 %、_、\\）"""
+    return '%' + re.sub(r'([%_\\])', r'\\\1', query) + '%'
+
+
+def course_filters(language, published_only):
+    clauses, params = [], []
+    if language:
+        clauses.append("language = %s")
+        params.append(language)
+    if published_only:
+        clauses.append("is_published")
+    return ''.join(f" AND {clause}" for clause in clauses), params
+
+
+def search_courses(conn, query, limit=DEFAULT_LIMIT, language=None, published_only=True):
+    """
+    搜尋課程，回傳依相關度排序的 [{course_id, title, language, rank, match}]
+    match：'zh' / 'en'（全文檢索）或 'trigram'（後備的子字串 / 相似度比對）
+    """
+    query = query.strip()
+    if not query:
+        return []
+    filters, filter_params = course_filters(language, published_only)
+
+    if contains_cjk(query):
+        match, column, tsquery = 'zh', 'search_zh', "to_tsquery('simple', %s)"
+        tsquery_param = zh_tsquery(query)
+    else:
+        match, column, tsquery = 'en', 'search_en', "websearch_to_tsquery('english', %s)"
+        tsquery_param = query
+
+    with conn.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT course_id, title, language, ts_rank_cd({column}, q) AS rank
+            FROM courses, {tsquery} AS q
+            WHERE {column} @@ q{filters}
+            ORDER BY rank DESC, course_id
+            LIMIT %s;
+        """, [tsquery_param] + filter_params + [limit])
+        rows = cursor.fetchall()
+
+        if not rows:
+            match = 'trigram'
+            pattern = like_pattern(query)
+            cursor.execute(f"""
+                SELECT course_id, title, language,
+                       GREATEST(word_similarity(%s, title), word_similarity(%s, description) * 0.5) AS rank
+                FROM courses
+                WHERE (title ILIKE %s OR description ILIKE %s OR %s <%% title){filters}
+                ORDER BY rank DESC, course_id
+                LIMIT %s;
+            """, [query, query, pattern, pattern, query] + filter_params + [limit])
+            rows = cursor.fetchall()
+
+    return [
+        {'course_id': course_id, 'title': title, 'language': lang, 'rank': float(rank), 'match': match}
+        for course_id, title, lang, rank in rows
+    ]
+
+# ============================================
+# 評論（MongoDB）
+# ============================================
+def ensure_review_search(collection):
+    collection.create_index('search_terms')
+
+
+def backfill_review_terms(collection, batch_size=BACKFILL_BATCH):
+    """為沒有 search_terms 的評論補上搜尋詞，回傳更新筆數"""
+    cursor = collection.find({'search_terms': {'$exists': False}},
+                             {'title': 1, 'comment': 1}).sort('_id', 1)
+    updated = 0
+    operations = []
+    for doc in cursor:
+        terms = search_terms(doc.get('title'), doc.get('comment'))
+        operations.append(UpdateOne({'_id': doc['_id']}, {'$set': {'search_terms': terms}}))
+        if len(operations) >= batch_size:
+            updated += collection.bulk_write(operations, ordered=False).modified_count
+            operations = []
+    if operations:
+        updated += collection.bulk_write(operations, ordered=False).modified_count
+    return updated
+
+
+def contains_phrase(field, pattern):
+    return {'$cond': [{'$regexMatch': {'input': {'$ifNull': [field, '']}, 'regex': pattern, 'options': 'i'}}, 1, 0]}
+
+
+def search_reviews(db, query, limit=DEFAULT_LIMIT, course_id=None):
+    """
+    搜尋評論，回傳依分數排序的 [{review_id, course_id, rating, title, comment, helpful_count, score}]
+    所有搜尋詞都需出現（$all 走 search_terms 索引），完整查詢字串出現在標題 / 評論時加分
+    """
+    terms = query_terms(query.strip())
+    if not terms:
+        return []
+
+    match = {'search_terms': {'$all': terms}}
+    if course_id is not None:
+        match['course_id'] = course_id
+    pattern = re.escape(query.strip())
+
+    pipeline = [
+        {'$match': match},
+        {'$set': {'score': {'$add': [
+            {'$multiply': [2, contains_phrase('$title', pattern)]},
+            contains_phrase('$comment', pattern),
+            {'$divide': [{'$ln': {'$add': [{'$ifNull': ['$helpful_count', 0]}, 1]}}, 10]},
+        ]}}},
+        {'$sort': {'score': -1, 'helpful_count': -1, 'review_id': 1}},
+        {'$limit': limit},
+        {'$project': {'_id': 0, 'review_id': 1, 'course_id': 1, 'rating': 1, 'title': 1,
+                      'comment': 1, 'helpful_count': 1, 'score': 1}},
+    ]
+    return list(db.course_reviews.aggregate(pipeline))
+
+# ============================================
+# 主程式
+# ============================================
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='課程與評論搜尋')
+    parser.add_argument('target', nargs='?', choices=['courses', 'reviews'])
+    parser.add_argument('query', nargs='?')
+    parser.add_argument('--limit', type=int, default=DEFAULT_LIMIT)
+    parser.add_argument('--language', help='課程語言（zh-TW / zh-CN / en-US）')
+    parser.add_argument('--include-unpublished', action='store_true', help='課程搜尋包含未發布課程')
+    parser.add_argument('--course-id', type=int, help='只搜尋指定課程的評論')
+    parser.add_argument('--backfill-reviews', action='store_true', help='為既有評論補上 search_terms 並建立索引')
+    args = parser.parse_args(argv)
+    if not args.backfill_reviews and not (args.target and args.query):
+        parser.error('需指定 courses / reviews 與查詢字串，或使用 --backfill-reviews')
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    try:
+        if args.backfill_reviews:
+            db = get_mongo_db()
+            started = time.perf_counter()
+            updated = backfill_review_terms(db.course_reviews)
+            ensure_review_search(db.course_reviews)
+            logger.info(f"✅ 已補上 {updated:,} 筆評論的 search_terms（{time.perf_counter() - started:.1f}s）")
+            if not args.target:
+                return 0
+
+        started = time.perf_counter()
+        if args.target == 'courses':
+            with pg_connection() as conn:
+                results = search_courses(conn, args.query, args.limit, args.language,
+                                         published_only=not args.include_unpublished)
+                conn.rollback()
+        else:
+            results = search_reviews(get_mongo_db(), args.query, args.limit, args.course_id)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        logger.info(f"🔎 {args.target}「{args.query}」：{len(results)} 筆（{elapsed_ms:.1f} ms）")
+        for r in results:
+            if args.target == 'courses':
+                logger.info(f"  {r['rank']:.4f} [{r['match']}] #{r['course_id']} ({r['language']}) {r['title']}")
+            else:
+                logger.info(f"  {r['score']:.2f} {r['review_id']} 課程 #{r['course_id']} ★{r['rating']} "
+                            f"{r['title']}｜{r['comment'][:40]}")
+
+    except Exception as e:
+        logger.error(f"❌ 搜尋失敗：{e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+    finally:
+        close_all()
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+user_events 預先彙總（rollup）
+以 $merge 維護小型彙總 collection，儀表板查詢直接讀取彙總結果，不必每次對全部事件執行 $group：
+- rollup_event_type_hourly ：每小時 × 事件類型
+- rollup_event_type_daily  ：每日 × 事件類型
+- rollup_course_daily      ：每日 × 課程 × 事件類型（僅含 properties.course_id 的事件）
+- rollup_country_daily     ：每日 × 國家 × 事件類型
+
+增量更新：rollup_state 記錄每個彙總已處理到的最後一個時間區間（水位）。
+每次執行只重新計算「水位所在區間」之後的事件，整個區間重算後以 whenMatched: 'replace' 覆寫，
+重複執行結果不變。水位之前才寫入的延遲事件不會被納入，需以 --rebuild 或 --since 重算。
+
+用法：
+    python scripts/analytics/event_rollups.py                     # 增量更新
+    python scripts/analytics/event_rollups.py --rebuild           # 全部重算
+    python scripts/analytics/event_rollups.py --since 2024-01-01  # 重算指定日期之後
+    python scripts/analytics/event_rollups.py --compare           # 比較原始 $group 與 rollup 查詢時間
+
+    from event_rollups import event_type_distribution
+    event_type_distribution(db, start=datetime(2024, 1, 1))
+"""
+
+import sys
+import time
+import logging
+import argparse
+from datetime import datetime
+from pathlib import Path
+
+from pymongo import ASCENDING
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from common.db import get_mongo_db, close_all
+
+# 設定日誌
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# ============================================
+# Rollup 定義：名稱 → collection、時間粒度、維度（欄位 → 事件中的路徑）
+# ============================================
+ROLLUPS = {
+    'event_type_hourly': {
+        'collection': 'rollup_event_type_hourly',
+        'unit': 'hour',
+        'dimensions': {'event_type': '$event_type'},
+    },
+    'event_type_daily': {
+        'collection': 'rollup_event_type_daily',
+        'unit': 'day',
+        'dimensions': {'event_type': '$event_type'},
+    },
+    'course_daily': {
+        'collection': 'rollup_course_daily',
+        'unit': 'day',
+        'dimensions': {'course_id': '$properties.course_id', 'event_type': '$event_type'},
+        'match': {'properties.course_id': {'$ne': None}},
+    },
+    'country_daily': {
+        'collection': 'rollup_country_daily',
+        'unit': 'day',
+        'dimensions': {'country': '$location.country', 'event_type': '$event_type'},
+    },
+}
+
+STATE_COLLECTION = 'rollup_state'
+
+# ============================================
+# 增量更新
+# ============================================
+def truncate(ts, unit):
+    """將時間截斷到所屬區間的起點"""
+    if unit == 'hour':
+        return ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def ensure_indexes(db):
+    """彙總 collection 依時間區間查詢，維度欄位用於篩選"""
+    for rollup in ROLLUPS.values():
+        collection = db[rollup['collection']]
+        collection.create_index([('bucket', ASCENDING)])
+        for dimension in rollup['dimensions']:
+            if dimension != 'event_type':
+                collection.create_index([(dimension, ASCENDING), ('bucket', ASCENDING)])
+
+
+def rollup_pipeline(rollup, start):
+    """從 start（含）起重算各時間區間，並以 $merge 覆寫對應的彙總文件"""
+    match = {'timestamp': {'$gte': start}} if start else {}
+    match.update(rollup.get('match', {}))
+
+    group_id = {'bucket': {'$dateTrunc': {'date': '$timestamp', 'unit': rollup['unit']}}}
+    group_id.update(rollup['dimensions'])
+
+    # 維度值同時放在頂層欄位，查詢與索引不必走 _id 子欄位
+    fields = {'bucket': '$_id.bucket'}
+    fields.update({dimension: f"$_id.{dimension}" for dimension in rollup['dimensions']})
+
+    return [
+        {'$match': match},
+        {'$group': {'_id': group_id, 'count': {'$sum': 1}}},
+        {'$set': fields},
+        {'$merge': {
+            'into': rollup['collection'],
+            'on': '_id',
+            'whenMatched': 'replace',
+            'whenNotMatched': 'insert',
+        }},
+    ]
+
+
+def update_rollup(db, name, since=None, rebuild=False):
+    """更新單一 rollup，回傳 (處理起點, 新水位, 秒數)"""
+    rollup = ROLLUPS[name]
+    state = db[STATE_COLLECTION].find_one({'_id': name})
+
+    if rebuild:
+        db[rollup['collection']].delete_many({})
+        start = None
+    elif since is not None:
+        start = truncate(since, rollup['unit'])
+        db[rollup['collection']].delete_many({'bucket': {'$gte': start}})
+    else:
+        # 水位所在區間可能尚未完整，從該區間起點重算
+        start = state['watermark'] if state else None
+
+    latest = db.user_events.find_one({}, {'timestamp': 1}, sort=[('timestamp', -1)])
+    if latest is None:
+        return start, None, 0.0
+
+    started = time.monotonic()
+    db.user_events.aggregate(rollup_pipeline(rollup, start), allowDiskUse=True)
+    elapsed = time.monotonic() - started
+
+    watermark = truncate(latest['timestamp'], rollup['unit'])
+    if state is None or rebuild or since is not None or watermark > state['watermark']:
+        db[STATE_COLLECTION].update_one(
+            {'_id': name},
+            {'$set': {'watermark': watermark, 'updated_at': datetime.utcnow()}},
+            upsert=True,
+        )
+    return start, watermark, elapsed
+
+# ============================================
+# 查詢 API（儀表板使用）
+# ============================================
+def _bucket_match(start=None, end=None):
+    """bucket 區間條件：start（含）到 end（不含）"""
+    bucket = {}
+    if start is not None:
+        bucket['$gte'] = start
+    if end is not None:
+        bucket['$lt'] = end
+    return {'bucket': bucket} if bucket else {}
+
+
+def _sum_by(db, name, keys, match, limit=None):
+    pipeline = [
+        {'$match': match},
+        {'$group': {'_id': {key: f"${key}" for key in keys}, 'count': {'$sum': '$count'}}},
+        {'$sort': {'count': -1}},
+    ]
+    if limit:
+        pipeline.append({'$limit': limit})
+    return [{**doc['_id'], 'count': doc['count']}
+            for doc in db[ROLLUPS[name]['collection']].aggregate(pipeline)]
+
+
+def event_type_distribution(db, start=None, end=None, limit=10):
+    """事件類型分布：[{'event_type', 'count'}]，依數量遞減"""
+    return _sum_by(db, 'event_type_daily', ['event_type'], _bucket_match(start, end), limit)
+
+
+def event_type_timeseries(db, start=None, end=None, unit='day', event_types=None):
+    """各時間區間 × 事件類型的事件數：[{'bucket', 'event_type', 'count'}]，依時間排序"""
+    match = _bucket_match(start, end)
+    if event_types:
+        match['event_type'] = {'$in': list(event_types)}
+    collection = db[ROLLUPS[f"event_type_{'hourly' if unit == 'hour' else 'daily'}"]['collection']]
+    return list(collection.find(match, {'_id': 0}).sort([('bucket', ASCENDING), ('event_type', ASCENDING)]))
+
+
+def course_activity(db, start=None, end=None, course_ids=None, event_types=None, limit=20):
+    """課程 × 事件類型的事件數：[{'course_id', 'event_type', 'count'}]，依數量遞減"""
+    match = _bucket_match(start, end)
+    if course_ids:
+        match['course_id'] = {'$in': list(course_ids)}
+    if event_types:
+        match['event_type'] = {'$in': list(event_types)}
+    return _sum_by(db, 'course_daily', ['course_id', 'event_type'], match, limit)
+
+
+def country_distribution(db, start=None, end=None, event_types=None):
+    """國家分布：[{'country', 'count'}]，依數量遞減"""
+    match = _bucket_match(start, end)
+    if event_types:
+        match['event_type'] = {'$in': list(event_types)}
+    return _sum_by(db, 'country_daily', ['country'], match)
+
+
+def rollup_watermarks(db):
+    """各 rollup 的水位：{名稱: datetime}；尚未建立的 rollup 不在結果中"""
+    return {doc['_id']: doc['watermark'] for doc in db[STATE_COLLECTION].find()}
+
+# ============================================
+# 查詢時間比較
+# ============================================
+def compare_with_raw(db):
+    """以事件類型分布為例，比較對原始事件執行 $group 與讀取 rollup 的時間"""
+    started = time.perf_counter()
+    raw = list(db.user_events.aggregate([
+        {'$group': {'_id': '$event_type', 'count': {'$sum': 1}}},
+        {'$sort': {'count': -1}},
+        {'$limit': 10},
+    ]))
+    raw_ms = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    rolled = event_type_distribution(db)
+    rollup_ms = (time.perf_counter() - started) * 1000
+
+    matched = {d['_id']: d['count'] for d in raw} == {d['event_type']: d['count'] for d in rolled}
+    logger.info(f"⏱️  原始 $group：{raw_ms:,.1f} ms；rollup：{rollup_ms:,.1f} ms"
+                f"（{raw_ms / rollup_ms if rollup_ms else 0:,.0f}×）")
+    logger.info(f"  結果一致：{'✅' if matched else '❌（rollup 可能尚未更新）'}")
+    return matched
+
+# ============================================
+# 主程式
+# ============================================
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='user_events 預先彙總')
+    parser.add_argument('--rollups', nargs='+', choices=list(ROLLUPS), default=list(ROLLUPS))
+    parser.add_argument('--since', type=lambda s: datetime.strptime(s, '%Y-%m-%d'),
+                        help='重算此日期（YYYY-MM-DD）之後的區間')
+    parser.add_argument('--rebuild', action='store_true', help='清空並全部重算')
+    parser.add_argument('--compare', action='store_true', help='更新後比較原始 $group 與 rollup 查詢時間')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    logger.info("=" * 60)
+    logger.info("user_events 預先彙總")
+    logger.info("=" * 60)
+
+    try:
+        db = get_mongo_db()
+        ensure_indexes(db)
+
+        for name in args.rollups:
+            start, watermark, elapsed = update_rollup(db, name, args.since, args.rebuild)
+            if watermark is None:
+                logger.warning(f"⚠️  {name}：user_events 沒有資料")
+                continue
+            size = db[ROLLUPS[name]['collection']].estimated_document_count()
+            logger.info(f"✅ {name}：自 {start or '最早'} 起重算，水位 {watermark}，"
+                        f"{size:,} 筆彙總，{elapsed:.1f}s")
+
+        if args.compare:
+            compare_with_raw(db)
+
+    except Exception as e:
+        logger.error(f"❌ 彙總失敗：{e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+    finally:
+        close_all()
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+"""
+Parquet 資料湖上的報表指標
+在 extract_postgres_to_gcs 產出的 Parquet 檔案上計算與 PostgreSQL 視圖相同的指標，
+不再對 OLTP 資料庫發送報表查詢：
+- v_monthly_revenue         → monthly_revenue()
+- v_popular_courses         → popular_courses()
+- v_user_learning_progress  → user_learning_progress()
+
+引擎：
+- arrow  ：pyarrow 的向量化 group_by / hash join（預設，不需額外套件）
+- duckdb ：將 Arrow Table 註冊到內嵌的 DuckDB，直接執行與視圖相同的 SQL（需 pip install duckdb）
+
+用法：
+    python scripts/analytics/lake_metrics.py --source ./data_lake/raw/
+    python scripts/analytics/lake_metrics.py --engine duckdb --output metrics.json
+    python scripts/analytics/lake_metrics.py --check     # 與 PostgreSQL 視圖交叉比對
+"""
+
+import sys
+import json
+import time
+import logging
+import argparse
+from decimal import Decimal
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'etl'))
+
+from profile_parquet import DEFAULT_SOURCE, resolve_table_files
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+# 設定日誌
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# ============================================
+# 各資料表需要讀取的欄位（只讀這些欄位）
+# ============================================
+TABLE_COLUMNS = {
+    'users': ['user_id', 'email', 'full_name', 'is_active'],
+    'subscriptions': ['subscription_id', 'user_id', 'plan_id'],
+    'subscription_plans': ['plan_id', 'plan_type'],
+    'payments': ['payment_id', 'subscription_id', 'user_id', 'amount', 'payment_status', 'paid_at'],
+    'courses': ['course_id', 'title', 'instructor_id', 'category_id', 'total_enrollments',
+                'average_rating', 'total_reviews', 'is_published'],
+    'instructors': ['instructor_id', 'full_name'],
+    'course_categories': ['category_id', 'category_name'],
+    'course_enrollments': ['enrollment_id', 'user_id', 'course_id', 'progress_percentage',
+                           'completed_at', 'total_watch_time_minutes', 'last_accessed_at'],
+}
+
+# 熱門課程排行筆數（與 v_popular_courses 的 LIMIT 相同）
+POPULAR_COURSES_LIMIT = 50
+
+# ============================================
+# 讀取
+# ============================================
+def decode_dictionaries(table):
+    """dictionary 欄位轉回一般型別（Acero hash join 不支援 dictionary 的非鍵欄位）"""
+    for idx, field in enumerate(table.schema):
+        if pa.types.is_dictionary(field.type):
+            table = table.set_column(idx, field.name, pc.cast(table.column(idx), field.type.value_type))
+    return table
+
+
+def load_tables(source=DEFAULT_SOURCE, date_str=None, tables=None):
+    """讀取各資料表最新（或指定日期）的 Parquet 檔案，回傳 {資料表: pa.Table}"""
+    fs, root = pafs.FileSystem.from_uri(source)
+    root = root.rstrip('/')
+
+    loaded = {}
+    for table_name in tables or TABLE_COLUMNS:
+        paths = resolve_table_files(fs, root, table_name, date_str)
+        if not paths:
+            raise FileNotFoundError(f"找不到 {table_name} 的 Parquet 檔案：{source}")
+        table = pq.read_table(paths, filesystem=fs, columns=TABLE_COLUMNS[table_name])
+        loaded[table_name] = decode_dictionaries(table)
+        logger.info(f"📂 {table_name}: {len(paths)} 個檔案，{table.num_rows:,} 筆記錄")
+    return loaded
+
+# ============================================
+# Arrow 引擎
+# ============================================
+def _as_float(column):
+    """decimal / 整數欄位轉為 float64（平均值與視圖比較時使用）"""
+    return pc.cast(column, pa.float64())
+
+
+def _round(column, digits=2):
+    return pc.round(column, ndigits=digits)
+
+
+def monthly_revenue(tables):
+    """v_monthly_revenue：每月 × 方案類型的付款人數、筆數、總額與平均金額"""
+    payments = tables['payments']
+    payments = payments.filter(pc.equal(payments['payment_status'], 'succeeded'))
+    payments = payments.append_column('revenue_month', pc.floor_temporal(payments['paid_at'], unit='month'))
+    payments = payments.append_column('amount_f', _as_float(payments['amount']))
+
+    joined = (payments
+              .join(tables['subscriptions'].select(['subscription_id', 'plan_id']), 'subscription_id')
+              .join(tables['subscription_plans'].select(['plan_id', 'plan_type']), 'plan_id'))
+
+    result = joined.group_by(['revenue_month', 'plan_type']).aggregate([
+        ('user_id', 'count_distinct'),
+        ('payment_id', 'count'),
+        ('amount', 'sum'),
+        ('amount_f', 'mean'),
+    ])
+    result = result.rename_columns({
+        'user_id_count_distinct': 'paying_users',
+        'payment_id_count': 'total_payments',
+        'amount_sum': 'total_revenue',
+        'amount_f_mean': 'avg_payment_amount',
+    })
+    result = result.select(['revenue_month', 'plan_type', 'paying_users', 'total_payments',
+                            'total_revenue', 'avg_payment_amount'])
+    return result.sort_by([('revenue_month', 'descending'), ('plan_type', 'ascending')])
+
+
+def popular_courses(tables, limit=POPULAR_COURSES_LIMIT):
+    """v_popular_courses：已發佈課程依 total_enrollments 排序（limit=None 時回傳全部）"""
+    courses = tables['courses']
+    courses = courses.filter(pc.equal(courses['is_published'], True))
+
+    enrollments = tables['course_enrollments']
+    enrollments = enrollments.append_column('progress_f', _as_float(enrollments['progress_percentage']))
+    per_course = enrollments.group_by('course_id').aggregate([
+        ('enrollment_id', 'count'),
+        ('progress_f', 'mean'),
+    ])
+
+    joined = (courses
+              .join(tables['instructors'].rename_columns({'full_name': 'instructor_name'}), 'instructor_id')
+              .join(tables['course_categories'], 'category_id')
+              .join(per_course, 'course_id', join_type='left outer'))
+
+    result = pa.table({
+        'course_id': joined['course_id'],
+        'title': joined['title'],
+        'instructor_name': joined['instructor_name'],
+        'category_name': joined['category_name'],
+        'total_enrollments': joined['total_enrollments'],
+        'average_rating': joined['average_rating'],
+        'total_reviews': joined['total_reviews'],
+        'active_students': pc.fill_null(joined['enrollment_id_count'], 0),
+        'avg_completion_rate': _round(joined['progress_f_mean']),
+    })
+    result = result.sort_by([('total_enrollments', 'descending'), ('course_id', 'ascending')])
+    return result.slice(0, limit) if limit else result
+
+
+def user_learning_progress(tables):
+    """v_user_learning_progress：啟用中用戶的註冊數、完成數、平均進度與觀看時數"""
+    users = tables['users']
+    users = users.filter(pc.equal(users['is_active'], True)).select(['user_id', 'email', 'full_name'])
+
+    enrollments = tables['course_enrollments']
+    enrollments = enrollments.append_column('progress_f', _as_float(enrollments['progress_percentage']))
+    per_user = enrollments.group_by('user_id').aggregate([
+        ('enrollment_id', 'count'),
+        ('completed_at', 'count'),
+        ('progress_f', 'mean'),
+        ('total_watch_time_minutes', 'sum'),
+        ('last_accessed_at', 'max'),
+    ])
+
+    joined = users.join(per_user, 'user_id', join_type='left outer')
+    result = pa.table({
+        'user_id': joined['user_id'],
+        'email': joined['email'],
+        'full_name': joined['full_name'],
+        'total_enrolled_courses': pc.fill_null(joined['enrollment_id_count'], 0),
+        'completed_courses': pc.fill_null(joined['completed_at_count'], 0),
+        'avg_progress_percentage': _round(joined['progress_f_mean']),
+        'total_watch_time_minutes': joined['total_watch_time_minutes_sum'],
+        'last_learning_activity': joined['last_accessed_at_max'],
+    })
+    return result.sort_by([('total_enrolled_courses', 'descending'), ('user_id', 'ascending')])
+
+
+ARROW_METRICS = {
+    'monthly_revenue': monthly_revenue,
+    'popular_courses': popular_courses,
+    'user_learning_progress': user_learning_progress,
+}
+
+# ============================================
+# DuckDB 引擎（SQL 與 03_create_views.sql 相同，另加排序鍵讓結果穩定）
+# ============================================
+DUCKDB_SQL = {
+    'monthly_revenue': """
+        SELECT
+            DATE_TRUNC('month', p.paid_at) AS revenue_month,
+            sp.plan_type,
+            COUNT(DISTINCT p.user_id) AS paying_users,
+            COUNT(p.payment_id) AS total_payments,
+            SUM(p.amount) AS total_revenue,
+            AVG(p.amount::DOUBLE) AS avg_payment_amount
+        FROM payments p
+        JOIN subscriptions s ON p.subscription_id = s.subscription_id
+        JOIN subscription_plans sp ON s.plan_id = sp.plan_id
+        WHERE p.payment_status = 'succeeded'
+        GROUP BY DATE_TRUNC('month', p.paid_at), sp.plan_type
+        ORDER BY revenue_month DESC, sp.plan_type
+    """,
+    'popular_courses': """
+        SELECT
+            c.course_id,
+            c.title,
+            i.full_name AS instructor_name,
+            cc.category_name,
+            c.total_enrollments,
+            c.average_rating,
+            c.total_reviews,
+            COUNT(ce.enrollment_id) AS active_students,
+            ROUND(AVG(ce.progress_percentage::DOUBLE), 2) AS avg_completion_rate
+        FROM courses c
+        JOIN instructors i ON c.instructor_id = i.instructor_id
+        JOIN course_categories cc ON c.category_id = cc.category_id
+        LEFT JOIN course_enrollments ce ON c.course_id = ce.course_id
+        WHERE c.is_published = TRUE
+        GROUP BY c.course_id, c.title, i.full_name, cc.category_name,
+                 c.total_enrollments, c.average_rating, c.total_reviews
+        ORDER BY c.total_enrollments DESC, c.course_id
+        LIMIT {limit}
+    """,
+    'user_learning_progress': """
+        SELECT
+            u.user_id,
+            u.email,
+            u.full_name,
+            COUNT(ce.enrollment_id) AS total_enrolled_courses,
+            COUNT(ce.completed_at) AS completed_courses,
+            ROUND(AVG(ce.progress_percentage::DOUBLE), 2) AS avg_progress_percentage,
+            SUM(ce.total_watch_time_minutes) AS total_watch_time_minutes,
+            MAX(ce.last_accessed_at) AS last_learning_activity
+        FROM users u
+        LEFT JOIN course_enrollments ce ON u.user_id = ce.user_id
+        WHERE u.is_active = TRUE
+        GROUP BY u.user_id, u.email, u.full_name
+        ORDER BY total_enrolled_courses DESC, u.user_id
+    """,
+}
+
+
+def duckdb_connection(tables):
+    """建立 DuckDB 連線並把 Arrow Table 註冊為同名資料表（零複製掃描）"""
+    if duckdb is None:
+        raise RuntimeError("未安裝 duckdb，請執行 pip install duckdb 或改用 --engine arrow")
+    con = duckdb.connect()
+    for name, table in tables.items():
+        con.register(name, table)
+    return con
+
+
+def run_duckdb(con, metric, limit=POPULAR_COURSES_LIMIT):
+    sql = DUCKDB_SQL[metric].format(limit=limit or 'ALL')
+    return con.execute(sql).fetch_arrow_table()
+
+
+def run_metrics(tables, engine='arrow', metrics=None):
+    """執行指定引擎的指標，回傳 {指標: (pa.Table, 耗時秒數)}"""
+    metrics = metrics or list(ARROW_METRICS)
+    con = duckdb_connection(tables) if engine == 'duckdb' else None
+
+    results = {}
+    for metric in metrics:
+        started = time.perf_counter()
+        if engine == 'duckdb':
+            table = run_duckdb(con, metric)
+        else:
+            table = ARROW_METRICS[metric](tables)
+        results[metric] = (table, time.perf_counter() - started)
+    return results
+
+# ============================================
+# 與 PostgreSQL 視圖交叉比對
+# ============================================
+CROSSCHECK = {
+    # 指標: (視圖, 鍵欄位, 比對欄位)
+    'monthly_revenue': ('v_monthly_revenue', ['revenue_month', 'plan_type'],
+                        ['paying_users', 'total_payments', 'total_revenue', 'avg_payment_amount']),
+    'popular_courses': ('v_popular_courses', ['course_id'],
+                        ['total_enrollments', 'active_students', 'avg_completion_rate']),
+    'user_learning_progress': ('v_user_learning_progress', ['user_id'],
+                               ['total_enrolled_courses', 'completed_courses', 'avg_progress_percentage',
+                                'total_watch_time_minutes', 'last_learning_activity']),
+}
+
+# 浮點比較容許誤差（視圖的 AVG 為 numeric，這裡為 float64）
+FLOAT_TOLERANCE = 0.01
+
+
+def _values_match(expected, actual):
+    if expected is None or actual is None:
+        return expected is None and actual is None
+    if isinstance(expected, (int, float, Decimal)):
+        return abs(float(expected) - float(actual)) <= FLOAT_TOLERANCE
+    return expected == actual
+
+
+def crosscheck_metric(cursor, metric, table, max_examples=5):
+    """
+    以視圖結果為準逐列比對；資料湖是抽取當下的快照，
+    若抽取後 OLTP 又有寫入，差異屬預期（請在抽取後立即比對）
+    """
+    view, keys, fields = CROSSCHECK[metric]
+    cursor.execute(f"SELECT {', '.join(keys + fields)} FROM {view};")
+    view_rows = cursor.fetchall()
+
+    ours = {tuple(row[k] for k in keys): row for row in table.select(keys + fields).to_pylist()}
+
+    mismatches = []
+    for row in view_rows:
+        key = row[:len(keys)]
+        expected = dict(zip(fields, row[len(keys):]))
+        actual = ours.get(key)
+        if actual is None:
+            mismatches.append({'key': key, 'missing': True})
+            continue
+        diffs = {f: (expected[f], actual[f]) for f in fields if not _values_match(expected[f], actual[f])}
+        if diffs:
+            mismatches.append({'key': key, 'diffs': diffs})
+
+    return {
+        'metric': metric,
+        'view': view,
+        'view_rows': len(view_rows),
+        'lake_rows': table.num_rows,
+        'mismatches': len(mismatches),
+        'examples': [str(m) for m in mismatches[:max_examples]],
+        'passed': not mismatches,
+    }
+
+
+def crosscheck(tables):
+    """對三個視圖逐一比對（需要 PostgreSQL 連線）"""
+    from common.db import pg_connection, close_all
+
+    computed = {
+        'monthly_revenue': monthly_revenue(tables),
+        # LIMIT 50 在 total_enrollments 同分時順序不固定，因此以 course_id 對應全部已發佈課程
+        'popular_courses': popular_courses(tables, limit=None),
+        'user_learning_progress': user_learning_progress(tables),
+    }
+    reports = []
+    with pg_connection() as conn:
+        with conn.cursor() as cursor:
+            for metric, table in computed.items():
+                reports.append(crosscheck_metric(cursor, metric, table))
+    close_all()
+    return reports
+
+# ============================================
+# 主程式
+# ============================================
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='在 Parquet 資料湖上計算報表指標')
+    parser.add_argument('--source', default=DEFAULT_SOURCE,
+                        help='Parquet 根目錄（本地路徑或 gs://bucket/prefix/）')
+    parser.add_argument('--date', help='指定抽取日期（YYYYMMDD），預設使用最新檔案')
+    parser.add_argument('--engine', choices=['arrow', 'duckdb'], default='arrow')
+    parser.add_argument('--check', action='store_true', help='與 PostgreSQL 視圖交叉比對')
+    parser.add_argument('--output', help='將指標結果寫入 JSON 檔案')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    logger.info("=" * 60)
+    logger.info(f"資料湖報表指標（引擎：{args.engine}）")
+    logger.info("=" * 60)
+
+    try:
+        tables = load_tables(args.source, args.date)
+        results = run_metrics(tables, args.engine)
+
+        for metric, (table, seconds) in results.items():
+            logger.info(f"\n📊 {metric}: {table.num_rows:,} 列，{seconds * 1000:.1f} ms")
+            for row in table.slice(0, 5).to_pylist():
+                logger.info(f"  {row}")
+
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump({metric: table.to_pylist() for metric, (table, _) in results.items()},
+                          f, ensure_ascii=False, indent=2, default=str)
+            logger.info(f"\n📝 結果已寫入：{args.output}")
+
+        if args.check:
+            logger.info("\n🔍 與 PostgreSQL 視圖交叉比對：")
+            reports = crosscheck(tables)
+            for r in reports:
+                logger.info(f"  {'✅' if r['passed'] else '❌'} {r['view']}: 視圖 {r['view_rows']:,} 列，"
+                            f"不一致 {r['mismatches']:,}")
+                for example in r['examples']:
+                    logger.info(f"     {example}")
+            if not all(r['passed'] for r in reports):
+                return 1
+
+    except Exception as e:
+        logger.error(f"❌ 指標計算失敗：{e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
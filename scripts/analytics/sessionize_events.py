@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+user_events 工作階段 (session) 與影片漏斗計算
+依 user_id / timestamp 排序後分批串流處理，記憶體用量只取決於批次大小：
+- 工作階段：同一用戶相鄰事件間隔超過 --gap-minutes 即切成新的工作階段
+- 觀看時間：video_* 事件的 properties.watch_duration 依日期 × 課程加總
+- 影片漏斗：每個 (用戶, 課程) 依時間順序 video_start → video_progress → video_complete，
+  以首次 video_start 的日期歸屬
+輸出兩個每日彙總表（Parquet）：
+- session_daily：日期、工作階段數、用戶數、事件數、總/平均時長、跳出（單一事件）工作階段數
+- course_daily ：日期、課程、觀看秒數、影片事件數、漏斗三階段人數
+
+資料來源：
+- mongodb：以 {user_id: -1, timestamp: 1} 排序（反向走 {user_id: 1, timestamp: -1} 索引，不需記憶體排序）
+- parquet：extract_mongodb_to_gcs 的輸出；先依 user_id 雜湊分割成暫存分區，再逐分區排序處理
+
+用法：
+    python scripts/analytics/sessionize_events.py --source mongodb
+    python scripts/analytics/sessionize_events.py --source parquet --parquet-source ./data_lake/raw/
+"""
+
+import os
+import sys
+import time
+import shutil
+import logging
+import argparse
+import itertools
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'etl'))
+
+from profile_parquet import DEFAULT_SOURCE, resolve_table_files
+
+# 設定日誌
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# ============================================
+# 配置
+# ============================================
+SESSION_GAP_MINUTES = 30
+CHUNK_SIZE = 200000
+# Parquet 來源的雜湊分區數（每個分區需能整個放進記憶體）
+PARTITIONS = 16
+OUTPUT_DIR = './analytics_output'
+
+US_PER_DAY = 86400 * 1000000
+NO_TIME = np.iinfo(np.int64).max
+
+# 漏斗階段（依序）
+FUNNEL = ['video_start', 'video_progress', 'video_complete']
+
+# 處理用的欄位（Parquet 欄位名稱與 extract_mongodb_to_gcs 相同）
+EVENT_SCHEMA = pa.schema([
+    ('user_id', pa.int64()),
+    ('timestamp', pa.timestamp('us')),
+    ('event_type', pa.string()),
+    ('properties.course_id', pa.int64()),
+    ('properties.watch_duration', pa.int64()),
+])
+
+# ============================================
+# 資料來源
+# ============================================
+def iter_mongodb_chunks(db, chunk_size=CHUNK_SIZE):
+    """依用戶、時間排序串流讀取 user_events，每批轉成 Arrow Table"""
+    cursor = db.user_events.find(
+        {},
+        {'_id': 0, 'user_id': 1, 'timestamp': 1, 'event_type': 1,
+         'properties.course_id': 1, 'properties.watch_duration': 1},
+        batch_size=10000,
+    ).sort([('user_id', -1), ('timestamp', 1)])
+
+    try:
+        while True:
+            docs = list(itertools.islice(cursor, chunk_size))
+            if not docs:
+                return
+            props = [d.get('properties') or {} for d in docs]
+            yield pa.Table.from_arrays([
+                pa.array([d['user_id'] for d in docs], type=pa.int64()),
+                pa.array([d['timestamp'] for d in docs], type=pa.timestamp('us')),
+                pa.array([d['event_type'] for d in docs], type=pa.string()),
+                pa.array([p.get('course_id') for p in props], type=pa.int64()),
+                pa.array([p.get('watch_duration') for p in props], type=pa.int64()),
+            ], schema=EVENT_SCHEMA)
+    finally:
+        cursor.close()
+
+
+def complete_user_chunks(chunks):
+    """
+    保留每批最後一位用戶的事件併入下一批，確保同一用戶的事件都在同一批內
+    （工作階段與漏斗都不會被批次邊界切斷）
+    """
+    carry = None
+    for chunk in chunks:
+        if carry is not None:
+            chunk = pa.concat_tables([carry, chunk])
+        user_ids = chunk['user_id'].to_numpy()
+        others = np.flatnonzero(user_ids != user_ids[-1])
+        cut = int(others[-1]) + 1 if len(others) else 0
+        if cut:
+            yield chunk.slice(0, cut)
+        carry = chunk.slice(cut)
+    if carry is not None and carry.num_rows:
+        yield carry
+
+
+def iter_parquet_partitions(source, date_str=None, partitions=PARTITIONS, batch_size=CHUNK_SIZE):
+    """
+    兩階段處理未排序的 Parquet：
+    1. 逐批讀取，依 user_id % partitions 寫入暫存分區檔
+    2. 逐分區讀回、依 (user_id, timestamp) 排序後 yield
+    """
+    fs, root = pafs.FileSystem.from_uri(source)
+    paths = resolve_table_files(fs, root.rstrip('/'), 'user_events', date_str)
+    if not paths:
+        raise FileNotFoundError(f"找不到 user_events 的 Parquet 檔案：{source}")
+
+    spill_dir = tempfile.mkdtemp(prefix='learnhub_sessions_')
+    try:
+        writers = [pq.ParquetWriter(os.path.join(spill_dir, f"part_{p:03d}.parquet"), EVENT_SCHEMA)
+                   for p in range(partitions)]
+        for path in paths:
+            parquet_file = pq.ParquetFile(fs.open_input_file(path))
+            for batch in parquet_file.iter_batches(batch_size=batch_size, columns=EVENT_SCHEMA.names):
+                table = pa.Table.from_batches([batch]).cast(EVENT_SCHEMA)
+                part = table['user_id'].to_numpy(zero_copy_only=False) % partitions
+                order = np.argsort(part, kind='stable')
+                bounds = np.searchsorted(part[order], np.arange(partitions + 1))
+                table = table.take(order)
+                for p in range(partitions):
+                    if bounds[p + 1] > bounds[p]:
+                        writers[p].write_table(table.slice(bounds[p], bounds[p + 1] - bounds[p]))
+        for writer in writers:
+            writer.close()
+
+        for p in range(partitions):
+            table = pq.read_table(os.path.join(spill_dir, f"part_{p:03d}.parquet"))
+            if table.num_rows:
+                yield table.sort_by([('user_id', 'ascending'), ('timestamp', 'ascending')])
+    finally:
+        shutil.rmtree(spill_dir, ignore_errors=True)
+
+# ============================================
+# 計算（每批內的用戶事件已依時間排序且完整）
+# ============================================
+def _group_sum(keys, *values):
+    """依整數鍵加總，回傳 (唯一鍵, 各值的加總...)"""
+    unique, inverse = np.unique(keys, return_inverse=True)
+    return (unique, *[np.bincount(inverse, weights=v, minlength=len(unique)) for v in values])
+
+
+class SessionEngine:
+    """累積每批的部分彙總；每日彙總的列數與事件數無關（天數 × 課程數）"""
+
+    def __init__(self, gap_minutes=SESSION_GAP_MINUTES):
+        self.gap_us = int(gap_minutes * 60 * 1000000)
+        self.session_daily = None
+        self.course_daily = None
+        self.events = 0
+
+    def process(self, chunk):
+        if chunk.num_rows == 0:
+            return
+        self.events += chunk.num_rows
+
+        user_ids = chunk['user_id'].to_numpy(zero_copy_only=False).astype(np.int64)
+        ts = pc.cast(chunk['timestamp'], pa.int64()).to_numpy(zero_copy_only=False)
+        event_codes = pc.index_in(chunk['event_type'], value_set=pa.array(FUNNEL)).fill_null(-1)
+        event_codes = event_codes.to_numpy(zero_copy_only=False)
+        course_ids = chunk['properties.course_id'].fill_null(-1).to_numpy(zero_copy_only=False)
+        watch = chunk['properties.watch_duration'].fill_null(0).to_numpy(zero_copy_only=False)
+
+        self._merge_sessions(self._sessions(user_ids, ts))
+        self._merge_courses(self._courses(user_ids, ts, event_codes, course_ids, watch))
+
+    # --------------------------------------------
+    # 工作階段
+    # --------------------------------------------
+    def _sessions(self, user_ids, ts):
+        n = len(ts)
+        new_session = np.ones(n, dtype=bool)
+        new_session[1:] = (user_ids[1:] != user_ids[:-1]) | (ts[1:] - ts[:-1] > self.gap_us)
+        starts = np.flatnonzero(new_session)
+        ends = np.append(starts[1:], n) - 1
+
+        days = ts[starts] // US_PER_DAY
+        durations = (ts[ends] - ts[starts]) / 1e6
+        event_counts = (ends - starts + 1).astype(np.float64)
+        bounces = (event_counts == 1).astype(np.float64)
+
+        day_keys, sessions, events, seconds, bounce = _group_sum(
+            days, np.ones(len(starts)), event_counts, durations, bounces)
+        # 同一用戶的事件都在這一批內，因此各批的用戶數可以直接相加
+        user_day = np.unique((days << 32) | user_ids[starts])
+        user_keys, users = np.unique(user_day >> 32, return_counts=True)
+
+        return pa.table({
+            'day': day_keys,
+            'sessions': sessions.astype(np.int64),
+            'users': users[np.searchsorted(user_keys, day_keys)].astype(np.int64),
+            'events': events.astype(np.int64),
+            'total_duration_seconds': seconds,
+            'bounce_sessions': bounce.astype(np.int64),
+        })
+
+    # --------------------------------------------
+    # 觀看時間與漏斗
+    # --------------------------------------------
+    def _courses(self, user_ids, ts, event_codes, course_ids, watch):
+        video = (event_codes >= 0) & (course_ids >= 0)
+        if not video.any():
+            return None
+        user_ids, ts, event_codes, course_ids, watch = (
+            a[video] for a in (user_ids, ts, event_codes, course_ids, watch))
+
+        # 觀看時間：事件當天 × 課程
+        day_course = ((ts // US_PER_DAY) << 32) | course_ids
+        watch_keys, watch_seconds, video_events = _group_sum(
+            day_course, watch.astype(np.float64), np.ones(len(ts)))
+
+        # 漏斗：每個 (用戶, 課程) 依序找第一次 start、其後第一次 progress、再其後第一次 complete
+        _, pair = np.unique((user_ids << 32) | course_ids, return_inverse=True)
+        stage_times = []
+        earliest = np.full(pair.max() + 1, np.iinfo(np.int64).min)
+        for stage in range(len(FUNNEL)):
+            reached = np.full(len(earliest), NO_TIME)
+            mask = (event_codes == stage) & (ts >= earliest[pair])
+            np.minimum.at(reached, pair[mask], ts[mask])
+            stage_times.append(reached)
+            earliest = reached
+
+        started = stage_times[0] != NO_TIME
+        pair_course = np.zeros(len(earliest), dtype=np.int64)
+        pair_course[pair] = course_ids
+        funnel_keys = ((stage_times[0][started] // US_PER_DAY) << 32) | pair_course[started]
+        funnel_keys, *funnel_counts = _group_sum(
+            funnel_keys, *[(t[started] != NO_TIME).astype(np.float64) for t in stage_times])
+
+        keys = np.union1d(watch_keys, funnel_keys)
+        columns = {'day': keys >> 32, 'course_id': keys & 0xFFFFFFFF}
+        for name, source_keys, values in [('watch_seconds', watch_keys, watch_seconds),
+                                          ('video_events', watch_keys, video_events),
+                                          ('funnel_started', funnel_keys, funnel_counts[0]),
+                                          ('funnel_progressed', funnel_keys, funnel_counts[1]),
+                                          ('funnel_completed', funnel_keys, funnel_counts[2])]:
+            full = np.zeros(len(keys), dtype=np.int64)
+            full[np.searchsorted(keys, source_keys)] = values.astype(np.int64)
+            columns[name] = full
+        return pa.table(columns)
+
+    # --------------------------------------------
+    # 合併各批結果
+    # --------------------------------------------
+    @staticmethod
+    def _merge(running, partial, keys):
+        if partial is None:
+            return running
+        if running is None:
+            return partial
+        values = [c for c in partial.column_names if c not in keys]
+        merged = pa.concat_tables([running, partial]).group_by(keys).aggregate([(c, 'sum') for c in values])
+        return merged.rename_columns({f"{c}_sum": c for c in values}).select(partial.column_names)
+
+    def _merge_sessions(self, partial):
+        self.session_daily = self._merge(self.session_daily, partial, ['day'])
+
+    def _merge_courses(self, partial):
+        self.course_daily = self._merge(self.course_daily, partial, ['day', 'course_id'])
+
+    # --------------------------------------------
+    # 輸出
+    # --------------------------------------------
+    @staticmethod
+    def _with_date(table, sort_keys):
+        table = table.sort_by([(k, 'ascending') for k in sort_keys])
+        dates = pc.cast(pc.cast(table['day'], pa.int32()), pa.date32())
+        return table.set_column(table.schema.get_field_index('day'), 'date', dates)
+
+    def results(self):
+        """回傳 (session_daily, course_daily)"""
+        session_daily = self._with_date(self.session_daily, ['day'])
+        session_daily = session_daily.append_column(
+            'avg_duration_seconds',
+            pc.round(pc.divide(session_daily['total_duration_seconds'],
+                               pc.cast(session_daily['sessions'], pa.float64())), 1))
+        course_daily = self._with_date(self.course_daily, ['day', 'course_id']) \
+            if self.course_daily is not None else None
+        return session_daily, course_daily
+
+# ============================================
+# 主程式
+# ============================================
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='user_events 工作階段與影片漏斗計算')
+    parser.add_argument('--source', choices=['mongodb', 'parquet'], default='mongodb')
+    parser.add_argument('--parquet-source', default=DEFAULT_SOURCE,
+                        help='Parquet 根目錄（本地路徑或 gs://bucket/prefix/）')
+    parser.add_argument('--date', help='Parquet 抽取日期（YYYYMMDD），預設使用最新檔案')
+    parser.add_argument('--gap-minutes', type=float, default=SESSION_GAP_MINUTES,
+                        help='超過此間隔即視為新的工作階段')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--partitions', type=int, default=PARTITIONS, help='Parquet 來源的雜湊分區數')
+    parser.add_argument('--output-dir', default=OUTPUT_DIR)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    logger.info("=" * 60)
+    logger.info(f"user_events 工作階段 / 漏斗計算（來源：{args.source}）")
+    logger.info("=" * 60)
+
+    started = time.monotonic()
+    engine = SessionEngine(args.gap_minutes)
+    try:
+        if args.source == 'mongodb':
+            from common.db import get_mongo_db, close_all
+            chunks = complete_user_chunks(iter_mongodb_chunks(get_mongo_db(), args.chunk_size))
+        else:
+            chunks = iter_parquet_partitions(args.parquet_source, args.date, args.partitions, args.chunk_size)
+
+        for chunk in chunks:
+            engine.process(chunk)
+            logger.info(f"  ⏳ 已處理 {engine.events:,} 筆事件")
+
+        if args.source == 'mongodb':
+            close_all()
+
+        if engine.events == 0:
+            logger.warning("⚠️  沒有任何事件")
+            return 1
+
+        session_daily, course_daily = engine.results()
+        os.makedirs(args.output_dir, exist_ok=True)
+        pq.write_table(session_daily, os.path.join(args.output_dir, 'session_daily.parquet'), compression='zstd')
+        if course_daily is not None:
+            pq.write_table(course_daily, os.path.join(args.output_dir, 'course_daily.parquet'), compression='zstd')
+
+    except Exception as e:
+        logger.error(f"❌ 計算失敗：{e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+    elapsed = time.monotonic() - started
+    sessions = pc.sum(session_daily['sessions']).as_py()
+    seconds = pc.sum(session_daily['total_duration_seconds']).as_py()
+    logger.info("=" * 60)
+    logger.info(f"⏱️  {engine.events:,} 筆事件，{elapsed:.1f}s（{engine.events / elapsed:,.0f} 筆/s）")
+    logger.info(f"🧭 工作階段：{sessions:,}，平均 {seconds / sessions:.0f} 秒")
+    if course_daily is not None:
+        totals = [pc.sum(course_daily[c]).as_py() for c in ('funnel_started', 'funnel_progressed', 'funnel_completed')]
+        logger.info(f"🎬 影片漏斗：start {totals[0]:,} → progress {totals[1]:,}"
+                    f"（{totals[1] / totals[0] * 100 if totals[0] else 0:.1f}%）→ complete {totals[2]:,}"
+                    f"（{totals[2] / totals[0] * 100 if totals[0] else 0:.1f}%）")
+    logger.info(f"📁 輸出：{args.output_dir}/session_daily.parquet, course_daily.parquet")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1 @@
+"""LearnHub 腳本共用模組（連線、設定）"""
@@ -0,0 +1,106 @@
+"""
+執行檢查點（checkpoint）
+記錄長時間執行中已完成的工作單位（資料表、批次索引…）與其輸出（物件名稱、筆數、seed），
+中斷後以 --resume 重跑時略過已完成的部分，從中斷處繼續。
+
+- 每完成一個單位就以「寫入暫存檔 → fsync → os.replace」更新 JSON，當機不會留下半個檔案
+- params 記錄影響輸出的參數（筆數、seed、日期…）；與既有檢查點不同時拒絕續跑，
+  避免把兩種設定的結果混在一起
+- 檔案位置：<專案根目錄>/.cache/checkpoints/<name>.json（可用 LEARNHUB_CHECKPOINT_DIR 覆寫）
+
+用法：
+    checkpoint = CheckpointStore('generate_user_events', params={'count': 5000000, 'seed': 42})
+    checkpoint.start(resume=args.resume)
+    for index in range(batches):
+        if checkpoint.is_done(index):
+            continue
+        ...
+        checkpoint.mark_done(index, rows=len(batch))
+    checkpoint.finish()
+"""
+
+import os
+import json
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+from common.db import PROJECT_ROOT
+
+CHECKPOINT_DIR = os.environ.get('LEARNHUB_CHECKPOINT_DIR', str(PROJECT_ROOT / '.cache' / 'checkpoints'))
+
+
+class CheckpointStore:
+    """單一執行（name）的檢查點；鍵一律轉為字串存放"""
+
+    def __init__(self, name, params=None, directory=CHECKPOINT_DIR):
+        self.name = name
+        self.params = params or {}
+        self.path = Path(directory) / f"{name}.json"
+        self.state = None
+
+    # --------------------------------------------
+    # 生命週期
+    # --------------------------------------------
+    def start(self, resume=False):
+        """
+        resume=False：捨棄既有檢查點，重新開始
+        resume=True ：載入既有檢查點（不存在時等同重新開始），回傳已完成的單位數
+        """
+        if resume and self.path.exists():
+            state = json.loads(self.path.read_text(encoding='utf-8'))
+            if state['params'] != json.loads(json.dumps(self.params, default=str)):
+                raise ValueError(f"檢查點 {self.path} 的參數 {state['params']} 與本次 {self.params} 不同，"
+                                 f"無法續跑（請移除 --resume 重新開始）")
+            self.state = state
+        else:
+            self.state = {
+                'name': self.name,
+                'params': self.params,
+                'status': 'running',
+                'started_at': datetime.now().isoformat(timespec='seconds'),
+                'completed': {},
+            }
+            self._save()
+        return len(self.state['completed'])
+
+    def finish(self):
+        """標記整個執行已完成（保留檔案，供事後查看各單位的輸出）"""
+        self.state['status'] = 'completed'
+        self.state['finished_at'] = datetime.now().isoformat(timespec='seconds')
+        self._save()
+
+    @property
+    def resumed(self):
+        """本次是否接續先前的執行（已有完成的單位）"""
+        return bool(self.state and self.state['completed'])
+
+    # --------------------------------------------
+    # 工作單位
+    # --------------------------------------------
+    def is_done(self, key):
+        return str(key) in self.state['completed']
+
+    def get(self, key):
+        """已完成單位記錄的資訊（未完成時回傳 None）"""
+        return self.state['completed'].get(str(key))
+
+    def mark_done(self, key, **info):
+        """記錄單位完成與其輸出，立即寫回磁碟"""
+        info['completed_at'] = datetime.now().isoformat(timespec='seconds')
+        self.state['completed'][str(key)] = info
+        self._save()
+
+    def _save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, prefix=f".{self.name}.", suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(self.state, f, ensure_ascii=False, indent=2, default=str)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
@@ -0,0 +1,216 @@
+"""
+共用資料庫連線層
+- 從環境變數 / 專案根目錄的 .env 讀取 PostgreSQL、MongoDB 設定
+- PostgreSQL：行程內共用的 ThreadedConnectionPool
+- MongoDB：行程內共用的 MongoClient（本身即為連線池）
+- 伺服器端 cursor 輔助函式，分批讀取大型資料表
+- 邏輯複寫連線（CDC 使用，不經過連線池）
+
+連線池以行程為單位建立並在 fork 後自動重建；Airflow 同一個 worker 行程內的
+多次呼叫會重用同一組連線，而不是每次都重新建立連線。
+
+用法：
+    from common.db import pg_connection, get_mongo_db
+
+    with pg_connection() as conn:
+        ...
+    db = get_mongo_db()
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+import psycopg2
+from psycopg2.extras import LogicalReplicationConnection
+from psycopg2.pool import ThreadedConnectionPool
+from pymongo import MongoClient
+
+# 專案根目錄（scripts/common/db.py → 上兩層）
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+
+_lock = threading.Lock()
+_pg_pool = None
+_pg_pool_pid = None
+_mongo_client = None
+_mongo_client_pid = None
+
+# ============================================
+# 設定
+# ============================================
+def load_env(path=None):
+    """讀取 .env（KEY=VALUE 格式），不覆寫已存在的環境變數"""
+    path = Path(path) if path else PROJECT_ROOT / '.env'
+    if not path.exists():
+        return
+    for line in path.read_text(encoding='utf-8').splitlines():
+        line = line.strip()
+        if not line or line.startswith('#') or '=' not in line:
+            continue
+        key, value = line.split('=', 1)
+        os.environ.setdefault(key.strip(), value.strip().strip('"').strip("'"))
+
+
+load_env()
+
+
+def pg_config():
+    """PostgreSQL 連線參數（預設為本機連到 docker compose 對外的 5433 埠）"""
+    return {
+        'host': os.environ.get('POSTGRES_HOST', 'localhost'),
+        'port': int(os.environ.get('POSTGRES_PORT', 5433)),
+        'database': os.environ.get('POSTGRES_DB', 'learnhub_prod'),
+        'user': os.environ.get('POSTGRES_USER', 'admin'),
+        'password': os.environ.get('POSTGRES_PASSWORD', 'admin123'),
+        'application_name': os.environ.get('PG_APPLICATION_NAME', 'learnhub_pipeline'),
+    }
+
+
+def mongo_config():
+    """MongoDB 連線參數"""
+    return {
+        'host': os.environ.get('MONGO_HOST', 'localhost'),
+        'port': int(os.environ.get('MONGO_PORT', 27017)),
+        'username': os.environ.get('MONGO_INITDB_ROOT_USERNAME', 'admin'),
+        'password': os.environ.get('MONGO_INITDB_ROOT_PASSWORD', 'admin123'),
+        'database': os.environ.get('MONGO_DB', 'learnhub_logs'),
+    }
+
+# 連線池大小（每個行程）
+PG_POOL_MIN = int(os.environ.get('PG_POOL_MIN', 1))
+PG_POOL_MAX = int(os.environ.get('PG_POOL_MAX', 4))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', 0))
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', 20))
+
+# ============================================
+# PostgreSQL
+# ============================================
+def get_pg_pool():
+    """取得本行程的 PostgreSQL 連線池（延遲建立；fork 後的子行程會建立自己的連線池）"""
+    global _pg_pool, _pg_pool_pid
+    with _lock:
+        if _pg_pool is None or _pg_pool_pid != os.getpid():
+            _pg_pool = ThreadedConnectionPool(PG_POOL_MIN, PG_POOL_MAX, **pg_config())
+            _pg_pool_pid = os.getpid()
+        return _pg_pool
+
+
+def acquire_pg_connection():
+    """從連線池取出連線；用完請以 release_pg_connection() 歸還"""
+    return get_pg_pool().getconn()
+
+
+def release_pg_connection(conn):
+    """歸還連線（未結束的交易會由連線池 rollback）"""
+    get_pg_pool().putconn(conn)
+
+
+@contextmanager
+def pg_connection(autocommit=False):
+    """
+    借用一條 PostgreSQL 連線；發生例外時 rollback
+    交易需由呼叫端自行 commit（與直接使用 psycopg2 連線的行為一致）
+    """
+    conn = acquire_pg_connection()
+    conn.autocommit = autocommit
+    try:
+        yield conn
+    except Exception:
+        if not conn.closed and not conn.autocommit:
+            conn.rollback()
+        raise
+    finally:
+        if not conn.closed:
+            conn.autocommit = False
+        release_pg_connection(conn)
+
+
+@contextmanager
+def pg_server_cursor(conn, name='learnhub_server_cursor', itersize=10000):
+    """
+    伺服器端（named）cursor：資料留在 PostgreSQL，客戶端每次只取 itersize 筆
+    需在交易內使用（autocommit 連線請改用 withhold=True 的 cursor）
+    """
+    cursor = conn.cursor(name=name)
+    cursor.itersize = itersize
+    try:
+        yield cursor
+    finally:
+        cursor.close()
+
+
+def iter_pg_batches(conn, query, params=None, batch_size=10000, name='learnhub_batch_cursor', cursor_setup=None):
+    """
+    以伺服器端 cursor 分批執行查詢，逐批 yield (columns, rows)
+    cursor_setup(cursor) 在執行查詢前呼叫，例如註冊只作用於此 cursor 的型別轉換
+    """
+    with pg_server_cursor(conn, name=name, itersize=batch_size) as cursor:
+        if cursor_setup is not None:
+            cursor_setup(cursor)
+        cursor.execute(query, params)
+        columns = None
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if columns is None and cursor.description is not None:
+                columns = [desc[0] for desc in cursor.description]
+            if not rows:
+                break
+            yield columns, rows
+
+
+def pg_replication_connection():
+    """邏輯複寫連線（不經過連線池：複寫串流會獨占連線，結束後請自行 close）"""
+    return psycopg2.connect(connection_factory=LogicalReplicationConnection, **pg_config())
+
+
+def close_pg_pool():
+    """關閉本行程的連線池"""
+    global _pg_pool
+    with _lock:
+        if _pg_pool is not None and _pg_pool_pid == os.getpid():
+            _pg_pool.closeall()
+        _pg_pool = None
+
+# ============================================
+# MongoDB
+# ============================================
+def mongo_uri():
+    config = mongo_config()
+    return f"mongodb://{config['username']}:{config['password']}@{config['host']}:{config['port']}/"
+
+
+def get_mongo_client():
+    """取得本行程共用的 MongoClient（MongoClient 不是 fork-safe，fork 後會重新建立）"""
+    global _mongo_client, _mongo_client_pid
+    with _lock:
+        if _mongo_client is None or _mongo_client_pid != os.getpid():
+            _mongo_client = MongoClient(
+                mongo_uri(),
+                minPoolSize=MONGO_MIN_POOL_SIZE,
+                maxPoolSize=MONGO_MAX_POOL_SIZE,
+                maxIdleTimeMS=60000,
+                serverSelectionTimeoutMS=5000,
+                appname='learnhub_pipeline',
+            )
+            _mongo_client_pid = os.getpid()
+        return _mongo_client
+
+
+def get_mongo_db(name=None):
+    """取得 learnhub_logs（或指定名稱）資料庫"""
+    return get_mongo_client()[name or mongo_config()['database']]
+
+
+def close_mongo_client():
+    global _mongo_client
+    with _lock:
+        if _mongo_client is not None and _mongo_client_pid == os.getpid():
+            _mongo_client.close()
+        _mongo_client = None
+
+
+def close_all():
+    """腳本結束前關閉所有共用連線"""
+    close_pg_pool()
+    close_mongo_client()
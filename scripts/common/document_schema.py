@@ -0,0 +1,147 @@
+"""
+MongoDB 文件 → Arrow 欄位對照
+巢狀欄位以 "." 路徑展開成固定欄位；陣列 / 子文件以 JSON 字串保存。
+extract_mongodb_to_gcs.py（抽取）與 generate_mongodb_data.py --sink parquet（直接生成檔案）
+共用同一份對照，兩者寫出的 Parquet 欄位與型別相同。
+table_to_documents 是反向轉換（load_synthetic_data.py 將生成的 Parquet 載回 MongoDB）。
+Parquet 只保存 COLLECTIONS 列出的欄位，其餘欄位（search_terms 等）需由呼叫端重建。
+
+用法：
+    table = documents_to_table(docs, 'course_reviews')
+    writer = pq.ParquetWriter(path, collection_schema('course_reviews'))
+    docs = table_to_documents(table, 'course_reviews')
+"""
+
+import json
+from datetime import datetime
+
+import pyarrow as pa
+
+# ============================================
+# 各 Collection 的欄位
+# ============================================
+COLLECTIONS = {
+    'user_events': [
+        ('event_id', pa.string()),
+        ('user_id', pa.int64()),
+        ('session_id', pa.string()),
+        ('event_type', pa.string()),
+        ('timestamp', pa.timestamp('us')),
+        ('properties.course_id', pa.int64()),
+        ('properties.video_id', pa.string()),
+        ('properties.watch_duration', pa.int64()),
+        ('properties.completion_rate', pa.float64()),
+        ('properties.quality', pa.string()),
+        ('properties.query', pa.string()),
+        ('properties.results_count', pa.int64()),
+        ('properties.source', pa.string()),
+        ('device.type', pa.string()),
+        ('device.os', pa.string()),
+        ('device.browser', pa.string()),
+        ('location.country', pa.string()),
+        ('location.city', pa.string()),
+        ('location.ip_address', pa.string()),
+    ],
+    'course_reviews': [
+        ('review_id', pa.string()),
+        ('user_id', pa.int64()),
+        ('course_id', pa.int64()),
+        ('rating', pa.float64()),
+        ('title', pa.string()),
+        ('comment', pa.string()),
+        ('tags', pa.list_(pa.string())),
+        ('helpful_count', pa.int64()),
+        ('replies', 'json'),
+        ('created_at', pa.timestamp('us')),
+        ('updated_at', pa.timestamp('us')),
+    ],
+    'support_tickets': [
+        ('ticket_id', pa.string()),
+        ('user_id', pa.int64()),
+        ('subject', pa.string()),
+        ('issue_type', pa.string()),
+        ('priority', pa.string()),
+        ('status', pa.string()),
+        ('messages', 'json'),
+        ('assigned_agent', pa.string()),
+        ('tags', pa.list_(pa.string())),
+        ('created_at', pa.timestamp('us')),
+        ('updated_at', pa.timestamp('us')),
+        ('resolved_at', pa.timestamp('us')),
+    ],
+}
+
+# JSON 欄位內的時間以 str(datetime) 保存，轉回文件時依鍵名還原
+JSON_DATETIME_KEYS = ('timestamp', 'created_at', 'updated_at')
+
+# ============================================
+# 文件 → Arrow
+# ============================================
+def collection_schema(collection_name):
+    """將欄位設定轉為 Arrow schema（JSON 欄位存為字串）"""
+    return pa.schema([
+        (path, pa.string() if arrow_type == 'json' else arrow_type)
+        for path, arrow_type in COLLECTIONS[collection_name]
+    ])
+
+
+def get_path(doc, path):
+    """以 "a.b" 路徑取出巢狀欄位，不存在時回傳 None"""
+    value = doc
+    for key in path.split('.'):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def documents_to_table(docs, collection_name):
+    """將一批文件轉為 Arrow Table（逐欄建構，避免 schema 隨批次漂移）"""
+    columns = []
+    for path, arrow_type in COLLECTIONS[collection_name]:
+        values = [get_path(doc, path) for doc in docs]
+        if arrow_type == 'json':
+            values = [None if v is None else json.dumps(v, ensure_ascii=False, default=str) for v in values]
+            arrow_type = pa.string()
+        columns.append(pa.array(values, type=arrow_type))
+    return pa.Table.from_arrays(columns, schema=collection_schema(collection_name))
+
+# ============================================
+# Arrow → 文件
+# ============================================
+def _restore_datetimes(obj):
+    """json.loads 的 object_hook：JSON_DATETIME_KEYS 的字串轉回 datetime"""
+    for key in JSON_DATETIME_KEYS:
+        if isinstance(obj.get(key), str):
+            try:
+                obj[key] = datetime.fromisoformat(obj[key])
+            except ValueError:
+                pass
+    return obj
+
+
+def table_to_documents(table, collection_name):
+    """
+    將 documents_to_table 的輸出轉回文件：
+    "." 路徑還原為子文件（值為 None 的巢狀欄位略過）、JSON 字串還原為陣列 / 子文件
+    """
+    columns = []
+    for path, arrow_type in COLLECTIONS[collection_name]:
+        values = table.column(path).to_pylist()
+        if arrow_type == 'json':
+            values = [None if v is None else json.loads(v, object_hook=_restore_datetimes) for v in values]
+        columns.append((path.split('.'), values))
+
+    docs = []
+    for i in range(table.num_rows):
+        doc = {}
+        for keys, values in columns:
+            value = values[i]
+            if len(keys) > 1 and value is None:
+                continue
+            target = doc
+            for key in keys[:-1]:
+                target = target.setdefault(key, {})
+            target[keys[-1]] = value
+        docs.append(doc)
+    return docs
@@ -0,0 +1,111 @@
+"""
+user_events 儲存版面
+- regular   ：user_events，一般 collection，每筆事件一份完整文件
+- timeseries：user_events_ts，MongoDB 時間序列 collection
+              （timeField: timestamp、metaField: meta = {user_id, device}），
+              同一 meta 的事件由伺服器壓縮成 bucket，device 每個 bucket 只存一次
+
+時間序列文件的 user_id、device 放在 meta 內，讀取時以 FLATTEN_META_STAGES 還原成
+與 regular 相同的欄位，下游（抽取、報表）不需要區分版面。
+
+用法：
+    from common.event_layout import create_events_collection, to_timeseries_document
+
+    collection = create_events_collection(db, 'timeseries')
+    collection.insert_many([to_timeseries_document(doc) for doc in docs])
+"""
+
+from pymongo import ASCENDING, DESCENDING
+
+# ============================================
+# 設定
+# ============================================
+EVENT_LAYOUTS = {
+    'regular': 'user_events',
+    'timeseries': 'user_events_ts',
+}
+
+META_FIELD = 'meta'
+META_KEYS = ('user_id', 'device')
+
+# bucket 時間跨度；測試資料每位用戶每天不到一筆事件，
+# 以一週為單位才能讓每個 bucket 累積足夠事件（scripts/mongodb/03_create_timeseries_collection.js 需同步）
+TIMESERIES_BUCKET_SECONDS = 7 * 86400
+
+# 與 scripts/mongodb/02_create_indexes.js 的 user_events 索引對應
+REGULAR_INDEXES = [
+    [('user_id', ASCENDING), ('timestamp', DESCENDING)],
+    [('event_type', ASCENDING)],
+    [('timestamp', DESCENDING)],
+    [('session_id', ASCENDING)],
+    [('properties.course_id', ASCENDING)],
+    [('user_id', ASCENDING), ('event_type', ASCENDING), ('timestamp', DESCENDING)],
+]
+
+# 時間序列 collection 會自動建立 (meta, timestamp) 的 bucket 索引，這裡只補常用查詢
+TIMESERIES_INDEXES = [
+    [('meta.user_id', ASCENDING), ('timestamp', DESCENDING)],
+    [('event_type', ASCENDING), ('timestamp', DESCENDING)],
+    [('properties.course_id', ASCENDING)],
+]
+
+# 讀取時間序列 collection 時，將 meta 還原為頂層 user_id / device
+FLATTEN_META_STAGES = [
+    {'$set': {key: f"${META_FIELD}.{key}" for key in META_KEYS}},
+    {'$unset': META_FIELD},
+]
+
+# ============================================
+# Collection
+# ============================================
+def events_collection_name(layout):
+    return EVENT_LAYOUTS[layout]
+
+
+def create_events_collection(db, layout, name=None):
+    """
+    建立（或取得既有的）user_events collection 與索引，回傳 Collection
+    regular 版面的驗證規則由 01_init_collections.js 建立，這裡只補索引
+    """
+    name = name or events_collection_name(layout)
+    if layout == 'timeseries':
+        if name not in db.list_collection_names(filter={'name': name}):
+            db.create_collection(name, timeseries={
+                'timeField': 'timestamp',
+                'metaField': META_FIELD,
+                'bucketMaxSpanSeconds': TIMESERIES_BUCKET_SECONDS,
+                'bucketRoundingSeconds': TIMESERIES_BUCKET_SECONDS,
+            })
+        indexes = TIMESERIES_INDEXES
+    else:
+        indexes = REGULAR_INDEXES
+
+    collection = db[name]
+    for keys in indexes:
+        collection.create_index(keys)
+    return collection
+
+# ============================================
+# 文件轉換
+# ============================================
+def to_timeseries_document(doc):
+    """將 regular 版面的事件文件轉為時間序列版面（user_id、device 移入 meta）"""
+    doc = dict(doc)
+    doc[META_FIELD] = {key: doc.pop(key, None) for key in META_KEYS}
+    return doc
+
+
+def find_events(collection, layout, projection=None, batch_size=10000, query=None):
+    """
+    以 regular 版面的欄位讀取事件，回傳 cursor
+    timeseries 版面以 aggregate 在伺服器端還原 meta，projection 沿用 find 的寫法；
+    query 只能使用 user_id / device 以外的欄位（兩種版面路徑相同）
+    """
+    if layout != 'timeseries':
+        return collection.find(query or {}, projection, batch_size=batch_size)
+
+    pipeline = [{'$match': query}] if query else []
+    pipeline += FLATTEN_META_STAGES
+    if projection:
+        pipeline.append({'$project': projection})
+    return collection.aggregate(pipeline, batchSize=batch_size)
@@ -0,0 +1,59 @@
+"""
+中英文混合文字的搜尋詞切分
+與 PostgreSQL 的 learnhub_cjk_bigrams()（scripts/sql/04_create_search.sql）規則相同：
+- CJK 連續字元展開為相鄰二字組：'資料工程' → 資料、料工、工程（單一字元保留為單字）
+- 其他文字以非字母數字切開並轉小寫：'Python 3' → python、3
+
+MongoDB course_reviews 的 search_terms 欄位由 search_terms() 產生，
+查詢時以 query_terms() 切分後用 $all 比對（多鍵索引），中文查詢也能使用索引。
+
+用法：
+    from common.search_text import search_terms, query_terms
+
+    doc['search_terms'] = search_terms(doc['title'], doc['comment'])
+    collection.find({'search_terms': {'$all': query_terms('資料工程')}})
+"""
+
+import re
+
+# CJK 統一表意文字（擴充 A、基本區、相容區），需與 04_create_search.sql 的字元範圍一致
+CJK_RANGES = '㐀-䶿一-鿿豈-﫿'
+CJK_RUN = re.compile(f"[{CJK_RANGES}]+")
+WORD = re.compile(f"[^\\W{CJK_RANGES}]+")
+
+
+def contains_cjk(text):
+    return CJK_RUN.search(text) is not None
+
+
+def cjk_bigrams(run):
+    """單一 CJK 連續字串 → 相鄰二字組列表"""
+    if len(run) == 1:
+        return [run]
+    return [run[i:i + 2] for i in range(len(run) - 1)]
+
+
+def tokenize(text):
+    """依出現順序回傳搜尋詞（可能重複）"""
+    tokens = []
+    position = 0
+    for match in CJK_RUN.finditer(text):
+        tokens.extend(word.lower() for word in WORD.findall(text, position, match.start()))
+        tokens.extend(cjk_bigrams(match.group()))
+        position = match.end()
+    tokens.extend(word.lower() for word in WORD.findall(text, position))
+    return tokens
+
+
+def search_terms(*texts):
+    """文件的搜尋詞（去重、排序，存入 search_terms 陣列）"""
+    terms = set()
+    for text in texts:
+        if text:
+            terms.update(tokenize(text))
+    return sorted(terms)
+
+
+def query_terms(query):
+    """查詢字串的搜尋詞（去重，保留順序）"""
+    return list(dict.fromkeys(tokenize(query)))
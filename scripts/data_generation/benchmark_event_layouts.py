@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+user_events 儲存版面效能比較：一般 collection vs 時間序列 collection
+以相同的生成事件分別寫入 bench_user_events / bench_user_events_ts（各自建立對應索引），比較：
+- 寫入吞吐量（insert_many，每批 --batch-size 筆；事件預先生成，不計入時間）
+- 儲存空間（資料 + 索引，$collStats）
+- 查詢延遲（取中位數）：
+  - user_range ：單一用戶 30 天內的事件
+  - day_by_type：單日所有事件依 event_type 計數
+  - all_by_type：全部事件依 event_type 計數（verify_mongodb 的事件類型分布）
+
+用法：
+    python scripts/data_generation/benchmark_event_layouts.py --events 500000
+    python scripts/data_generation/benchmark_event_layouts.py --events 1000000 --output layouts.json
+"""
+
+import sys
+import json
+import time
+import random
+import argparse
+import statistics
+from pathlib import Path
+from datetime import datetime, timedelta
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from common.db import get_mongo_db, close_all
+from common.event_layout import EVENT_LAYOUTS, create_events_collection, to_timeseries_document
+from generate_mongodb_data import pools, build_event_batch
+
+# ============================================
+# 配置
+# ============================================
+BENCH_COLLECTIONS = {layout: f"bench_{name}" for layout, name in EVENT_LAYOUTS.items()}
+
+# 用戶欄位在各版面中的路徑
+USER_FIELD = {'regular': 'user_id', 'timeseries': 'meta.user_id'}
+
+# 生成事件的時間範圍（與 generate_mongodb_data 相同）
+EVENTS_START = datetime(2022, 1, 1)
+EVENTS_DAYS = 730
+
+# ============================================
+# 量測
+# ============================================
+def generate_batches(count, users, courses, batch_size):
+    """預先生成事件批次（regular 版面）"""
+    user_ids = list(range(1, users + 1))
+    course_ids = list(range(1, courses + 1))
+    search_queries = pools.stream('sentence_3')
+    return [build_event_batch(start, min(start + batch_size, count), user_ids, course_ids, search_queries)
+            for start in range(0, count, batch_size)]
+
+
+def measure_insert(collection, batches):
+    """回傳 (總筆數, 秒數)"""
+    rows = 0
+    started = time.perf_counter()
+    for batch in batches:
+        collection.insert_many(batch, ordered=False)
+        rows += len(batch)
+    return rows, time.perf_counter() - started
+
+
+def storage_stats(collection):
+    """資料、索引大小（bytes）與時間序列的 bucket 數"""
+    stats = next(collection.aggregate([{'$collStats': {'storageStats': {}}}]))['storageStats']
+    return {
+        'storage_bytes': stats.get('storageSize', 0),
+        'index_bytes': stats.get('totalIndexSize', 0),
+        'buckets': stats.get('timeseries', {}).get('bucketCount'),
+    }
+
+
+def timed_median(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(samples), 2)
+
+
+def measure_queries(collection, layout, users, repeat, seed=7):
+    """各版面使用相同的隨機參數，回傳 {查詢: 中位數毫秒}"""
+    user_field = USER_FIELD[layout]
+    rng = random.Random(seed)
+    by_type = [{'$group': {'_id': '$event_type', 'count': {'$sum': 1}}}]
+
+    def user_range():
+        start = EVENTS_START + timedelta(days=rng.randint(0, EVENTS_DAYS - 30))
+        list(collection.find({user_field: rng.randint(1, users),
+                              'timestamp': {'$gte': start, '$lt': start + timedelta(days=30)}}))
+
+    def day_by_type():
+        start = EVENTS_START + timedelta(days=rng.randint(0, EVENTS_DAYS - 1))
+        match = {'$match': {'timestamp': {'$gte': start, '$lt': start + timedelta(days=1)}}}
+        list(collection.aggregate([match] + by_type))
+
+    def all_by_type():
+        list(collection.aggregate(by_type))
+
+    return {
+        'user_range': timed_median(user_range, repeat),
+        'day_by_type': timed_median(day_by_type, repeat),
+        'all_by_type': timed_median(all_by_type, repeat),
+    }
+
+
+def benchmark_layout(db, layout, batches, users, repeat):
+    name = BENCH_COLLECTIONS[layout]
+    db.drop_collection(name)
+    collection = create_events_collection(db, layout, name=name)
+
+    rows, seconds = measure_insert(collection, batches)
+    result = {
+        'layout': layout,
+        'collection': name,
+        'rows': rows,
+        'insert_seconds': round(seconds, 2),
+        'insert_rows_per_second': round(rows / seconds) if seconds else 0,
+    }
+    result.update(storage_stats(collection))
+    result['query_ms'] = measure_queries(collection, layout, users, repeat)
+    return result
+
+# ============================================
+# 主程式
+# ============================================
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='user_events 儲存版面效能比較')
+    parser.add_argument('--events', type=int, default=500000)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--courses', type=int, default=500)
+    parser.add_argument('--batch-size', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5, help='每個查詢重複次數（取中位數）')
+    parser.add_argument('--layouts', nargs='+', choices=list(EVENT_LAYOUTS), default=list(EVENT_LAYOUTS))
+    parser.add_argument('--keep', action='store_true', help='保留測試 collection')
+    parser.add_argument('--output', help='將結果寫入 JSON 檔案')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    print("=" * 60)
+    print("user_events 儲存版面效能比較")
+    print("=" * 60)
+
+    print(f"\n🎲 生成 {args.events:,} 筆事件...")
+    batches = generate_batches(args.events, args.users, args.courses, args.batch_size)
+    # 兩種版面的文件都先轉好，寫入時間只計 insert_many
+    layout_batches = {
+        'regular': batches,
+        'timeseries': [[to_timeseries_document(doc) for doc in batch] for batch in batches],
+    }
+
+    db = get_mongo_db()
+    results = []
+    try:
+        for layout in args.layouts:
+            print(f"\n⏳ {layout}：寫入 {BENCH_COLLECTIONS[layout]}...")
+            results.append(benchmark_layout(db, layout, layout_batches[layout], args.users, args.repeat))
+    finally:
+        if not args.keep:
+            for layout in args.layouts:
+                db.drop_collection(BENCH_COLLECTIONS[layout])
+        close_all()
+
+    print("\n" + "=" * 60)
+    print(f"  {'版面':<12} {'寫入 筆/s':>12} {'資料 MB':>10} {'索引 MB':>10} {'bucket':>10}"
+          f" {'user_range':>12} {'day_by_type':>12} {'all_by_type':>12}")
+    for r in results:
+        queries = r['query_ms']
+        print(f"  {r['layout']:<12} {r['insert_rows_per_second']:>12,} "
+              f"{r['storage_bytes'] / 1024 / 1024:>10.1f} {r['index_bytes'] / 1024 / 1024:>10.1f} "
+              f"{r['buckets'] if r['buckets'] is not None else '-':>10} "
+              f"{queries['user_range']:>10.1f}ms {queries['day_by_type']:>10.1f}ms {queries['all_by_type']:>10.1f}ms")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'events': args.events, 'results': results}, f, ensure_ascii=False, indent=2)
+        print(f"\n📝 結果已寫入：{args.output}")
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
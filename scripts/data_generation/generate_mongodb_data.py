@@ -2,134 +2,188 @@
 """
 MongoDB 測試數據生成器
 生成用戶行為日誌、課程評論、客服工單
+
+參考的用戶 / 課程 ID 預設從 PostgreSQL 讀取；加上 --reference-cache 時改讀
+generate_postgres_data.py 寫出的參考資料快取（reference_cache.py），不需連線 PostgreSQL。
+
+--sink parquet / csv 時不連線 MongoDB，各 collection 直接串流寫到 --output-dir/mongodb（見 sinks.py），
+參考 ID 一律讀取參考資料快取（先以相同的 --sink 執行 generate_postgres_data.py）；
+之後以 load_synthetic_data.py 載入 MongoDB，或以 sessionize_events.py --source parquet --parquet-source <output-dir>/mongodb 分析。
 """
 
+import sys
 import random
-from faker import Faker
+import hashlib
+import argparse
+from pathlib import Path
 from datetime import datetime, timedelta
-from pymongo import MongoClient
 import numpy as np
 from tqdm import tqdm
-import psycopg2
 
-fake = Faker(['zh_TW', 'en_US'])
-Faker.seed(42)
-random.seed(42)
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from common.db import pg_connection, get_mongo_db, close_all
+from common.checkpoint import CheckpointStore
+from common.event_layout import EVENT_LAYOUTS, create_events_collection, to_timeseries_document
+from common.search_text import search_terms
+from reference_cache import ReferenceCache, CACHE_DIR as REFERENCE_CACHE_DIR
+from sinks import SINKS, OUTPUT_DIR, FileSink
+from profiling import StageProfiler, add_profile_arguments
+from value_pool import ValuePool
+
+SEED = 42
+
+USER_EVENT_COUNT = 5000000
+REVIEW_COUNT = 50000
+TICKET_COUNT = 10000
 
-# MongoDB 連線
-MONGO_CONFIG = {
-    'host': 'localhost',
-    'port': 27017,
-    'username': 'admin',
-    'password': 'admin123',
-    'database': 'learnhub_logs'
-}
+# Faker 值池（預先生成並快取，向量化抽樣）
+pools = ValuePool(['zh_TW', 'en_US'], seed=SEED)
+random.seed(SEED)
 
-# PostgreSQL 連線（讀取參考數據）
-PG_CONFIG = {
-    'host': 'localhost',
-    'port': 5433,
-    'database': 'learnhub_prod',
-    'user': 'admin',
-    'password': 'admin123'
-}
+def seed_unit(*keys):
+    """
+    以 (階段, 批次) 重設所有亂數來源（值池、random、np.random）：
+    每個批次的內容只取決於 seed 與批次編號，續跑的結果與一次跑完相同
+    """
+    pools.reseed(*keys)
+    random.seed(int(pools.rng.integers(0, 1 << 63)))
+    np.random.seed(int(pools.rng.integers(0, 1 << 32)))
+
+def clear_partial(collection, id_field, ids):
+    """刪除中斷時可能只寫入一部分的文件（依生成時的固定 ID）"""
+    deleted = collection.delete_many({id_field: {'$in': ids}}).deleted_count
+    if deleted:
+        print(f"  🧹 清除中斷前寫入的 {deleted:,} 筆 {id_field}")
 
 # ============================================
 # 1. 生成用戶行為事件
 # ============================================
-def generate_user_events(collection, user_ids, course_ids, count=5000000):
-    """生成用戶行為日誌"""
-    print(f"\n📊 生成 {count:,} 筆用戶行為事件...")
-    
-    event_types = [
-        'page_view',
-        'video_start',
-        'video_progress',
-        'video_complete',
-        'course_enroll',
-        'search',
-        'download',
-        'login',
-        'logout'
-    ]
-    
-    devices = [
-        {'type': 'desktop', 'os': 'Windows', 'browser': 'Chrome'},
-        {'type': 'desktop', 'os': 'MacOS', 'browser': 'Safari'},
-        {'type': 'mobile', 'os': 'iOS', 'browser': 'Safari'},
-        {'type': 'mobile', 'os': 'Android', 'browser': 'Chrome'},
-        {'type': 'tablet', 'os': 'iOS', 'browser': 'Safari'}
-    ]
+EVENT_TYPES = [
+    'page_view',
+    'video_start',
+    'video_progress',
+    'video_complete',
+    'course_enroll',
+    'search',
+    'download',
+    'login',
+    'logout'
+]
+
+DEVICES = [
+    {'type': 'desktop', 'os': 'Windows', 'browser': 'Chrome'},
+    {'type': 'desktop', 'os': 'MacOS', 'browser': 'Safari'},
+    {'type': 'mobile', 'os': 'iOS', 'browser': 'Safari'},
+    {'type': 'mobile', 'os': 'Android', 'browser': 'Chrome'},
+    {'type': 'tablet', 'os': 'iOS', 'browser': 'Safari'}
+]
+
+def build_event_batch(batch_start, batch_end, user_ids, course_ids, search_queries):
+    """生成 event_id 為 batch_start+1 … batch_end 的事件文件（regular 版面）"""
+    batch_data = []
     
-    batch_size = 10000
+    # 整批向量化抽樣
+    n = batch_end - batch_start
+    session_ids = pools.uuid4(n)
+    cities = pools.draw('city', n)
+    ip_addresses = pools.draw('ipv4', n)
     
-    for batch_start in tqdm(range(0, count, batch_size)):
-        batch_end = min(batch_start + batch_size, count)
-        batch_data = []
+    for offset, i in enumerate(range(batch_start, batch_end)):
+        user_id = random.choice(user_ids)
+        event_type = random.choice(EVENT_TYPES)
         
-        for i in range(batch_start, batch_end):
-            user_id = random.choice(user_ids)
-            event_type = random.choice(event_types)
-            
-            # 時間戳（過去 2 年內）
-            timestamp = datetime(2022, 1, 1) + timedelta(
-                seconds=random.randint(0, 63072000)  # 2 年的秒數
-            )
-            
-            device = random.choice(devices)
-            
-            # 事件屬性
-            properties = {}
-            
-            if event_type in ['video_start', 'video_progress', 'video_complete']:
-                course_id = random.choice(course_ids)
-                properties = {
-                    'course_id': course_id,
-                    'video_id': f"vid_{random.randint(1, 50)}",
-                    'watch_duration': random.randint(10, 3600),
-                    'quality': random.choice(['360p', '720p', '1080p'])
-                }
-                
-                if event_type == 'video_progress':
-                    properties['completion_rate'] = round(random.uniform(0.1, 0.9), 2)
-            
-            elif event_type == 'search':
-                properties = {
-                    'query': fake.sentence(nb_words=3),
-                    'results_count': random.randint(0, 100)
-                }
-            
-            elif event_type == 'course_enroll':
-                properties = {
-                    'course_id': random.choice(course_ids),
-                    'source': random.choice(['search', 'recommendation', 'direct'])
-                }
-            
-            doc = {
-                'event_id': f"evt_{i+1}",
-                'user_id': user_id,
-                'session_id': fake.uuid4(),
-                'event_type': event_type,
-                'timestamp': timestamp,
-                'properties': properties,
-                'device': device,
-                'location': {
-                    'country': random.choice(['TW', 'SG', 'HK', 'MY', 'VN']),
-                    'city': fake.city(),
-                    'ip_address': fake.ipv4()
-                }
+        # 時間戳（過去 2 年內）
+        timestamp = datetime(2022, 1, 1) + timedelta(
+            seconds=random.randint(0, 63072000)  # 2 年的秒數
+        )
+        
+        device = random.choice(DEVICES)
+        
+        # 事件屬性
+        properties = {}
+        
+        if event_type in ['video_start', 'video_progress', 'video_complete']:
+            course_id = random.choice(course_ids)
+            properties = {
+                'course_id': course_id,
+                'video_id': f"vid_{random.randint(1, 50)}",
+                'watch_duration': random.randint(10, 3600),
+                'quality': random.choice(['360p', '720p', '1080p'])
             }
             
-            batch_data.append(doc)
+            if event_type == 'video_progress':
+                properties['completion_rate'] = round(random.uniform(0.1, 0.9), 2)
+        
+        elif event_type == 'search':
+            properties = {
+                'query': next(search_queries),
+                'results_count': random.randint(0, 100)
+            }
         
+        elif event_type == 'course_enroll':
+            properties = {
+                'course_id': random.choice(course_ids),
+                'source': random.choice(['search', 'recommendation', 'direct'])
+            }
+        
+        doc = {
+            'event_id': f"evt_{i+1}",
+            'user_id': user_id,
+            'session_id': session_ids[offset],
+            'event_type': event_type,
+            'timestamp': timestamp,
+            'properties': properties,
+            'device': device,
+            'location': {
+                'country': random.choice(['TW', 'SG', 'HK', 'MY', 'VN']),
+                'city': cities[offset],
+                'ip_address': ip_addresses[offset]
+            }
+        }
+        
+        batch_data.append(doc)
+    
+    return batch_data
+
+def generate_user_events(collection, user_ids, course_ids, count=USER_EVENT_COUNT, layout='regular',
+                         checkpoint=None):
+    """
+    生成用戶行為日誌（layout='timeseries' 時寫入時間序列版面）
+    每批以 seed_unit('user_events', 批次) 重設亂數；有 checkpoint 時略過已完成的批次
+    """
+    print(f"\n📊 生成 {count:,} 筆用戶行為事件（{layout}）...")
+    
+    batch_size = 10000
+    # 續跑時第一個未完成的批次可能只寫入了一部分
+    needs_cleanup = checkpoint is not None and checkpoint.resumed
+    
+    for batch_index, batch_start in enumerate(tqdm(range(0, count, batch_size))):
+        key = f"user_events:{batch_index}"
+        if checkpoint is not None and checkpoint.is_done(key):
+            continue
+        
+        batch_end = min(batch_start + batch_size, count)
+        seed_unit('user_events', batch_index)
+        search_queries = pools.stream('sentence_3')
+        batch_data = build_event_batch(batch_start, batch_end, user_ids, course_ids, search_queries)
+        if needs_cleanup:
+            clear_partial(collection, 'event_id', [doc['event_id'] for doc in batch_data])
+            needs_cleanup = False
+        if layout == 'timeseries':
+            batch_data = [to_timeseries_document(doc) for doc in batch_data]
         collection.insert_many(batch_data)
+        
+        if checkpoint is not None:
+            checkpoint.mark_done(key, first_event_id=batch_data[0]['event_id'], rows=len(batch_data),
+                                 seed=[SEED, 'user_events', batch_index])
     
     print(f"✅ 已生成 {count:,} 筆用戶行為事件")
 
 # ============================================
 # 2. 生成課程評論
 # ============================================
-def generate_course_reviews(collection, user_ids, course_ids, count=50000):
+def generate_course_reviews(collection, user_ids, course_ids, count=REVIEW_COUNT):
     """生成課程評論"""
     print(f"\n⭐ 生成 {count:,} 筆課程評論...")
     
@@ -160,6 +214,9 @@ def generate_course_reviews(collection, user_ids, course_ids, count=50000):
     ]
     
     batch_data = []
+    sentences = pools.stream('sentence')
+    titles = pools.stream('sentence_5')
+    reply_ids = pools.stream_uuid4()
     
     for i in tqdm(range(count)):
         user_id = random.choice(user_ids)
@@ -171,9 +228,9 @@ def generate_course_reviews(collection, user_ids, course_ids, count=50000):
         
         # 根據評分選擇評論
         if rating >= 4.0:
-            comment = random.choice(positive_comments) + " " + fake.sentence()
+            comment = random.choice(positive_comments) + " " + next(sentences)
         else:
-            comment = random.choice(negative_comments) + " " + fake.sentence()
+            comment = random.choice(negative_comments) + " " + next(sentences)
         
         # 隨機標籤
         tags = random.sample(tags_pool, k=random.randint(1, 3))
@@ -183,13 +240,15 @@ def generate_course_reviews(collection, user_ids, course_ids, count=50000):
         
         created_at = datetime(2022, 1, 1) + timedelta(days=random.randint(0, 730))
         
+        title = next(titles)
         doc = {
             'review_id': f"rev_{i+1}",
             'user_id': user_id,
             'course_id': course_id,
             'rating': rating,
-            'title': fake.sentence(nb_words=5),
+            'title': title,
             'comment': comment,
+            'search_terms': search_terms(title, comment),
             'tags': tags,
             'helpful_count': helpful_count,
             'replies': [],
@@ -200,10 +259,10 @@ def generate_course_reviews(collection, user_ids, course_ids, count=50000):
         # 10% 的評論有講師回覆
         if random.random() < 0.1:
             doc['replies'].append({
-                'reply_id': f"rep_{fake.uuid4()}",
+                'reply_id': f"rep_{next(reply_ids)}",
                 'user_id': 9999,
                 'user_name': '講師回覆',
-                'comment': '感謝您的寶貴意見！' + fake.sentence(),
+                'comment': '感謝您的寶貴意見！' + next(sentences),
                 'created_at': created_at + timedelta(days=random.randint(1, 7))
             })
         
@@ -222,7 +281,7 @@ def generate_course_reviews(collection, user_ids, course_ids, count=50000):
 # ============================================
 # 3. 生成客服工單
 # ============================================
-def generate_support_tickets(collection, user_ids, count=10000):
+def generate_support_tickets(collection, user_ids, count=TICKET_COUNT):
     """生成客服工單"""
     print(f"\n🎫 生成 {count:,} 筆客服工單...")
     
@@ -239,6 +298,10 @@ def generate_support_tickets(collection, user_ids, count=10000):
     statuses = ['open', 'in_progress', 'waiting_user', 'resolved', 'closed']
     
     batch_data = []
+    names = pools.stream('name')
+    subjects = pools.stream('sentence_6')
+    message_texts = pools.stream('sentence_15')
+    message_ids = pools.stream_uuid4()
     
     for i in tqdm(range(count)):
         user_id = random.choice(user_ids)
@@ -255,10 +318,10 @@ def generate_support_tickets(collection, user_ids, count=10000):
         for j in range(num_messages):
             sender = 'user' if j % 2 == 0 else 'agent'
             messages.append({
-                'message_id': f"msg_{fake.uuid4()}",
+                'message_id': f"msg_{next(message_ids)}",
                 'sender': sender,
-                'sender_name': fake.name() if sender == 'user' else '客服專員',
-                'text': fake.sentence(nb_words=15),
+                'sender_name': next(names) if sender == 'user' else '客服專員',
+                'text': next(message_texts),
                 'timestamp': created_at + timedelta(hours=j * 2),
                 'attachments': []
             })
@@ -270,7 +333,7 @@ def generate_support_tickets(collection, user_ids, count=10000):
         doc = {
             'ticket_id': f"tick_{i+1}",
             'user_id': user_id,
-            'subject': fake.sentence(nb_words=6),
+            'subject': next(subjects),
             'issue_type': issue_type,
             'priority': priority,
             'status': status,
@@ -297,56 +360,157 @@ def generate_support_tickets(collection, user_ids, count=10000):
 # ============================================
 # 主程式
 # ============================================
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='LearnHub MongoDB 測試數據生成器')
+    parser.add_argument('--events-layout', choices=list(EVENT_LAYOUTS), default='regular',
+                        help='user_events 儲存版面（timeseries 寫入 user_events_ts 時間序列 collection）')
+    parser.add_argument('--resume', action='store_true',
+                        help='接續中斷的執行：不再詢問是否清空，略過已完成的批次與階段')
+    parser.add_argument('--reference-cache', nargs='?', const=REFERENCE_CACHE_DIR, default=None,
+                        help=f'改從參考資料快取讀取用戶 / 課程 ID（不指定路徑時為 {REFERENCE_CACHE_DIR}）')
+    parser.add_argument('--sink', choices=SINKS, default='db',
+                        help='輸出目的地：db 寫入 MongoDB；parquet / csv（JSON Lines）直接寫檔，不連線資料庫')
+    parser.add_argument('--output-dir', default=OUTPUT_DIR,
+                        help='--sink parquet / csv 的輸出目錄（collection 寫在 <output-dir>/mongodb）')
+    add_profile_arguments(parser)
+    return parser.parse_args(argv)
+
+def load_reference_ids(cursor):
+    """從 PostgreSQL 讀取用戶和課程 ID"""
+    # 固定排序，續跑時取得相同的參考 ID
+    cursor.execute("SELECT user_id FROM users ORDER BY user_id LIMIT 10000;")
+    user_ids = [row[0] for row in cursor.fetchall()]
+    
+    cursor.execute("SELECT course_id FROM courses ORDER BY course_id;")
+    course_ids = [row[0] for row in cursor.fetchall()]
+    return user_ids, course_ids
+
+def open_file_sink(args):
+    """--sink parquet / csv：建立 FileSink，輸出目錄已有資料時詢問是否清空"""
+    sink = FileSink(Path(args.output_dir) / 'mongodb', args.sink)
+    print(f"\n📁 輸出到 {sink.directory}（{args.sink}）")
+    if sink.exists():
+        print("\n⚠️  輸出目錄已有資料，是否清空？(y/n): ", end='')
+        if input().lower() != 'y':
+            raise SystemExit("已取消：請指定其他 --output-dir")
+        sink.clear()
+        print("✅ 輸出目錄已清空")
+    return sink
+
+def main(argv=None):
+    args = parse_args(argv)
+    profiler = StageProfiler.from_args('generate_mongodb_data', args)
+    
     print("=" * 60)
     print("LearnHub MongoDB 測試數據生成器")
     print("=" * 60)
     
+    to_files = args.sink != 'db'
+    if to_files:
+        if args.resume:
+            print("❌ --resume 只適用於 --sink db")
+            return 1
+        if args.events_layout != 'regular':
+            print("ℹ️  檔案輸出與 --events-layout 無關，user_events 一律以一般文件寫出")
+        # 不連線 PostgreSQL，參考 ID 一律讀取快取
+        args.reference_cache = args.reference_cache or REFERENCE_CACHE_DIR
+    
     try:
-        # 從 PostgreSQL 讀取用戶和課程 ID
-        print("\n🔌 連接 PostgreSQL 讀取參考數據...")
-        pg_conn = psycopg2.connect(**PG_CONFIG)
-        cursor = pg_conn.cursor()
-        
-        cursor.execute("SELECT user_id FROM users LIMIT 10000;")
-        user_ids = [row[0] for row in cursor.fetchall()]
-        
-        cursor.execute("SELECT course_id FROM courses;")
-        course_ids = [row[0] for row in cursor.fetchall()]
-        
-        cursor.close()
-        pg_conn.close()
+        if args.reference_cache:
+            # 從參考資料快取讀取（與 load_reference_ids 相同：前 10,000 位用戶、全部課程，依 ID 排序）
+            print(f"\n📦 讀取參考資料快取：{args.reference_cache}")
+            cache = ReferenceCache.load(args.reference_cache)
+            user_ids = cache.keys('users')[:10000].tolist()
+            course_ids = cache.keys('courses').tolist()
+            print(f"   建立於 {cache.created_at}：{cache.summary()}")
+        else:
+            # 從 PostgreSQL 讀取用戶和課程 ID
+            print("\n🔌 連接 PostgreSQL 讀取參考數據...")
+            with pg_connection() as pg_conn:
+                cursor = profiler.wrap_cursor(pg_conn.cursor())
+                user_ids, course_ids = profiler.run('load_reference_ids', load_reference_ids, cursor)
+                cursor.close()
         
         print(f"✅ 讀取到 {len(user_ids):,} 位用戶, {len(course_ids):,} 門課程")
         
-        # 連接 MongoDB
-        print("\n🔌 連接 MongoDB...")
-        client = MongoClient(
-            f"mongodb://{MONGO_CONFIG['username']}:{MONGO_CONFIG['password']}@{MONGO_CONFIG['host']}:{MONGO_CONFIG['port']}/"
-        )
-        db = client[MONGO_CONFIG['database']]
-        print("✅ MongoDB 連線成功")
-        
-        # 清空現有數據
-        print("\n⚠️  是否清空現有數據？(y/n): ", end='')
-        if input().lower() == 'y':
-            print("🗑️  清空現有數據...")
-            db.user_events.drop()
-            db.course_reviews.drop()
-            db.support_tickets.drop()
-            print("✅ 數據已清空")
+        if to_files:
+            sink = open_file_sink(args)
+            events = sink.collection('user_events')
+            reviews = sink.collection('course_reviews')
+            tickets = sink.collection('support_tickets')
+            # 檔案輸出不記錄檢查點
+            checkpoint = None
+            resuming = False
+        else:
+            # 連接 MongoDB
+            print("\n🔌 連接 MongoDB...")
+            db = get_mongo_db()
+            print("✅ MongoDB 連線成功")
+            
+            # 檢查點：參數或參考 ID 不同時不得續跑
+            reference_digest = hashlib.sha256(repr((user_ids, course_ids)).encode('utf-8')).hexdigest()[:16]
+            checkpoint = CheckpointStore('generate_mongodb_data', params={
+                'seed': SEED,
+                'layout': args.events_layout,
+                'counts': [USER_EVENT_COUNT, REVIEW_COUNT, TICKET_COUNT],
+                'reference_ids': reference_digest,
+            })
+            checkpoint.start(resume=args.resume)
+            resuming = checkpoint.resumed
+            
+            if resuming:
+                print(f"\n⏯️  接續先前的執行：已完成 {len(checkpoint.state['completed']):,} 個批次/階段")
+            else:
+                # 清空現有數據
+                print("\n⚠️  是否清空現有數據？(y/n): ", end='')
+                if input().lower() == 'y':
+                    print("🗑️  清空現有數據...")
+                    db[EVENT_LAYOUTS[args.events_layout]].drop()
+                    db.course_reviews.drop()
+                    db.support_tickets.drop()
+                    print("✅ 數據已清空")
+            
+            events = create_events_collection(db, args.events_layout)
+            reviews = db.course_reviews
+            tickets = db.support_tickets
         
         # 開始生成數據
         start_time = datetime.now()
         
-        # 1. 用戶行為事件
-        generate_user_events(db.user_events, user_ids, course_ids, count=5000000)
+        # 1. 用戶行為事件（逐批記錄檢查點）
+        profiler.run('generate_user_events', generate_user_events,
+                     profiler.wrap_collection(events), user_ids, course_ids, count=USER_EVENT_COUNT,
+                     layout='regular' if to_files else args.events_layout, checkpoint=checkpoint)
         
         # 2. 課程評論
-        generate_course_reviews(db.course_reviews, user_ids, course_ids, count=50000)
+        if checkpoint is not None and checkpoint.is_done('course_reviews'):
+            print("\n⏭️  課程評論已於先前的執行完成")
+        else:
+            if resuming:
+                clear_partial(reviews, 'review_id', [f"rev_{i+1}" for i in range(REVIEW_COUNT)])
+            seed_unit('course_reviews')
+            profiler.run('generate_course_reviews', generate_course_reviews,
+                         profiler.wrap_collection(reviews), user_ids, course_ids, count=REVIEW_COUNT)
+            if checkpoint is not None:
+                checkpoint.mark_done('course_reviews', rows=REVIEW_COUNT, seed=[SEED, 'course_reviews'])
         
         # 3. 客服工單
-        generate_support_tickets(db.support_tickets, user_ids, count=10000)
+        if checkpoint is not None and checkpoint.is_done('support_tickets'):
+            print("\n⏭️  客服工單已於先前的執行完成")
+        else:
+            if resuming:
+                clear_partial(tickets, 'ticket_id', [f"tick_{i+1}" for i in range(TICKET_COUNT)])
+            seed_unit('support_tickets')
+            profiler.run('generate_support_tickets', generate_support_tickets,
+                         profiler.wrap_collection(tickets), user_ids, count=TICKET_COUNT)
+            if checkpoint is not None:
+                checkpoint.mark_done('support_tickets', rows=TICKET_COUNT, seed=[SEED, 'support_tickets'])
+        
+        if to_files:
+            # 關閉分片並寫出 manifest（csv 另有 load_mongodb.sh）
+            profiler.run('finish', sink.finish)
+        else:
+            checkpoint.finish()
         
         # 完成
         elapsed = datetime.now() - start_time
@@ -357,11 +521,16 @@ def main():
         print()
         
         # 統計
-        print(f"📊 用戶行為事件：{db.user_events.count_documents({}):,}")
-        print(f"⭐ 課程評論：{db.course_reviews.count_documents({}):,}")
-        print(f"🎫 客服工單：{db.support_tickets.count_documents({}):,}")
+        if to_files:
+            for name, info in sink.entities.items():
+                print(f"📄 {name:<16} {info['rows']:>12,} 筆  {len(info['files'])} 個檔案")
+        else:
+            print(f"📊 用戶行為事件：{events.count_documents({}):,}")
+            print(f"⭐ 課程評論：{reviews.count_documents({}):,}")
+            print(f"🎫 客服工單：{tickets.count_documents({}):,}")
         
-        client.close()
+        profiler.report()
+        close_all()
         
     except Exception as e:
         print(f"\n❌ 錯誤：{e}")
@@ -369,4 +538,4 @@ def main():
         traceback.print_exc()
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
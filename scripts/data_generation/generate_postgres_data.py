@@ -2,31 +2,33 @@
 """
 PostgreSQL 測試數據生成器 - 優化版
 解決 psycopg2 executemany 與 RETURNING 的衝突問題
+
+--sink parquet / csv 時不連線資料庫，各資料表直接串流寫到 --output-dir/postgres（見 sinks.py），
+之後可再以 load_synthetic_data.py（parquet / csv）或 load_postgres.sql（csv）批次載入，
+或直接作為 profile_parquet / lake_metrics 的 Parquet 來源（--source <output-dir>/postgres）
 """
 
+import sys
 import random
-import psycopg2
-from psycopg2.extras import execute_values  # 引入高效批次插入工具
-from faker import Faker
+import argparse
+from pathlib import Path
 from datetime import datetime, timedelta
 import numpy as np
 from tqdm import tqdm
 
-# 初始化 Faker
-fake = Faker(['zh_TW', 'en_US'])
-Faker.seed(42)
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from common.db import acquire_pg_connection, release_pg_connection, close_all
+from profiling import StageProfiler, add_profile_arguments
+from reference_cache import ReferenceCache, CACHE_DIR as REFERENCE_CACHE_DIR
+from sinks import SINKS, OUTPUT_DIR, DbSink, FileSink
+from value_pool import ValuePool
+
+# 初始化 Faker 值池（預先生成並快取，向量化抽樣）
+pools = ValuePool(['zh_TW', 'en_US'], seed=42)
 random.seed(42)
 np.random.seed(42)
 
-# 資料庫連線配置
-DB_CONFIG = {
-    'host': 'localhost',
-    'port': 5433,
-    'database': 'learnhub_prod',
-    'user': 'admin',
-    'password': 'admin123'
-}
-
 # 業務參數
 START_DATE = datetime(2022, 1, 1)
 END_DATE = datetime(2024, 1, 8)
@@ -50,7 +52,7 @@ def weighted_choice(choices):
 
 # --- 數據生成函式 ---
 
-def generate_categories(cursor):
+def generate_categories(sink):
     print("\n📂 生成課程分類...")
     categories = [
         ('程式開發', 'programming', '學習各種程式語言和開發技能'),
@@ -69,44 +71,47 @@ def generate_categories(cursor):
         ('教學教育', 'teaching', '教學方法、課程設計'),
         ('資訊安全', 'cybersecurity', '網路安全、資安防護')
     ]
-    query = "INSERT INTO course_categories (category_name, category_slug, description) VALUES %s ON CONFLICT (category_slug) DO NOTHING"
-    execute_values(cursor, query, categories)
+    sink.insert('course_categories', categories, on_conflict="(category_slug) DO NOTHING")
     print(f"✅ 已生成 {len(categories)} 個分類")
 
-def generate_instructors(cursor, count=200):
+def generate_instructors(sink, count=200):
     print(f"\n👨‍🏫 生成 {count} 位講師...")
     instructor_data = []
-    for _ in range(count):
+    names = pools.draw('name', count)
+    emails = pools.unique('email', count)  # email 有 UNIQUE 限制
+    bios = pools.draw('text_300', count)
+    for name, email, bio in zip(names, emails, bios):
         instructor_data.append((
-            fake.name(),
-            fake.email(),
-            fake.text(max_nb_chars=300),
+            name,
+            email,
+            bio,
             START_DATE + timedelta(days=random.randint(0, TOTAL_DAYS - 180)),
             True
         ))
     
-    query = "INSERT INTO instructors (full_name, email, bio, joined_date, is_active) VALUES %s RETURNING instructor_id"
-    # 使用 fetch=True 獲取回傳的 ID
-    ids = execute_values(cursor, query, instructor_data, fetch=True)
+    ids = sink.insert('instructors', instructor_data, returning=('instructor_id',))
     print(f"✅ 已生成 {len(ids)} 位講師")
     return [row[0] for row in ids]
 
-def generate_courses(cursor, instructor_ids, count=2000):
+def generate_courses(sink, instructor_ids, cache, count=2000):
     print(f"\n📚 生成 {count} 門課程...")
-    cursor.execute("SELECT category_id FROM course_categories;")
-    category_ids = [row[0] for row in cursor.fetchall()]
+    category_ids = sink.category_ids()
     
     difficulty_levels = ['beginner', 'intermediate', 'advanced', 'all_levels']
     languages = ['zh-TW', 'en-US', 'zh-CN']
     
     course_data = []
+    catch_phrases = pools.draw('catch_phrase', count)
+    bs_phrases = pools.draw('bs', count)
+    slugs = pools.draw('slug', count)
+    descriptions = pools.draw('text_500', count)
     for i in range(count):
         is_published = random.random() < 0.9
         pub_date = START_DATE + timedelta(days=random.randint(0, TOTAL_DAYS - 30))
         course_data.append((
-            f"{fake.catch_phrase()} - {fake.bs()}",
-            f"course-{i+1}-{fake.slug()}",
-            fake.text(max_nb_chars=500),
+            f"{catch_phrases[i]} - {bs_phrases[i]}",
+            f"course-{i+1}-{slugs[i]}",
+            descriptions[i],
             random.choice(instructor_ids),
             random.choice(category_ids),
             random.choice(difficulty_levels),
@@ -118,66 +123,49 @@ def generate_courses(cursor, instructor_ids, count=2000):
             pub_date if is_published else None
         ))
     
-    query = """
-        INSERT INTO courses (
-            title, slug, description, instructor_id, category_id,
-            difficulty_level, duration_minutes, total_lectures,
-            language, price_usd, is_published, published_date
-        ) VALUES %s RETURNING course_id
-    """
-    ids = execute_values(cursor, query, course_data, fetch=True)
+    ids = sink.insert('courses', course_data, returning=('course_id', 'duration_minutes'))
+    cache.put('courses', [row[0] for row in ids], duration_minutes=[row[1] for row in ids])
     print(f"✅ 已生成 {len(ids)} 門課程")
     return [row[0] for row in ids]
 
-def generate_users(cursor, count=50000):
+def generate_users(sink, cache, count=50000):
     print(f"\n👥 生成 {count} 位用戶...")
     user_ids = []
+    signup_dates = []
     batch_size = 5000 # 增加批次大小提高效率
     
     for batch_start in tqdm(range(0, count, batch_size)):
         batch_end = min(batch_start + batch_size, count)
         batch_data = []
-        for i in range(batch_start, batch_end):
+        names = pools.draw('name', batch_end - batch_start)
+        password_hashes = pools.hex(batch_end - batch_start)
+        for offset, i in enumerate(range(batch_start, batch_end)):
             batch_data.append((
                 f"user{i+1}@example.com",
                 f"user{i+1}",
-                fake.name(),
-                fake.sha256(),
+                names[offset],
+                password_hashes[offset],
                 get_signup_date(),
                 weighted_choice(COUNTRIES),
                 random.random() < 0.8,
                 random.random() < 0.7
             ))
         
-        query = """
-            INSERT INTO users (
-                email, username, full_name, password_hash,
-                signup_date, country, is_active, email_verified
-            ) VALUES %s RETURNING user_id
-        """
-        # 修正：使用 execute_values 並設定 fetch=True 獲取 ID
-        results = execute_values(cursor, query, batch_data, fetch=True)
+        results = sink.insert('users', batch_data, returning=('user_id', 'signup_date'))
         user_ids.extend([row[0] for row in results])
-        
+        signup_dates.extend([row[1] for row in results])
+    
+    cache.put('users', user_ids, signup_date=signup_dates)
     print(f"✅ 已生成 {len(user_ids)} 位用戶")
     return user_ids
 
-def generate_subscriptions(cursor, user_ids, count=120000):
+def generate_subscriptions(sink, user_ids, cache, count=120000):
     print(f"\n💳 生成 {count} 筆訂閱記錄...")
-    cursor.execute("SELECT plan_id, plan_type FROM subscription_plans;")
-    plans = {row[1]: row[0] for row in cursor.fetchall()}
+    plans = {plan_type: plan_id for plan_id, plan_type, _, _ in sink.subscription_plans()}
     
     plan_weights = {'basic': 0.45, 'professional': 0.40, 'enterprise': 0.15}
     subscription_data = []
     
-    # 為了後續 Payment 生成，需要暫存一些資訊
-    # 但為了效能，我們分批寫入資料庫
-    all_sub_info = []
-    batch_size = 10000
-    
-    # 獲取所有用戶註冊日期，減少重複查詢
-    cursor.execute("SELECT user_id, signup_date FROM users")
-    user_signup_map = {row[0]: row[1] for row in cursor.fetchall()}
 
     for _ in tqdm(range(count)):
         user_id = random.choice(user_ids)
@@ -185,7 +173,7 @@ def generate_subscriptions(cursor, user_ids, count=120000):
         plan_id = plans[plan_type]
         billing_cycle = random.choices(['monthly', 'annual'], weights=[0.8, 0.2])[0]
         
-        signup_date = user_signup_map[user_id]
+        signup_date = cache.get('users', 'signup_date', user_id)
         start_date = signup_date + timedelta(days=random.randint(0, 30))
         
         if random.random() < 0.8:
@@ -200,31 +188,30 @@ def generate_subscriptions(cursor, user_ids, count=120000):
             start_date, end_date, cancelled_at, status == 'active'
         ))
 
-    query = """
-        INSERT INTO subscriptions (
-            user_id, plan_id, status, billing_cycle,
-            start_date, end_date, cancelled_at, auto_renew
-        ) VALUES %s RETURNING subscription_id, user_id, start_date
-    """
-    results = execute_values(cursor, query, subscription_data, fetch=True)
+    results = sink.insert('subscriptions', subscription_data,
+                          returning=('subscription_id', 'user_id', 'plan_id', 'status', 'billing_cycle', 'start_date'))
+    # 付款階段所需的訂閱資訊直接留在快取，不再回頭 SELECT subscriptions
+    sub_ids, sub_users, plan_ids, statuses, cycles, start_dates = zip(*results)
+    cache.put('subscriptions', sub_ids, user_id=sub_users, plan_id=plan_ids, status=statuses,
+              billing_cycle=cycles, start_date=start_dates)
     print(f"✅ 已生成 {len(results)} 筆訂閱")
-    return results # 回傳包含 (id, user_id, start_date) 的元組列表
+    return list(sub_ids)
 
-def generate_payments(cursor, subscription_results):
+def generate_payments(sink, cache):
     print(f"\n💰 生成付款記錄...")
     
     # 預先載入方案價格
-    cursor.execute("SELECT plan_id, price_monthly, price_annual FROM subscription_plans")
-    plans_price = {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+    plans_price = {plan_id: (monthly, annual) for plan_id, _, monthly, annual in sink.subscription_plans()}
     
-    # 預先載入訂閱的方案 ID (subscription_results 只包含 ID, User, Date)
-    # 這裡需要訂閱與方案的對應關係
-    cursor.execute("SELECT subscription_id, plan_id, status, billing_cycle FROM subscriptions")
-    sub_detail_map = {row[0]: (row[1], row[2], row[3]) for row in cursor.fetchall()}
+    # 訂閱資訊（依 subscription_id 排序，與 RETURNING 的順序相同）
+    subscriptions = zip(*(cache.column('subscriptions', column).tolist() for column in
+                          ('key', 'user_id', 'plan_id', 'status', 'billing_cycle', 'start_date')))
 
     payment_data = []
-    for sub_id, user_id, start_date in tqdm(subscription_results):
-        plan_id, status, billing_cycle = sub_detail_map[sub_id]
+    total = 0
+    txn_ids = pools.stream_unique_uuid4()  # transaction_id 有 UNIQUE 限制
+    for sub_id, user_id, plan_id, status, billing_cycle, start_date in tqdm(subscriptions,
+                                                                           total=len(cache.keys('subscriptions'))):
         price_monthly, price_annual = plans_price[plan_id]
         
         if status == 'active':
@@ -241,98 +228,136 @@ def generate_payments(cursor, subscription_results):
             payment_data.append((
                 sub_id, user_id, float(price_monthly if billing_cycle == 'monthly' else price_annual),
                 'USD', random.choice(['credit_card', 'paypal', 'bank_transfer']),
-                'succeeded' if is_success else 'failed', f"txn_{fake.uuid4()}",
+                'succeeded' if is_success else 'failed', f"txn_{next(txn_ids)}",
                 random.choice(['stripe', 'paypal', 'ecpay']), pay_date if is_success else None
             ))
+        
+        # 支付數據通常很多，每滿 10000 筆就寫出，不在記憶體中累積整張表
+        if len(payment_data) >= 10000:
+            sink.insert('payments', payment_data)
+            total += len(payment_data)
+            payment_data = []
 
-    query = """
-        INSERT INTO payments (
-            subscription_id, user_id, amount, currency,
-            payment_method, payment_status, transaction_id,
-            payment_gateway, paid_at
-        ) VALUES %s
-    """
-    # 支付數據通常很多，分批寫入
-    for i in range(0, len(payment_data), 10000):
-        execute_values(cursor, query, payment_data[i:i+10000])
-    print(f"✅ 已生成 {len(payment_data)} 筆付款記錄")
+    if payment_data:
+        sink.insert('payments', payment_data)
+        total += len(payment_data)
+    print(f"✅ 已生成 {total} 筆付款記錄")
 
-def generate_enrollments(cursor, user_ids, course_ids, count=300000):
+def generate_enrollments(sink, user_ids, course_ids, cache, count=300000):
     print(f"\n📖 生成 {count} 筆課程註冊...")
-    
-    cursor.execute("SELECT user_id, signup_date FROM users")
-    user_signup_map = {row[0]: row[1] for row in cursor.fetchall()}
-    cursor.execute("SELECT course_id, duration_minutes FROM courses")
-    course_duration_map = {row[0]: row[1] for row in cursor.fetchall()}
 
     enrollment_data = []
+    # (user_id, course_id) 有 UNIQUE 限制；檔案輸出沒有 ON CONFLICT，重複的組合在這裡先排除
+    enrolled = set()
     for _ in range(count):
         user_id = random.choice(user_ids)
         course_id = random.choice(course_ids)
-        signup_date = user_signup_map[user_id]
+        signup_date = cache.get('users', 'signup_date', user_id)
         enrolled_at = signup_date + timedelta(days=random.randint(0, 365))
         
         if enrolled_at > END_DATE: continue
         
         progress = random.choices([0, 25, 50, 75, 100], weights=[0.3, 0.2, 0.2, 0.15, 0.15])[0]
         comp_at = enrolled_at + timedelta(days=random.randint(7, 60)) if progress == 100 else None
-        watch_time = int(course_duration_map[course_id] * progress / 100)
+        watch_time = int(cache.get('courses', 'duration_minutes', course_id) * progress / 100)
+        
+        if (user_id, course_id) in enrolled: continue
+        enrolled.add((user_id, course_id))
         
         enrollment_data.append((user_id, course_id, enrolled_at, progress, comp_at, watch_time))
+        if len(enrollment_data) >= 10000:
+            sink.insert('course_enrollments', enrollment_data, on_conflict="(user_id, course_id) DO NOTHING")
+            enrollment_data = []
 
-    # 處理衝突並寫入
-    query = """
-        INSERT INTO course_enrollments (
-            user_id, course_id, enrolled_at, progress_percentage,
-            completed_at, total_watch_time_minutes
-        ) VALUES %s ON CONFLICT (user_id, course_id) DO NOTHING
-    """
-    for i in range(0, len(enrollment_data), 10000):
-        execute_values(cursor, query, enrollment_data[i:i+10000])
-    print(f"✅ 已完成課程註冊數據生成")
+    if enrollment_data:
+        sink.insert('course_enrollments', enrollment_data, on_conflict="(user_id, course_id) DO NOTHING")
+    print(f"✅ 已生成 {len(enrolled)} 筆課程註冊")
 
 # --- 主程式 ---
 
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='LearnHub PostgreSQL 測試數據生成器')
+    parser.add_argument('--sink', choices=SINKS, default='db',
+                        help='輸出目的地：db 寫入 PostgreSQL；parquet / csv 直接寫檔，不連線資料庫')
+    parser.add_argument('--output-dir', default=OUTPUT_DIR,
+                        help='--sink parquet / csv 的輸出目錄（資料表寫在 <output-dir>/postgres）')
+    parser.add_argument('--reference-cache', default=REFERENCE_CACHE_DIR,
+                        help='完成後將參考資料（用戶、課程、訂閱）存到此目錄，供 MongoDB 生成器使用')
+    add_profile_arguments(parser)
+    return parser.parse_args(argv)
+
+def open_sink(args, profiler):
+    """依 --sink 建立輸出目的地並處理既有資料，回傳 (sink, 連線)；檔案輸出時連線為 None"""
+    if args.sink != 'db':
+        sink = FileSink(Path(args.output_dir) / 'postgres', args.sink)
+        print(f"📁 輸出到 {sink.directory}（{args.sink}）")
+        if sink.exists():
+            print("\n⚠️  輸出目錄已有資料，是否清空？(y/n): ", end='')
+            if input().lower() != 'y':
+                raise SystemExit("已取消：請指定其他 --output-dir")
+            sink.clear()
+            print("✅ 輸出目錄已清空")
+        return sink, None
+    
+    conn = acquire_pg_connection()
+    cursor = profiler.wrap_cursor(conn.cursor())
+    print("✅ 資料庫連線成功")
+    
+    print("\n⚠️  是否清空現有數據？(y/n): ", end='')
+    if input().lower() == 'y':
+        cursor.execute("TRUNCATE TABLE payments, course_enrollments, subscriptions, users, courses, instructors, course_categories CASCADE;")
+        conn.commit()
+        print("✅ 數據已清空")
+    return DbSink(cursor), conn
+
+def main(argv=None):
+    args = parse_args(argv)
+    profiler = StageProfiler.from_args('generate_postgres_data', args)
+    
     print("=" * 60)
     print("LearnHub PostgreSQL 測試數據生成器 (Optimized)")
     print("=" * 60)
     
+    conn = None
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
-        cursor = conn.cursor()
-        print("✅ 資料庫連線成功")
-        
-        print("\n⚠️  是否清空現有數據？(y/n): ", end='')
-        if input().lower() == 'y':
-            cursor.execute("TRUNCATE TABLE payments, course_enrollments, subscriptions, users, courses, instructors, course_categories CASCADE;")
-            conn.commit()
-            print("✅ 數據已清空")
+        sink, conn = open_sink(args, profiler)
         
         start_time = datetime.now()
+        # 各階段產生的鍵與屬性，後續階段直接查詢，不再回頭 SELECT
+        cache = ReferenceCache()
         
-        # 依序執行
-        generate_categories(cursor)
-        inst_ids = generate_instructors(cursor)
-        course_ids = generate_courses(cursor, inst_ids)
-        user_ids = generate_users(cursor)
-        sub_results = generate_subscriptions(cursor, user_ids)
-        generate_payments(cursor, sub_results)
-        generate_enrollments(cursor, user_ids, course_ids)
+        # 依序執行（--profile 時逐階段剖析）
+        profiler.run('generate_categories', generate_categories, sink)
+        inst_ids = profiler.run('generate_instructors', generate_instructors, sink)
+        course_ids = profiler.run('generate_courses', generate_courses, sink, inst_ids, cache)
+        user_ids = profiler.run('generate_users', generate_users, sink, cache)
+        profiler.run('generate_subscriptions', generate_subscriptions, sink, user_ids, cache)
+        profiler.run('generate_payments', generate_payments, sink, cache)
+        profiler.run('generate_enrollments', generate_enrollments, sink, user_ids, course_ids, cache)
         
-        conn.commit()
+        # db：commit；檔案：關閉分片並寫出 manifest（csv 另有載入腳本）
+        profiler.run('finish', sink.finish)
+        
+        # commit 之後才寫出，快取內容與資料庫（或輸出檔案）一致
+        path = cache.save(args.reference_cache)
+        print(f"💾 參考資料快取：{path}（{cache.summary()}）")
+        if args.sink != 'db':
+            for table, info in sink.entities.items():
+                print(f"  📄 {table:<20} {info['rows']:>12,} 筆  {len(info['files'])} 個檔案")
         
         elapsed = datetime.now() - start_time
         print(f"\n✨ 全部完成！總耗時：{elapsed}")
+        profiler.report()
         
     except Exception as e:
         print(f"\n❌ 錯誤：{e}")
         import traceback
         traceback.print_exc()
     finally:
-        if 'conn' in locals():
-            cursor.close()
-            conn.close()
+        if conn is not None:
+            sink.cursor.close()
+            release_pg_connection(conn)
+        close_all()
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+將 --sink parquet / csv 生成的檔案批次載入 PostgreSQL / MongoDB（依 manifest.json）
+
+- PostgreSQL：同一個交易內 TRUNCATE 後以 COPY 載入各分片（依外鍵相依順序），最後推進 SERIAL 序列；
+  Parquet 逐批轉成 CSV 串流給 COPY FROM STDIN，不需要整檔讀入記憶體
+- MongoDB：Parquet 以 common.document_schema.table_to_documents 還原文件（course_reviews 重建 search_terms、
+  support_tickets 補回空的 attachments），JSON Lines 以 bson.json_util 解析，逐批 insert_many
+- SEEDED_TABLES（subscription_plans）已由 01_create_tables.sql 插入，不會載入
+
+用法：
+    python load_synthetic_data.py                          # 載入 synthetic_data/postgres 與 synthetic_data/mongodb
+    python load_synthetic_data.py --output-dir /data/synth --only postgres
+"""
+
+import io
+import sys
+import json
+import argparse
+from pathlib import Path
+from datetime import datetime
+
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+from bson import json_util
+from tqdm import tqdm
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from common.db import pg_connection, get_mongo_db, close_all
+from common.document_schema import table_to_documents
+from common.search_text import search_terms
+from sinks import OUTPUT_DIR, MANIFEST_NAME, PG_TABLES
+
+# 每批轉換 / 寫入的筆數
+BATCH_SIZE = 100000
+MONGO_BATCH_SIZE = 10000
+
+# ============================================
+# 共用
+# ============================================
+def read_manifest(directory):
+    path = Path(directory) / MANIFEST_NAME
+    if not path.exists():
+        raise FileNotFoundError(f"找不到 {path}：請先以 --sink parquet / csv 執行生成器")
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+# ============================================
+# PostgreSQL
+# ============================================
+def copy_parquet(cursor, table, columns, path):
+    """Parquet 逐批轉為 CSV（字串一律加引號，NULL 為空欄位）後 COPY FROM STDIN"""
+    query = f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+    parquet_file = pq.ParquetFile(path)
+    for batch in parquet_file.iter_batches(batch_size=BATCH_SIZE, columns=columns):
+        buffer = io.BytesIO()
+        pacsv.write_csv(pa.Table.from_batches([batch]), buffer,
+                        write_options=pacsv.WriteOptions(include_header=False))
+        buffer.seek(0)
+        cursor.copy_expert(query, buffer)
+
+
+def copy_csv(cursor, table, columns, path):
+    query = f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, HEADER true)"
+    with open(path, 'rb') as f:
+        cursor.copy_expert(query, f)
+
+
+def load_postgres(directory):
+    """單一交易：TRUNCATE → COPY 各分片 → setval，失敗時整批 rollback"""
+    manifest = read_manifest(directory)
+    copy_file = copy_parquet if manifest['format'] == 'parquet' else copy_csv
+    tables = [name for name, info in manifest['entities'].items()
+              if info['kind'] == 'postgres' and not info.get('seeded')]
+
+    with pg_connection() as conn:
+        cursor = conn.cursor()
+        print(f"🗑️  清空資料表：{', '.join(tables)}")
+        cursor.execute(f"TRUNCATE TABLE {', '.join(reversed(tables))} CASCADE;")
+
+        for table in tables:
+            info = manifest['entities'][table]
+            for relative in tqdm(info['files'], desc=table):
+                copy_file(cursor, table, info['columns'], Path(directory) / relative)
+            print(f"  ✅ {table}: {info['rows']:,} 筆")
+
+        for table in tables:
+            key = PG_TABLES[table][0][0]
+            cursor.execute(f"SELECT setval(pg_get_serial_sequence('{table}', '{key}'), "
+                           f"coalesce(max({key}), 1), max({key}) IS NOT NULL) FROM {table};")
+        conn.commit()
+        cursor.close()
+
+# ============================================
+# MongoDB
+# ============================================
+def iter_parquet_documents(collection, path):
+    parquet_file = pq.ParquetFile(path)
+    for batch in parquet_file.iter_batches(batch_size=MONGO_BATCH_SIZE):
+        docs = table_to_documents(pa.Table.from_batches([batch]), collection)
+        if collection == 'course_reviews':
+            # Parquet 不保存 search_terms，依標題與內容重建（與生成器相同）
+            for doc in docs:
+                doc['search_terms'] = search_terms(doc['title'], doc['comment'])
+        elif collection == 'support_tickets':
+            for doc in docs:
+                doc['attachments'] = []
+        yield docs
+
+
+def iter_jsonl_documents(collection, path):
+    with open(path, encoding='utf-8') as f:
+        batch = []
+        for line in f:
+            batch.append(json_util.loads(line))
+            if len(batch) >= MONGO_BATCH_SIZE:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+def load_mongodb(directory):
+    """drop 各 collection 後逐批 insert_many（user_events 以一般 collection 載入）"""
+    manifest = read_manifest(directory)
+    iter_documents = iter_parquet_documents if manifest['format'] == 'parquet' else iter_jsonl_documents
+    db = get_mongo_db()
+
+    for collection, info in manifest['entities'].items():
+        if info['kind'] != 'mongodb':
+            continue
+        db[collection].drop()
+        for relative in tqdm(info['files'], desc=collection):
+            for docs in iter_documents(collection, Path(directory) / relative):
+                db[collection].insert_many(docs, ordered=False)
+        print(f"  ✅ {collection}: {info['rows']:,} 筆")
+
+# ============================================
+# 主程式
+# ============================================
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='載入 --sink parquet / csv 生成的測試數據')
+    parser.add_argument('--output-dir', default=OUTPUT_DIR,
+                        help='生成器的 --output-dir（讀取 <output-dir>/postgres 與 <output-dir>/mongodb）')
+    parser.add_argument('--only', choices=['postgres', 'mongodb'],
+                        help='只載入其中一個資料庫（預設兩者皆載入，存在 manifest 者）')
+    parser.add_argument('--yes', action='store_true', help='不詢問，直接清空並載入')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    root = Path(args.output_dir)
+    targets = [args.only] if args.only else [
+        name for name in ('postgres', 'mongodb') if (root / name / MANIFEST_NAME).exists()
+    ]
+    if not targets:
+        print(f"❌ {root} 下沒有 manifest.json：請先以 --sink parquet / csv 執行生成器")
+        return 1
+
+    if not args.yes:
+        print(f"⚠️  將清空並載入：{', '.join(targets)}，是否繼續？(y/n): ", end='')
+        if input().lower() != 'y':
+            print("已取消")
+            return 1
+
+    start_time = datetime.now()
+    try:
+        if 'postgres' in targets:
+            print(f"\n🐘 載入 PostgreSQL：{root / 'postgres'}")
+            load_postgres(root / 'postgres')
+        if 'mongodb' in targets:
+            print(f"\n🍃 載入 MongoDB：{root / 'mongodb'}")
+            load_mongodb(root / 'mongodb')
+    except Exception as e:
+        print(f"\n❌ 錯誤：{e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+    finally:
+        close_all()
+
+    print(f"\n✨ 載入完成！耗時：{datetime.now() - start_time}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
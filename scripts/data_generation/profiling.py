@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+數據生成器效能剖析工具
+以 cProfile / tracemalloc（以及選用的 py-spy 取樣）包裝每個 generate_* 階段，
+並把資料庫往返時間與客戶端生成時間分開統計，輸出每個階段的報告
+"""
+
+import os
+import io
+import json
+import time
+import shutil
+import signal
+import pstats
+import cProfile
+import tracemalloc
+import subprocess
+from datetime import datetime
+
+
+def add_profile_arguments(parser):
+    """為生成器 CLI 加入剖析相關參數"""
+    parser.add_argument('--profile', action='store_true',
+                        help='以 cProfile + tracemalloc 剖析每個生成階段')
+    parser.add_argument('--profile-dir', default=None,
+                        help='剖析報告輸出目錄（預設 ./profiles/<腳本>_<時間>）')
+    parser.add_argument('--profile-sampler', choices=['py-spy'], default=None,
+                        help='另外以 py-spy 取樣並輸出火焰圖（需安裝 py-spy 並有 ptrace 權限）')
+
+
+class _TimedProxy:
+    """代理資料庫物件，將指定方法的耗時累計到 profiler.db_seconds"""
+
+    def __init__(self, target, profiler, methods):
+        self._target = target
+        self._profiler = profiler
+        self._methods = methods
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if name not in self._methods or not callable(attr):
+            return attr
+
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return attr(*args, **kwargs)
+            finally:
+                self._profiler.db_seconds += time.perf_counter() - started
+                self._profiler.db_calls += 1
+        return timed
+
+
+PG_CURSOR_METHODS = {'execute', 'executemany', 'fetchone', 'fetchmany', 'fetchall', 'copy_expert', 'copy_from'}
+MONGO_COLLECTION_METHODS = {'insert_one', 'insert_many', 'find', 'find_one', 'count_documents',
+                            'aggregate', 'delete_many', 'bulk_write', 'drop'}
+
+
+class StageProfiler:
+    """逐階段剖析；未啟用時 run() 直接呼叫函式，不增加任何開銷"""
+
+    def __init__(self, name, enabled=False, output_dir=None, sampler=None):
+        self.name = name
+        self.enabled = enabled
+        self.sampler = sampler
+        self.output_dir = output_dir or os.path.join(
+            'profiles', f"{name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        )
+        self.db_seconds = 0.0
+        self.db_calls = 0
+        self.stages = []
+
+        if self.enabled:
+            os.makedirs(self.output_dir, exist_ok=True)
+        if self.sampler == 'py-spy' and not shutil.which('py-spy'):
+            print("⚠️  找不到 py-spy，略過取樣火焰圖")
+            self.sampler = None
+
+    @classmethod
+    def from_args(cls, name, args):
+        return cls(name, enabled=args.profile, output_dir=args.profile_dir,
+                   sampler=args.profile_sampler if args.profile else None)
+
+    def wrap_cursor(self, cursor):
+        """psycopg2 cursor：execute / fetch* 計入 DB 時間（execute_values 內部也走 execute）"""
+        return _TimedProxy(cursor, self, PG_CURSOR_METHODS) if self.enabled else cursor
+
+    def wrap_collection(self, collection):
+        """pymongo Collection：insert_many 等寫入/查詢計入 DB 時間"""
+        return _TimedProxy(collection, self, MONGO_COLLECTION_METHODS) if self.enabled else collection
+
+    def _start_sampler(self, stage):
+        if self.sampler != 'py-spy':
+            return None
+        svg_path = os.path.join(self.output_dir, f"{stage}.svg")
+        return subprocess.Popen(
+            ['py-spy', 'record', '--pid', str(os.getpid()), '--rate', '100',
+             '--format', 'flamegraph', '--output', svg_path, '--nonblocking'],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+
+    @staticmethod
+    def _stop_sampler(proc):
+        if proc is None:
+            return
+        # py-spy 收到 SIGINT 後寫出火焰圖再結束
+        proc.send_signal(signal.SIGINT)
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+    def run(self, stage, func, *args, **kwargs):
+        """執行單一階段；啟用時輸出 <stage>.prof / <stage>.txt 並記錄摘要"""
+        if not self.enabled:
+            return func(*args, **kwargs)
+
+        db_before, calls_before = self.db_seconds, self.db_calls
+        sampler = self._start_sampler(stage)
+        tracemalloc.start()
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        try:
+            return profiler.runcall(func, *args, **kwargs)
+        finally:
+            wall = time.perf_counter() - started
+            _, peak_bytes = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self._stop_sampler(sampler)
+            self._write_stage_report(stage, profiler, wall, self.db_seconds - db_before,
+                                     self.db_calls - calls_before, peak_bytes)
+
+    def _write_stage_report(self, stage, profiler, wall, db_seconds, db_calls, peak_bytes):
+        prof_path = os.path.join(self.output_dir, f"{stage}.prof")
+        profiler.dump_stats(prof_path)
+
+        buffer = io.StringIO()
+        stats = pstats.Stats(profiler, stream=buffer).strip_dirs()
+        stats.sort_stats('cumulative').print_stats(30)
+        stats.sort_stats('tottime').print_stats(20)
+        with open(os.path.join(self.output_dir, f"{stage}.txt"), 'w', encoding='utf-8') as f:
+            f.write(buffer.getvalue())
+
+        summary = {
+            'stage': stage,
+            'wall_seconds': round(wall, 3),
+            'db_seconds': round(db_seconds, 3),
+            'client_seconds': round(wall - db_seconds, 3),
+            'db_calls': db_calls,
+            'db_share': round(db_seconds / wall, 3) if wall else 0.0,
+            'peak_traced_memory_mb': round(peak_bytes / 1024 / 1024, 1),
+            'cprofile': os.path.basename(prof_path),
+        }
+        self.stages.append(summary)
+        print(f"  ⏱️  {stage}: {wall:.2f}s（DB {db_seconds:.2f}s / 客戶端 {wall - db_seconds:.2f}s），"
+              f"記憶體峰值 {summary['peak_traced_memory_mb']} MB")
+
+    def report(self):
+        """輸出 summary.json 與階段耗時排行"""
+        if not self.enabled or not self.stages:
+            return
+        with open(os.path.join(self.output_dir, 'summary.json'), 'w', encoding='utf-8') as f:
+            json.dump({'generator': self.name, 'stages': self.stages}, f, ensure_ascii=False, indent=2)
+
+        print("\n" + "=" * 60)
+        print("🔬 剖析摘要（cProfile/tracemalloc 開銷已包含在耗時內）")
+        print("=" * 60)
+        for s in sorted(self.stages, key=lambda s: s['wall_seconds'], reverse=True):
+            print(f"  {s['stage']:<28} {s['wall_seconds']:>8.2f}s  "
+                  f"DB {s['db_share'] * 100:5.1f}%  {s['peak_traced_memory_mb']:>7.1f} MB")
+        print(f"\n📁 報告目錄：{self.output_dir}")
+        print("   （以 `python -m pstats` 或 snakeviz 開啟 .prof 檔案）")
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+生成器共用的參考資料快取
+各階段需要的鍵與屬性（用戶 → 註冊日、課程 → 時長、訂閱 → 方案 / 週期…）在生成當下寫入，
+以依鍵排序的 NumPy 陣列保存，後續階段不必再對 PostgreSQL 重新 SELECT 整張表：
+- get()    ：單筆查詢；鍵連續（SERIAL）時直接以位移取值 O(1)，否則二分搜尋
+- lookup() ：整批鍵一次查詢（向量化），回傳 NumPy 陣列
+- save() / ReferenceCache.load()：存成 .npy 目錄，載入時以 mmap 開啟，
+  generate_mongodb_data.py --reference-cache 直接讀取，不需連線 PostgreSQL
+
+日期欄位存為 datetime64[us]，get() 回傳 Python datetime，可直接與 timedelta 運算。
+
+用法：
+    cache = ReferenceCache()
+    cache.put('users', user_ids, signup_date=signup_dates)
+    cache.get('users', 'signup_date', 42)              # datetime
+    cache.lookup('users', 'signup_date', [3, 1, 2])    # ndarray
+    cache.save()
+
+    cache = ReferenceCache.load()                      # mmap 唯讀
+    user_ids = cache.keys('users')
+"""
+
+import os
+import json
+import tempfile
+from datetime import date, datetime
+from pathlib import Path
+
+import numpy as np
+
+# 快取目錄（可用環境變數覆寫）
+CACHE_DIR = os.environ.get('LEARNHUB_REFERENCE_CACHE',
+                           str(Path(__file__).resolve().parent / '.cache' / 'reference'))
+
+MANIFEST_NAME = 'manifest.json'
+
+
+def _to_array(values):
+    """list → NumPy 陣列；date / datetime 統一為 datetime64[us]"""
+    array = np.asarray(values)
+    if array.dtype == object and len(array) and isinstance(array[0], date):
+        array = array.astype('datetime64[us]')
+    elif array.dtype.kind == 'M':
+        array = array.astype('datetime64[us]')
+    return array
+
+
+class ReferenceCache:
+    """依鍵排序的欄位陣列；每張表為 {'key': 鍵陣列, 欄位: 對齊的值陣列}"""
+
+    def __init__(self):
+        self.tables = {}
+        self._offsets = {}
+        self.created_at = None
+
+    # --------------------------------------------
+    # 寫入
+    # --------------------------------------------
+    def put(self, name, keys, **columns):
+        """寫入（覆蓋）一張表；keys 不需事先排序，重複的鍵會報錯"""
+        keys = np.asarray(keys, dtype=np.int64)
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        if len(keys) > 1 and (np.diff(keys) == 0).any():
+            raise ValueError(f"{name} 的鍵有重複")
+
+        table = {'key': keys}
+        for column, values in columns.items():
+            values = _to_array(values)
+            if len(values) != len(keys):
+                raise ValueError(f"{name}.{column} 有 {len(values):,} 筆，鍵有 {len(keys):,} 筆")
+            table[column] = values[order]
+        self.tables[name] = table
+        self._index_table(name)
+
+    def _index_table(self, name):
+        """鍵為連續整數時記下起點，get() 以位移取值"""
+        keys = self.tables[name]['key']
+        dense = len(keys) > 0 and int(keys[-1]) - int(keys[0]) + 1 == len(keys)
+        self._offsets[name] = int(keys[0]) if dense else None
+
+    # --------------------------------------------
+    # 查詢
+    # --------------------------------------------
+    def __contains__(self, name):
+        return name in self.tables
+
+    def keys(self, name):
+        return self.tables[name]['key']
+
+    def column(self, name, column):
+        """與 keys(name) 對齊的欄位陣列"""
+        return self.tables[name][column]
+
+    def _positions(self, name, keys):
+        table_keys = self.tables[name]['key']
+        keys = np.asarray(keys, dtype=np.int64)
+        offset = self._offsets[name]
+        if offset is not None:
+            positions = keys - offset
+            missing = (positions < 0) | (positions >= len(table_keys))
+        elif len(table_keys) == 0:
+            positions = np.zeros(len(keys), dtype=np.int64)
+            missing = np.ones(len(keys), dtype=bool)
+        else:
+            positions = np.searchsorted(table_keys, keys)
+            clipped = np.minimum(positions, len(table_keys) - 1)
+            missing = (positions >= len(table_keys)) | (table_keys[clipped] != keys)
+        if missing.any():
+            raise KeyError(f"{name} 沒有鍵 {keys[missing][:5].tolist()}")
+        return positions
+
+    def lookup(self, name, column, keys):
+        """整批查詢，回傳與 keys 同順序的陣列（任何一個鍵不存在時拋出 KeyError）"""
+        return self.tables[name][column][self._positions(name, keys)]
+
+    def get(self, name, column, key):
+        """單筆查詢，回傳 Python 值（datetime / int / str…）"""
+        table_keys = self.tables[name]['key']
+        offset = self._offsets[name]
+        if offset is not None:
+            position = key - offset
+            if not 0 <= position < len(table_keys):
+                raise KeyError(f"{name} 沒有鍵 {key}")
+        else:
+            position = int(np.searchsorted(table_keys, key))
+            if position >= len(table_keys) or table_keys[position] != key:
+                raise KeyError(f"{name} 沒有鍵 {key}")
+        return self.tables[name][column][position].item()
+
+    # --------------------------------------------
+    # 保存 / 載入
+    # --------------------------------------------
+    def save(self, directory=CACHE_DIR):
+        """每個欄位存成 <表>.<欄位>.npy，最後才以 os.replace 寫入 manifest（載入以 manifest 列出的欄位為準）"""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        manifest = {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'tables': {name: {'rows': len(table['key']), 'columns': list(table)}
+                       for name, table in self.tables.items()},
+        }
+        for name, table in self.tables.items():
+            for column, values in table.items():
+                np.save(directory / f"{name}.{column}.npy", values, allow_pickle=False)
+
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.manifest.', suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, directory / MANIFEST_NAME)
+        return directory
+
+    @classmethod
+    def load(cls, directory=CACHE_DIR, mmap=True):
+        """載入 save() 的目錄；mmap=True 時以唯讀記憶體映射開啟，只讀取實際用到的頁面"""
+        directory = Path(directory)
+        manifest_path = directory / MANIFEST_NAME
+        if not manifest_path.exists():
+            raise FileNotFoundError(f"找不到參考資料快取：{manifest_path}（請先執行 generate_postgres_data.py）")
+        manifest = json.loads(manifest_path.read_text(encoding='utf-8'))
+
+        cache = cls()
+        cache.created_at = manifest['created_at']
+        for name, spec in manifest['tables'].items():
+            cache.tables[name] = {
+                column: np.load(directory / f"{name}.{column}.npy", mmap_mode='r' if mmap else None,
+                                allow_pickle=False)
+                for column in spec['columns']
+            }
+            cache._index_table(name)
+        return cache
+
+    def summary(self):
+        return {name: len(table['key']) for name, table in self.tables.items()}
@@ -0,0 +1,477 @@
+#!/usr/bin/env python3
+"""
+生成器的輸出目的地（--sink）
+- db     ：DbSink，以 execute_values 寫入 PostgreSQL（原本的行為）；MongoDB 直接寫入 collection
+- parquet：FileSink，不連線資料庫，每個實體串流寫成 Parquet 分片
+- csv    ：FileSink，PostgreSQL 資料表寫成 COPY 可直接讀取的 CSV（含標頭），
+           MongoDB collection 寫成 mongoimport 可讀的 JSON Lines（陣列 / 子文件無法以 CSV 表示）
+
+檔案輸出的版面（與抽取器相同的 <實體>/<實體>_<YYYYMMDD>*.parquet 命名，
+profile_parquet / lake_metrics / sessionize_events 可直接以 --source <output-dir>/postgres 等讀取）：
+    <output-dir>/postgres/<資料表>/<資料表>_20260101_part00000.parquet|csv
+    <output-dir>/mongodb/<collection>/<collection>_20260101_part00000.parquet|jsonl
+    <output-dir>/mongodb/user_events/user_events_20260101_202201_part00000.parquet|jsonl   （依事件月份分片）
+
+- 每個檔案最多 ROWS_PER_FILE 筆，超過就換下一個分片；Parquet 累積 ROW_GROUP_ROWS 筆才寫出一個 row group
+- SERIAL 主鍵由 FileSink 從 1 開始依序配發，與空資料表逐批 INSERT 得到的 ID 相同，
+  外鍵（subscriptions.user_id 等）因此可以直接對應
+- 只輸出生成器有給值的欄位，其餘欄位（created_at 等）載入時由資料庫預設值補上；
+  湖上分析會讀到的預設值欄位（courses.total_enrollments 等，見 FILE_DEFAULTS）則直接寫入預設值
+- subscription_plans 由 01_create_tables.sql 預先插入，檔案輸出會附上一份供參照檢查，載入時略過
+- PostgreSQL 的欄位與型別以 PG_TABLES 為準（對應 scripts/sql/01_create_tables.sql）；
+  MongoDB 的 Parquet 與 extract_mongodb_to_gcs.py 的輸出相同（common.document_schema）
+- 完成後寫出 manifest.json（各實體的檔案與筆數），parquet / csv 都可用 load_synthetic_data.py 載入；
+  csv 另外產生只需 psql / mongoimport 的載入腳本：
+    cd <output-dir>/postgres && psql -h localhost -p 5433 -U admin -d learnhub_prod -f load_postgres.sql
+    cd <output-dir>/mongodb && sh load_mongodb.sh
+
+用法：
+    sink = DbSink(cursor)                         # 或 FileSink('./synthetic/postgres', 'parquet')
+    ids = sink.insert('users', rows, returning=('user_id', 'signup_date'))
+    sink.finish()
+
+    sink = FileSink('./synthetic/mongodb', 'csv')
+    sink.collection('course_reviews').insert_many(docs)
+"""
+
+import os
+import csv
+import json
+import shutil
+from datetime import datetime
+from decimal import Decimal
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from bson import json_util
+from psycopg2.extras import execute_values
+
+from common.document_schema import documents_to_table, collection_schema
+
+SINKS = ('db', 'parquet', 'csv')
+
+# --sink parquet / csv 的預設輸出目錄
+OUTPUT_DIR = os.environ.get('LEARNHUB_SYNTHETIC_DIR', 'synthetic_data')
+
+ROWS_PER_FILE = 1000000
+ROW_GROUP_ROWS = 100000
+
+# 與 extract_mongodb_to_gcs.py 相同的 Parquet 壓縮
+PARQUET_COMPRESSION = 'snappy'
+
+MANIFEST_NAME = 'manifest.json'
+
+# ============================================
+# PostgreSQL 資料表（生成器有給值的欄位；第一欄為 SERIAL 主鍵）
+# ============================================
+PG_TABLES = {
+    'course_categories': [
+        ('category_id', pa.int32()),
+        ('category_name', pa.string()),
+        ('category_slug', pa.string()),
+        ('description', pa.string()),
+    ],
+    'instructors': [
+        ('instructor_id', pa.int32()),
+        ('full_name', pa.string()),
+        ('email', pa.string()),
+        ('bio', pa.string()),
+        ('joined_date', pa.timestamp('us')),
+        ('is_active', pa.bool_()),
+    ],
+    'courses': [
+        ('course_id', pa.int32()),
+        ('title', pa.string()),
+        ('slug', pa.string()),
+        ('description', pa.string()),
+        ('instructor_id', pa.int32()),
+        ('category_id', pa.int32()),
+        ('difficulty_level', pa.string()),
+        ('duration_minutes', pa.int32()),
+        ('total_lectures', pa.int32()),
+        ('language', pa.string()),
+        ('price_usd', pa.decimal128(10, 2)),
+        ('is_published', pa.bool_()),
+        ('published_date', pa.timestamp('us')),
+    ],
+    'users': [
+        ('user_id', pa.int32()),
+        ('email', pa.string()),
+        ('username', pa.string()),
+        ('full_name', pa.string()),
+        ('password_hash', pa.string()),
+        ('signup_date', pa.timestamp('us')),
+        ('country', pa.string()),
+        ('is_active', pa.bool_()),
+        ('email_verified', pa.bool_()),
+    ],
+    'subscriptions': [
+        ('subscription_id', pa.int32()),
+        ('user_id', pa.int32()),
+        ('plan_id', pa.int32()),
+        ('status', pa.string()),
+        ('billing_cycle', pa.string()),
+        ('start_date', pa.timestamp('us')),
+        ('end_date', pa.timestamp('us')),
+        ('cancelled_at', pa.timestamp('us')),
+        ('auto_renew', pa.bool_()),
+    ],
+    'payments': [
+        ('payment_id', pa.int32()),
+        ('subscription_id', pa.int32()),
+        ('user_id', pa.int32()),
+        ('amount', pa.decimal128(10, 2)),
+        ('currency', pa.string()),
+        ('payment_method', pa.string()),
+        ('payment_status', pa.string()),
+        ('transaction_id', pa.string()),
+        ('payment_gateway', pa.string()),
+        ('paid_at', pa.timestamp('us')),
+    ],
+    'course_enrollments': [
+        ('enrollment_id', pa.int32()),
+        ('user_id', pa.int32()),
+        ('course_id', pa.int32()),
+        ('enrolled_at', pa.timestamp('us')),
+        ('progress_percentage', pa.decimal128(5, 2)),
+        ('completed_at', pa.timestamp('us')),
+        ('total_watch_time_minutes', pa.int32()),
+    ],
+    # 01_create_tables.sql 預先插入，生成器不寫入（檔案輸出才會附上，見 SEEDED_TABLES）
+    'subscription_plans': [
+        ('plan_id', pa.int32()),
+        ('plan_name', pa.string()),
+        ('plan_type', pa.string()),
+        ('price_monthly', pa.decimal128(10, 2)),
+        ('price_annual', pa.decimal128(10, 2)),
+    ],
+}
+
+# 資料庫自動補預設值、但湖上分析（lake_metrics）需要的欄位：只寫入檔案輸出
+FILE_DEFAULTS = {
+    'courses': [
+        ('total_enrollments', pa.int32(), 0),
+        ('average_rating', pa.decimal128(3, 2), Decimal('0.00')),
+        ('total_reviews', pa.int32(), 0),
+    ],
+    'course_enrollments': [
+        ('last_accessed_at', pa.timestamp('us'), None),
+    ],
+}
+
+# 01_create_tables.sql 預先插入的訂閱方案：(plan_id, plan_name, plan_type, price_monthly, price_annual)
+SUBSCRIPTION_PLANS = [
+    (1, '基礎版', 'basic', Decimal('9.99'), Decimal('95.90')),
+    (2, '專業版', 'professional', Decimal('29.99'), Decimal('287.90')),
+    (3, '企業版', 'enterprise', Decimal('99.99'), Decimal('959.90')),
+]
+
+# 已由建表腳本插入的資料表（含主鍵的列）：檔案輸出會附上，但載入時不清空也不覆寫
+SEEDED_TABLES = {
+    'subscription_plans': SUBSCRIPTION_PLANS,
+}
+
+# 依欄位值分片的 collection：collection → (欄位, 加在檔名日期後的分片格式)
+DOCUMENT_PARTITIONS = {
+    'user_events': ('timestamp', '%Y%m'),
+}
+
+
+def file_columns(table):
+    """檔案輸出的欄位：PG_TABLES 加上 FILE_DEFAULTS"""
+    return PG_TABLES[table] + [(name, type_) for name, type_, _ in FILE_DEFAULTS.get(table, [])]
+
+
+def pg_schema(table):
+    return pa.schema(file_columns(table))
+
+
+def rows_to_table(table, rows):
+    """tuple 列（欄位順序同 file_columns，含主鍵）→ Arrow Table；DECIMAL 欄位的 float 先轉 Decimal"""
+    schema = pg_schema(table)
+    columns = list(zip(*rows)) if rows else [()] * len(schema)
+    arrays = []
+    for field, values in zip(schema, columns):
+        if pa.types.is_decimal(field.type):
+            values = [v if v is None or isinstance(v, Decimal) else Decimal(str(v)) for v in values]
+        arrays.append(pa.array(values, type=field.type))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+# ============================================
+# 資料庫
+# ============================================
+class DbSink:
+    """以 execute_values 寫入 PostgreSQL（欄位依 PG_TABLES，主鍵由 SERIAL 產生）"""
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def insert(self, table, rows, returning=(), on_conflict=None):
+        """寫入一批列（不含主鍵），returning 指定要回傳的欄位"""
+        columns = ', '.join(name for name, _ in PG_TABLES[table][1:])
+        query = f"INSERT INTO {table} ({columns}) VALUES %s"
+        if on_conflict:
+            query += f" ON CONFLICT {on_conflict}"
+        if returning:
+            query += f" RETURNING {', '.join(returning)}"
+        return execute_values(self.cursor, query, rows, fetch=bool(returning))
+
+    def category_ids(self):
+        self.cursor.execute("SELECT category_id FROM course_categories;")
+        return [row[0] for row in self.cursor.fetchall()]
+
+    def subscription_plans(self):
+        self.cursor.execute("SELECT plan_id, plan_type, price_monthly, price_annual FROM subscription_plans;")
+        return self.cursor.fetchall()
+
+    def finish(self):
+        self.cursor.connection.commit()
+
+# ============================================
+# 檔案分片
+# ============================================
+class _ParquetPart:
+
+    def __init__(self, path, schema):
+        self.path = path
+        self.rows = 0
+        self._writer = pq.ParquetWriter(path, schema, compression=PARQUET_COMPRESSION)
+        self._pending = []
+        self._pending_rows = 0
+
+    def write(self, table):
+        self._pending.append(table)
+        self._pending_rows += table.num_rows
+        self.rows += table.num_rows
+        if self._pending_rows >= ROW_GROUP_ROWS:
+            self._flush()
+
+    def _flush(self):
+        if self._pending:
+            self._writer.write_table(pa.concat_tables(self._pending), row_group_size=self._pending_rows)
+            self._pending, self._pending_rows = [], 0
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+
+
+class _CsvPart:
+    """COPY ... WITH (FORMAT csv, HEADER true)：None 寫成未加引號的空欄位（NULL）"""
+
+    def __init__(self, path, header):
+        self.path = path
+        self.rows = 0
+        self._file = open(path, 'w', newline='', encoding='utf-8')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(header)
+
+    def write(self, rows):
+        self._writer.writerows(rows)
+        self.rows += len(rows)
+
+    def close(self):
+        self._file.close()
+
+
+class _JsonLinesPart:
+    """mongoimport 可讀的 Extended JSON（datetime → {"$date": ...}）"""
+
+    def __init__(self, path):
+        self.path = path
+        self.rows = 0
+        self._file = open(path, 'w', encoding='utf-8')
+
+    def write(self, docs):
+        for doc in docs:
+            self._file.write(json_util.dumps(doc, json_options=json_util.RELAXED_JSON_OPTIONS, ensure_ascii=False))
+            self._file.write('\n')
+        self.rows += len(docs)
+
+    def close(self):
+        self._file.close()
+
+# ============================================
+# 檔案輸出
+# ============================================
+class FileCollection:
+    """只支援 insert_many 的 collection 替身，讓 generate_* 函式不需區分輸出目的地"""
+
+    def __init__(self, sink, name):
+        self.sink = sink
+        self.name = name
+
+    def insert_many(self, docs):
+        self.sink.insert_documents(self.name, docs)
+
+
+class FileSink:
+    """將各實體串流寫到 directory 下的分片檔案（file_format 為 parquet 或 csv）"""
+
+    def __init__(self, directory, file_format, rows_per_file=ROWS_PER_FILE):
+        self.directory = Path(directory)
+        self.file_format = file_format
+        self.rows_per_file = rows_per_file
+        # 檔名的日期與抽取器相同（執行當天），讀取端依此挑選最新的一批檔案
+        self.date_str = datetime.now().strftime('%Y%m%d')
+        self._parts = {}
+        self._part_counts = {}
+        self._next_ids = {}
+        # 實體 → {'kind', 'columns', 'rows', 'files'}（依第一次寫入的順序，即外鍵相依的順序）
+        self.entities = {}
+
+    def exists(self):
+        return self.directory.exists() and any(self.directory.iterdir())
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    # --------------------------------------------
+    # PostgreSQL 資料表
+    # --------------------------------------------
+    def insert(self, table, rows, returning=(), on_conflict=None):
+        """
+        寫入一批列（不含主鍵）並配發 SERIAL 主鍵，回傳與 DbSink 相同的 returning 欄位
+        on_conflict 不適用於檔案，重複的列需由呼叫端先排除
+        """
+        names = [name for name, _ in file_columns(table)]
+        defaults = tuple(value for _, _, value in FILE_DEFAULTS.get(table, []))
+        start = self._next_ids.get(table, 1)
+        self._next_ids[table] = start + len(rows)
+        rows = [(key, *row, *defaults) for key, row in zip(range(start, start + len(rows)), rows)]
+
+        self._register(table, 'postgres', names)
+        if rows:
+            self._write(table, None, rows_to_table(table, rows) if self.file_format == 'parquet' else rows,
+                        len(rows), lambda path: self._open_pg_part(table, path))
+
+        if not returning:
+            return None
+        positions = [names.index(column) for column in returning]
+        return [tuple(row[p] for p in positions) for row in rows]
+
+    def category_ids(self):
+        return list(range(1, self._next_ids.get('course_categories', 1)))
+
+    def subscription_plans(self):
+        return [(plan_id, plan_type, monthly, annual) for plan_id, _, plan_type, monthly, annual in SUBSCRIPTION_PLANS]
+
+    def _open_pg_part(self, table, path):
+        if self.file_format == 'parquet':
+            return _ParquetPart(path, pg_schema(table))
+        return _CsvPart(path, [name for name, _ in file_columns(table)])
+
+    # --------------------------------------------
+    # MongoDB collection
+    # --------------------------------------------
+    def collection(self, name):
+        return FileCollection(self, name)
+
+    def insert_documents(self, collection, docs):
+        """寫入一批文件；DOCUMENT_PARTITIONS 中的 collection 依欄位值分到不同分片"""
+        self._register(collection, 'mongodb', None)
+        groups = {None: docs}
+        if collection in DOCUMENT_PARTITIONS:
+            field, pattern = DOCUMENT_PARTITIONS[collection]
+            groups = {}
+            for doc in docs:
+                groups.setdefault(doc[field].strftime(pattern), []).append(doc)
+
+        for partition, group in groups.items():
+            if self.file_format == 'parquet':
+                payload = documents_to_table(group, collection)
+                opener = lambda path: _ParquetPart(path, collection_schema(collection))
+            else:
+                payload = group
+                opener = _JsonLinesPart
+            self._write(collection, partition, payload, len(group), opener)
+
+    # --------------------------------------------
+    # 分片管理
+    # --------------------------------------------
+    def _register(self, entity, kind, columns):
+        if entity not in self.entities:
+            self.entities[entity] = {'kind': kind, 'columns': columns, 'rows': 0, 'files': []}
+
+    def _extension(self, kind):
+        if self.file_format == 'parquet':
+            return 'parquet'
+        return 'csv' if kind == 'postgres' else 'jsonl'
+
+    def _write(self, entity, partition, payload, rows, opener):
+        part = self._parts.get((entity, partition))
+        if part is not None and part.rows >= self.rows_per_file:
+            part.close()
+            part = None
+        if part is None:
+            info = self.entities[entity]
+            index = self._part_counts.get((entity, partition), 0)
+            self._part_counts[(entity, partition)] = index + 1
+            stem = '_'.join([entity, self.date_str] + ([partition] if partition else []))
+            relative = Path(entity, f"{stem}_part{index:05d}.{self._extension(info['kind'])}")
+            (self.directory / relative).parent.mkdir(parents=True, exist_ok=True)
+            part = opener(self.directory / relative)
+            self._parts[(entity, partition)] = part
+            info['files'].append(relative.as_posix())
+        part.write(payload)
+        self.entities[entity]['rows'] += rows
+
+    def finish(self):
+        """關閉所有分片並寫出 manifest.json（csv 另外寫出載入腳本）"""
+        if any(info['kind'] == 'postgres' for info in self.entities.values()):
+            for table, rows in SEEDED_TABLES.items():
+                if table not in self.entities:
+                    self.insert(table, [row[1:] for row in rows])
+                    self.entities[table]['seeded'] = True
+        for part in self._parts.values():
+            part.close()
+        self._parts = {}
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        manifest = {'format': self.file_format, 'rows_per_file': self.rows_per_file, 'entities': self.entities}
+        with open(self.directory / MANIFEST_NAME, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+        if self.file_format == 'csv':
+            if any(info['kind'] == 'postgres' for info in self.entities.values()):
+                self._write_postgres_loader()
+            if any(info['kind'] == 'mongodb' for info in self.entities.values()):
+                self._write_mongodb_loader()
+
+    def _write_postgres_loader(self):
+        """\\copy 各分片（依外鍵相依順序）後，把 SERIAL 序列推進到最大的主鍵"""
+        tables = [name for name, info in self.entities.items()
+                  if info['kind'] == 'postgres' and not info.get('seeded')]
+        lines = [
+            "-- 由 FileSink 產生；在此目錄執行：psql -d learnhub_prod -f load_postgres.sql",
+            "\\set ON_ERROR_STOP on",
+            "BEGIN;",
+            f"TRUNCATE TABLE {', '.join(reversed(tables))} CASCADE;",
+        ]
+        for table in tables:
+            info = self.entities[table]
+            columns = ', '.join(info['columns'])
+            for path in info['files']:
+                lines.append(f"\\copy {table} ({columns}) FROM '{path}' WITH (FORMAT csv, HEADER true)")
+        for table in tables:
+            key = PG_TABLES[table][0][0]
+            lines.append(f"SELECT setval(pg_get_serial_sequence('{table}', '{key}'), "
+                         f"coalesce(max({key}), 1), max({key}) IS NOT NULL) FROM {table};")
+        lines.append("COMMIT;")
+        (self.directory / 'load_postgres.sql').write_text('\n'.join(lines) + '\n', encoding='utf-8')
+
+    def _write_mongodb_loader(self):
+        lines = [
+            "#!/bin/sh",
+            "# 由 FileSink 產生；在此目錄執行：sh load_mongodb.sh（可用 MONGO_URI / MONGO_DB 覆寫連線）",
+            "set -e",
+            'MONGO_URI="${MONGO_URI:-mongodb://localhost:27017/?authSource=admin}"',
+            'MONGO_DB="${MONGO_DB:-learnhub_logs}"',
+        ]
+        for collection, info in self.entities.items():
+            if info['kind'] != 'mongodb':
+                continue
+            for path in info['files']:
+                lines.append(f'mongoimport --uri "$MONGO_URI" --db "$MONGO_DB" --collection {collection} --file {path}')
+        (self.directory / 'load_mongodb.sh').write_text('\n'.join(lines) + '\n', encoding='utf-8')
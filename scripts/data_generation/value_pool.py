@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Faker 值池快取
+每種欄位只用 Faker 生成一次去重後的大型值池，依 (欄位, 語系, seed, 大小) 快取為 .npy，
+之後以 NumPy 向量化抽樣取代逐筆呼叫 fake.name() / fake.sentence() 等
+
+用法：
+    pools = ValuePool(['zh_TW', 'en_US'], seed=42)
+    names = pools.draw('name', 5000)          # 可重複抽樣
+    emails = pools.unique('email', 200)       # 不重複抽樣（超過值池大小會報錯）
+    txn_ids = pools.stream_unique_uuid4()     # 保證不重複的 uuid4 字串
+"""
+
+import os
+import uuid
+import zlib
+from pathlib import Path
+
+import numpy as np
+from faker import Faker
+
+# 快取目錄（可用環境變數覆寫）
+CACHE_DIR = os.environ.get('LEARNHUB_POOL_CACHE', str(Path(__file__).resolve().parent / '.cache' / 'value_pools'))
+
+# ============================================
+# 值池定義：欄位 → (生成函式, 值池大小)
+# ============================================
+POOL_SPECS = {
+    'name': (lambda f: f.name(), 20000),
+    'email': (lambda f: f.email(), 20000),
+    'city': (lambda f: f.city(), 5000),
+    'ipv4': (lambda f: f.ipv4(), 100000),
+    'sentence': (lambda f: f.sentence(), 50000),
+    'sentence_3': (lambda f: f.sentence(nb_words=3), 20000),
+    'sentence_5': (lambda f: f.sentence(nb_words=5), 20000),
+    'sentence_6': (lambda f: f.sentence(nb_words=6), 20000),
+    'sentence_15': (lambda f: f.sentence(nb_words=15), 20000),
+    'text_300': (lambda f: f.text(max_nb_chars=300), 5000),
+    'text_500': (lambda f: f.text(max_nb_chars=500), 5000),
+    'catch_phrase': (lambda f: f.catch_phrase(), 5000),
+    'bs': (lambda f: f.bs(), 5000),
+    'slug': (lambda f: f.slug(), 10000),
+}
+
+# 去重時最多嘗試的倍數（city 等值域有限的欄位會提早停止）
+MAX_ATTEMPT_FACTOR = 3
+
+# 48 位元雙射混合用的常數（奇數乘法 + xorshift 在 mod 2^48 下皆為雙射）
+_MASK48 = np.uint64((1 << 48) - 1)
+_MIX_A = np.uint64(0x9E3779B97F4B)
+_MIX_B = np.uint64(0xBF58476D1CE5)
+
+
+def _mix48(values):
+    """將 48 位元整數做可逆打散，讓遞增計數器看起來隨機但仍保證不重複"""
+    x = values & _MASK48
+    x = (x * _MIX_A) & _MASK48
+    x ^= x >> np.uint64(24)
+    x = (x * _MIX_B) & _MASK48
+    x ^= x >> np.uint64(21)
+    return x
+
+
+class ValuePool:
+    """以 seed + 語系為鍵的 Faker 值池；所有抽樣都來自同一個 NumPy Generator，結果可重現"""
+
+    def __init__(self, locales=('zh_TW', 'en_US'), seed=42, cache_dir=CACHE_DIR, sizes=None):
+        self.locales = list(locales)
+        self.seed = seed
+        self.cache_dir = Path(cache_dir)
+        self.sizes = sizes or {}
+        self.rng = np.random.default_rng(seed)
+        self._pools = {}
+        self._unique_offsets = {}
+        self._counter = 0
+        self._counter_salt = int(np.random.default_rng([seed, 48]).integers(0, 1 << 47))
+
+    # --------------------------------------------
+    # 值池建立 / 快取
+    # --------------------------------------------
+    def _cache_path(self, field, size):
+        locale_key = '-'.join(self.locales)
+        return self.cache_dir / f"{field}_{locale_key}_seed{self.seed}_n{size}.npy"
+
+    def _build(self, field, size):
+        """用各語系的 Faker 輪流生成（不經過多語系 proxy 的逐次分派），並去重"""
+        generator_fn, _ = POOL_SPECS[field]
+        fake = Faker(self.locales)
+        fake.seed_instance(self.seed)
+        per_locale = [fake[locale] for locale in self.locales]
+
+        values, seen = [], set()
+        for attempt in range(size * MAX_ATTEMPT_FACTOR):
+            value = generator_fn(per_locale[attempt % len(per_locale)])
+            if value not in seen:
+                seen.add(value)
+                values.append(value)
+                if len(values) >= size:
+                    break
+        return np.array(values, dtype=str)
+
+    def pool(self, field):
+        """取得欄位值池（記憶體 → 磁碟快取 → 重新生成）"""
+        if field not in self._pools:
+            size = self.sizes.get(field, POOL_SPECS[field][1])
+            path = self._cache_path(field, size)
+            if path.exists():
+                values = np.load(path, allow_pickle=False)
+            else:
+                print(f"  🧺 建立值池：{field}（{size:,} 筆）")
+                values = self._build(field, size)
+                self.cache_dir.mkdir(parents=True, exist_ok=True)
+                tmp_path = path.with_name(f"{path.stem}.{os.getpid()}.tmp.npy")
+                np.save(tmp_path, values, allow_pickle=False)
+                os.replace(tmp_path, path)
+            self._pools[field] = values
+        return self._pools[field]
+
+    def reseed(self, *keys):
+        """
+        以 (seed, *keys) 重設抽樣用的亂數產生器，例如 reseed('user_events', 42)；
+        每個批次各自重設後，任一批次都能單獨重現，不受前面批次抽樣次數影響
+        """
+        entropy = [self.seed] + [k if isinstance(k, int) else zlib.crc32(str(k).encode('utf-8')) for k in keys]
+        self.rng = np.random.default_rng(entropy)
+
+    # --------------------------------------------
+    # 抽樣
+    # --------------------------------------------
+    def draw(self, field, n):
+        """可重複抽樣 n 個值，回傳 Python 字串列表"""
+        values = self.pool(field)
+        return values[self.rng.integers(0, len(values), n)].tolist()
+
+    def unique(self, field, n):
+        """
+        不重複抽樣 n 個值；同一個 ValuePool 內多次呼叫也不會重複
+        （以一次性的隨機排列依序取出），超過值池大小時拋出 ValueError
+        """
+        values = self.pool(field)
+        order_key = f"_order_{field}"
+        if order_key not in self._pools:
+            self._pools[order_key] = self.rng.permutation(len(values))
+        offset = self._unique_offsets.get(field, 0)
+        if offset + n > len(values):
+            raise ValueError(f"值池 {field} 只有 {len(values):,} 個不重複值，無法再取出 {n:,} 個")
+        self._unique_offsets[field] = offset + n
+        return values[self._pools[order_key][offset:offset + n]].tolist()
+
+    def stream(self, field, block=10000):
+        """無限迭代器：以 block 為單位向量化抽樣，適合逐筆迴圈中使用 next()"""
+        while True:
+            yield from self.draw(field, block)
+
+    # --------------------------------------------
+    # 隨機字串（不需要值池）
+    # --------------------------------------------
+    def hex(self, n, nbytes=32):
+        """n 個隨機十六進位字串（nbytes=32 等同 fake.sha256()）"""
+        raw = self.rng.bytes(n * nbytes)
+        return [raw[i:i + nbytes].hex() for i in range(0, n * nbytes, nbytes)]
+
+    def uuid4(self, n):
+        """n 個隨機 uuid4 字串（等同 fake.uuid4()，不保證唯一）"""
+        raw = self.rng.bytes(n * 16)
+        return [str(uuid.UUID(bytes=raw[i:i + 16], version=4)) for i in range(0, n * 16, 16)]
+
+    def unique_uuid4(self, n):
+        """
+        n 個保證不重複的 uuid4 字串（例如 transaction_id）
+        最後 48 位元 (node) 為遞增計數器經雙射打散的結果，其餘位元隨機，
+        因此同一個 ValuePool 最多可發出 2^48 個互不相同的值
+        """
+        counters = np.arange(self._counter, self._counter + n, dtype=np.uint64)
+        self._counter += n
+        nodes = _mix48(counters + np.uint64(self._counter_salt)).tolist()
+        high = self.rng.integers(0, (1 << 64) - 1, n, dtype=np.uint64, endpoint=True).tolist()
+        mid = self.rng.integers(0, 1 << 14, n, dtype=np.int64).tolist()
+        return [
+            str(uuid.UUID(int=(h << 64) | (m << 48) | node, version=4))
+            for h, m, node in zip(high, mid, nodes)
+        ]
+
+    def stream_unique_uuid4(self, block=10000):
+        """unique_uuid4 的無限迭代器版本"""
+        while True:
+            yield from self.unique_uuid4(block)
+
+    def stream_uuid4(self, block=10000):
+        """uuid4 的無限迭代器版本"""
+        while True:
+            yield from self.uuid4(block)
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+user_events 保留期限與歸檔
+將超過保留期限（--retention-days）的事件依日期分區寫成 zstd Parquet，確認筆數後分批刪除，
+讓熱資料 collection 與其索引（timestamp、session_id…）維持在記憶體放得下的大小。
+
+流程（由最舊的一天開始，逐日處理）：
+1. 以 timestamp 索引讀取當天事件，分批寫入本地 Parquet，同時記下 _id
+2. 驗證：Parquet footer 的筆數 = 讀取筆數；上傳後物件大小 = 本地檔案大小
+3. 以 _id 分批刪除（每批 --delete-batch 筆，批次間暫停），避免長時間持有鎖或拖慢線上寫入
+   只刪除已歸檔的 _id，歸檔期間新寫入同一天的事件會留到下次處理
+
+輸出：gs://<bucket>/archive/user_events/dt=<YYYY-MM-DD>/user_events_<YYYYMMDD>_<run_id>.parquet
+每次執行的檔名不同，中斷後重跑只會寫入尚未刪除的事件，不會覆寫先前的歸檔檔案。
+
+用法：
+    python scripts/etl/archive_user_events.py --dry-run
+    python scripts/etl/archive_user_events.py --retention-days 180 --max-days 30
+    python scripts/etl/archive_user_events.py --local-dir ./data_lake --compact
+"""
+
+import os
+import sys
+import time
+import shutil
+import logging
+import argparse
+import itertools
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pyarrow.parquet as pq
+from google.cloud import storage
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from common.db import get_mongo_db, close_all
+from common.event_layout import EVENT_LAYOUTS, find_events
+from extract_mongodb_to_gcs import GCS_BUCKET, BATCH_SIZE, collection_projection, collection_schema, documents_to_table
+
+# 設定日誌
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# ============================================
+# 配置
+# ============================================
+RETENTION_DAYS = 365
+ARCHIVE_PREFIX = 'archive/'
+
+# 每批刪除的 _id 數與批次間暫停秒數
+DELETE_BATCH = 1000
+DELETE_PAUSE_SECONDS = 0.05
+
+ZSTD_LEVEL = 9
+
+# ============================================
+# 歸檔
+# ============================================
+def archive_path(prefix, day, run_id):
+    return f"{prefix}user_events/dt={day:%Y-%m-%d}/user_events_{day:%Y%m%d}_{run_id}.parquet"
+
+
+def write_day(collection, layout, day, local_path):
+    """將一天的事件寫成 Parquet，回傳已寫入的 _id 列表"""
+    projection = dict(collection_projection('user_events'), _id=1)
+    query = {'timestamp': {'$gte': day, '$lt': day + timedelta(days=1)}}
+    cursor = find_events(collection, layout, projection, query=query)
+
+    ids = []
+    try:
+        with pq.ParquetWriter(local_path, collection_schema('user_events'),
+                              compression='zstd', compression_level=ZSTD_LEVEL) as writer:
+            while True:
+                batch = list(itertools.islice(cursor, BATCH_SIZE))
+                if not batch:
+                    break
+                writer.write_table(documents_to_table(batch, 'user_events'))
+                ids.extend(doc['_id'] for doc in batch)
+    finally:
+        cursor.close()
+    return ids
+
+
+def store_file(local_path, blob_path, bucket_name, local_dir=None):
+    """上傳（或複製到 local_dir），回傳目的地的檔案大小"""
+    if local_dir:
+        dest = os.path.join(local_dir, blob_path)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        shutil.copyfile(local_path, dest)
+        return os.path.getsize(dest)
+
+    blob = storage.Client().bucket(bucket_name).blob(blob_path)
+    blob.upload_from_filename(local_path)
+    blob.reload()
+    return blob.size
+
+
+def delete_in_batches(collection, ids, batch_size=DELETE_BATCH, pause=DELETE_PAUSE_SECONDS):
+    """以 _id 分批刪除，回傳實際刪除筆數"""
+    deleted = 0
+    for start in range(0, len(ids), batch_size):
+        deleted += collection.delete_many({'_id': {'$in': ids[start:start + batch_size]}}).deleted_count
+        if pause:
+            time.sleep(pause)
+    return deleted
+
+
+def archive_day(collection, layout, day, run_id, bucket_name, prefix, local_dir=None, delete_batch=DELETE_BATCH):
+    """歸檔並刪除一天的事件；驗證失敗時拋出例外且不刪除"""
+    local_path = f"/tmp/user_events_archive_{day:%Y%m%d}_{run_id}.parquet"
+    try:
+        ids = write_day(collection, layout, day, local_path)
+        if not ids:
+            return None
+
+        archived_rows = pq.ParquetFile(local_path).metadata.num_rows
+        if archived_rows != len(ids):
+            raise RuntimeError(f"{day:%Y-%m-%d} Parquet 筆數 {archived_rows:,} ≠ 讀取筆數 {len(ids):,}")
+
+        blob_path = archive_path(prefix, day, run_id)
+        local_size = os.path.getsize(local_path)
+        stored_size = store_file(local_path, blob_path, bucket_name, local_dir)
+        if stored_size != local_size:
+            raise RuntimeError(f"{blob_path} 大小 {stored_size:,} ≠ 本地檔案 {local_size:,}")
+    finally:
+        if os.path.exists(local_path):
+            os.remove(local_path)
+
+    deleted = delete_in_batches(collection, ids, delete_batch)
+    if deleted != len(ids):
+        logger.warning(f"  ⚠️  {day:%Y-%m-%d}：歸檔 {len(ids):,} 筆，刪除 {deleted:,} 筆（部分事件已被其他程序刪除）")
+
+    return {'day': f"{day:%Y-%m-%d}", 'rows': len(ids), 'deleted': deleted, 'bytes': local_size, 'path': blob_path}
+
+
+def days_to_archive(collection, cutoff, max_days=None):
+    """從最舊的事件日期到 cutoff（不含）的每一天"""
+    oldest = collection.find_one({'timestamp': {'$lt': cutoff}}, {'timestamp': 1}, sort=[('timestamp', 1)])
+    if oldest is None:
+        return []
+    day = oldest['timestamp'].replace(hour=0, minute=0, second=0, microsecond=0)
+    days = []
+    while day < cutoff and (max_days is None or len(days) < max_days):
+        days.append(day)
+        day += timedelta(days=1)
+    return days
+
+
+def collection_size(collection):
+    """回傳 (文件數, 資料 bytes, 索引 bytes)"""
+    stats = next(collection.aggregate([{'$collStats': {'storageStats': {}}}]))['storageStats']
+    return stats.get('count', 0), stats.get('storageSize', 0), stats.get('totalIndexSize', 0)
+
+# ============================================
+# 主程式
+# ============================================
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='user_events 保留期限與歸檔')
+    parser.add_argument('--retention-days', type=int, default=RETENTION_DAYS, help='保留在 MongoDB 的天數')
+    parser.add_argument('--max-days', type=int, help='本次最多處理的天數（由最舊開始）')
+    parser.add_argument('--events-layout', choices=list(EVENT_LAYOUTS), default='regular')
+    parser.add_argument('--bucket', default=GCS_BUCKET)
+    parser.add_argument('--prefix', default=ARCHIVE_PREFIX)
+    parser.add_argument('--local-dir', default=None, help='寫到本地目錄而非 GCS')
+    parser.add_argument('--delete-batch', type=int, default=DELETE_BATCH, help='每批刪除筆數')
+    parser.add_argument('--dry-run', action='store_true', help='只列出各日期的事件數，不歸檔也不刪除')
+    parser.add_argument('--compact', action='store_true', help='完成後執行 compact 釋放磁碟空間')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    cutoff = (datetime.utcnow() - timedelta(days=args.retention_days)).replace(
+        hour=0, minute=0, second=0, microsecond=0)
+    run_id = datetime.utcnow().strftime('%Y%m%dT%H%M%S')
+
+    logger.info("=" * 60)
+    logger.info(f"user_events 歸檔：{cutoff:%Y-%m-%d} 之前的事件（保留 {args.retention_days} 天）")
+    logger.info("=" * 60)
+
+    try:
+        db = get_mongo_db()
+        collection = db[EVENT_LAYOUTS[args.events_layout]]
+        count, data_bytes, index_bytes = collection_size(collection)
+        logger.info(f"📦 歸檔前：{count:,} 筆，資料 {data_bytes / 1024 / 1024:,.1f} MB，"
+                    f"索引 {index_bytes / 1024 / 1024:,.1f} MB")
+
+        days = days_to_archive(collection, cutoff, args.max_days)
+        if not days:
+            logger.info("✅ 沒有超過保留期限的事件")
+            return 0
+
+        results = []
+        for day in days:
+            if args.dry_run:
+                rows = collection.count_documents({'timestamp': {'$gte': day, '$lt': day + timedelta(days=1)}})
+                if rows:
+                    logger.info(f"  🔎 {day:%Y-%m-%d}：{rows:,} 筆")
+                continue
+
+            result = archive_day(collection, args.events_layout, day, run_id, args.bucket,
+                                 args.prefix, args.local_dir, args.delete_batch)
+            if result:
+                results.append(result)
+                logger.info(f"  ✅ {result['day']}：{result['rows']:,} 筆 → {result['path']}"
+                            f"（{result['bytes'] / 1024:,.0f} KB）")
+
+        if args.dry_run:
+            return 0
+
+        if args.compact:
+            logger.info("🗜️  compact...")
+            db.command('compact', collection.name)
+
+        count, data_bytes, index_bytes = collection_size(collection)
+        logger.info("=" * 60)
+        logger.info(f"📁 歸檔 {len(results)} 天、{sum(r['rows'] for r in results):,} 筆，"
+                    f"刪除 {sum(r['deleted'] for r in results):,} 筆")
+        logger.info(f"📦 歸檔後：{count:,} 筆，資料 {data_bytes / 1024 / 1024:,.1f} MB，"
+                    f"索引 {index_bytes / 1024 / 1024:,.1f} MB")
+
+    except Exception as e:
+        logger.error(f"❌ 歸檔失敗：{e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+    finally:
+        close_all()
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,503 @@
+#!/usr/bin/env python3
+"""
+ETL Pipeline（非同步版）: PostgreSQL + MongoDB → GCS
+抽取、Parquet 編碼、上傳拆成三個階段，以有界 asyncio.Queue 串接：
+- 抽取：psycopg2 伺服器端 cursor / pymongo cursor 在執行緒中分批讀取，佇列滿時阻塞（背壓）
+- 編碼：ProcessPoolExecutor 將每批資料轉成 Arrow 並寫成 Parquet 分片檔，不受 GIL 限制
+- 上傳：在執行緒中上傳到 GCS（或 --local-dir 指定的本地目錄）
+所有資料表與 collection 同時進行，整體吞吐量取決於最慢的資源，而不是各階段耗時的總和
+
+PostgreSQL 欄位型別由 schema_registry 決定，每個分片的 schema（含列舉欄位的字典）一致
+
+--adaptive：PostgreSQL 資料表依整數主鍵範圍切成分片，由 load_governor 的 AIMD 控制器
+依線上負載（canary 查詢延遲、鎖等待、抽取本身的讀取時間）調整同時讀取的分片數，
+從 1 開始逐步增加，超過 --oltp-budget-ms 時減半。各分片各自取得快照，
+同一列只會出現一次，但不同分片可能反映不同時間點的資料。
+
+輸出：gs://<bucket>/<prefix><table>/<table>_<YYYYMMDD>_part<NNNNN>.parquet
+
+用法：
+    python scripts/etl/async_pipeline.py
+    python scripts/etl/async_pipeline.py --tables users payments --collections user_events
+    python scripts/etl/async_pipeline.py --local-dir ./data_lake   # 不上傳，寫到本地
+    python scripts/etl/async_pipeline.py --adaptive --oltp-budget-ms 20
+"""
+
+import os
+import sys
+import time
+import shutil
+import asyncio
+import logging
+import argparse
+import itertools
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from google.cloud import storage
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from common.db import pg_connection, iter_pg_batches, get_mongo_db, close_all, PG_POOL_MAX
+from common.event_layout import EVENT_LAYOUTS
+from etl_metrics import TableMetrics, log_metrics, export_metrics
+from extract_postgres_to_gcs import TABLES, GCS_BUCKET, GCS_PREFIX
+from extract_mongodb_to_gcs import COLLECTIONS, BATCH_SIZE, find_documents, documents_to_table
+from schema_registry import get_table_schema, register_json_as_text, integer_primary_key
+from load_governor import AdaptiveLimiter, AimdController, PgLoadProbe, OLTP_BUDGET_MS, MIN_READERS, MAX_READERS
+from parquet_layout import write_parquet
+
+logger = logging.getLogger(__name__)
+
+# ============================================
+# 配置
+# ============================================
+# PostgreSQL 每個分片的筆數（MongoDB 沿用 extract_mongodb_to_gcs.BATCH_SIZE）
+CHUNK_ROWS = 100000
+# 每個佇列最多暫存的分片數；佇列滿時上游階段等待，記憶體用量有上限
+QUEUE_SIZE = 8
+ENCODE_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+# 編碼子行程的啟動方式：主行程已有連線池、GCS client 與執行緒，fork 會複製其 socket 與鎖的狀態
+ENCODE_START_METHOD = 'forkserver'
+UPLOAD_WORKERS = 4
+# 同時抽取的資料表數（PostgreSQL 不超過連線池大小）
+PG_CONCURRENCY = PG_POOL_MAX
+MONGO_CONCURRENCY = 2
+
+# ============================================
+# 編碼（在子行程執行，函式需可被 pickle）
+# ============================================
+def encode_chunk(source, table_name, schema, records, path):
+    """將一批資料寫成 Parquet 分片，回傳筆數、大小與轉換/編碼耗時（PostgreSQL 需傳入 TableSchema）"""
+    started = time.perf_counter()
+    if source == 'postgres':
+        table = schema.rows_to_table(records)
+    else:
+        table = documents_to_table(records, table_name)
+    converted = time.perf_counter()
+    # 各分片的欄位型別必須一致，因此只逐欄選擇壓縮法，不自動轉 dictionary
+    write_parquet(table, path, auto_dictionary=False)
+    return {
+        'rows': table.num_rows,
+        'raw_bytes': table.nbytes,
+        'encoded_bytes': os.path.getsize(path),
+        'convert': converted - started,
+        'encode': time.perf_counter() - converted,
+    }
+
+# ============================================
+# 單一資料表的執行狀態（只在 event loop 執行緒中修改）
+# ============================================
+class TableRun:
+
+    def __init__(self, source, name):
+        self.source = source
+        self.name = name
+        self.metrics = TableMetrics(name)
+        self.started = time.monotonic()
+        self.finished = None
+        self.extracted = False
+        self.pending = 0
+        self.parts = []
+        self.bytes = 0
+        self.error = None
+
+    def fail(self, message):
+        if self.error is None:
+            self.error = message
+            logger.error(f"❌ {self.name}：{message}")
+
+    def part_done(self):
+        self.pending -= 1
+        self._maybe_finish()
+
+    def extract_done(self):
+        self.extracted = True
+        self._maybe_finish()
+
+    def _maybe_finish(self):
+        if self.extracted and self.pending == 0 and self.finished is None:
+            self.finished = time.monotonic()
+            if self.error is None:
+                logger.info(f"  ✅ {self.name}：{self.metrics.rows:,} 筆，{len(self.parts)} 個分片")
+
+    def result(self, prefix):
+        if self.error is not None:
+            if self.parts:
+                logger.warning(f"⚠️  {self.name} 已上傳 {len(self.parts)} 個分片，需手動清除或重跑覆蓋")
+            return {'table': self.name, 'rows': 0, 'status': 'failed', 'error': self.error}
+        return {
+            'table': self.name,
+            'rows': self.metrics.rows,
+            'bytes': self.bytes,
+            'duration_seconds': round((self.finished or time.monotonic()) - self.started, 3),
+            'status': 'success',
+            'path': f"{prefix}{self.name}/",
+            'parts': len(self.parts),
+            'metrics': self.metrics.as_dict(),
+        }
+
+# ============================================
+# 管線
+# ============================================
+class AsyncPipeline:
+    """
+    三階段非同步管線；各階段的耗時為所有分片累計的忙碌時間，
+    平行處理時總和會大於實際經過時間（duration_seconds）
+    """
+
+    def __init__(self, bucket_name=GCS_BUCKET, prefix=GCS_PREFIX, local_dir=None,
+                 chunk_rows=CHUNK_ROWS, queue_size=QUEUE_SIZE, encode_workers=ENCODE_WORKERS,
+                 upload_workers=UPLOAD_WORKERS, pg_concurrency=PG_CONCURRENCY,
+                 mongo_concurrency=MONGO_CONCURRENCY, events_layout='regular', adaptive=False,
+                 oltp_budget_ms=OLTP_BUDGET_MS, max_readers=MAX_READERS):
+        self.bucket_name = bucket_name
+        self.prefix = prefix
+        self.local_dir = local_dir
+        self.chunk_rows = chunk_rows
+        self.queue_size = queue_size
+        self.encode_workers = encode_workers
+        self.upload_workers = upload_workers
+        self.pg_concurrency = pg_concurrency
+        self.mongo_concurrency = mongo_concurrency
+        self.events_layout = events_layout
+        self.adaptive = adaptive
+        self.oltp_budget_ms = oltp_budget_ms
+        self.max_readers = max_readers
+        self.controller = None
+        self.date_str = datetime.now().strftime('%Y%m%d')
+        self._bucket = None
+
+    # --------------------------------------------
+    # 抽取（執行緒）
+    # --------------------------------------------
+    def _produce(self, run, loop, batches):
+        """逐批讀取並送進編碼佇列；佇列滿時阻塞此執行緒，cursor 也隨之暫停讀取"""
+        for part in itertools.count():
+            if run.error is not None:
+                return
+            with run.metrics.stage('fetch'):
+                batch = next(batches, None)
+            if batch is None:
+                return
+            schema, records = batch
+            asyncio.run_coroutine_threadsafe(
+                self._enqueue_chunk(run, part, schema, records), loop
+            ).result()
+
+    def _produce_postgres(self, run, loop):
+        with pg_connection() as conn:
+            schema = get_table_schema(conn, run.name)
+            batches = iter_pg_batches(conn, f"SELECT {', '.join(schema.column_names)} FROM {run.name};",
+                                      batch_size=self.chunk_rows, name=f"async_{run.name}",
+                                      cursor_setup=register_json_as_text)
+            self._produce(run, loop, ((schema, rows) for _, rows in batches))
+
+    def _produce_mongodb(self, run, loop):
+        cursor = find_documents(get_mongo_db(), run.name, self.events_layout)
+        try:
+            batches = iter(lambda: list(itertools.islice(cursor, BATCH_SIZE)), [])
+            self._produce(run, loop, ((None, docs) for docs in batches))
+        finally:
+            cursor.close()
+
+    def _plan_chunks(self, table_name):
+        """回傳 (schema, 主鍵, [(下界, 上界), ...])；沒有整數主鍵時整張表為一個分片（範圍為 None）"""
+        with pg_connection() as conn:
+            schema = get_table_schema(conn, table_name)
+            key = integer_primary_key(conn, table_name)
+            if key is None:
+                return schema, None, [None]
+            with conn.cursor() as cursor:
+                cursor.execute(f"SELECT min({key}), max({key}) FROM {table_name};")
+                low, high = cursor.fetchone()
+            conn.rollback()
+        if low is None:
+            return schema, key, []
+        return schema, key, [(start, min(start + self.chunk_rows, high + 1))
+                             for start in range(low, high + 1, self.chunk_rows)]
+
+    def _fetch_range(self, table_name, schema, key, bounds):
+        query = f"SELECT {', '.join(schema.column_names)} FROM {table_name}"
+        if bounds is not None:
+            query += f" WHERE {key} >= %s AND {key} < %s"
+        with pg_connection() as conn:
+            with conn.cursor() as cursor:
+                register_json_as_text(cursor)
+                cursor.execute(query + ';', bounds)
+                rows = cursor.fetchall()
+            conn.rollback()
+        return rows
+
+    async def _read_chunk(self, run, part, schema, key, bounds):
+        """讀取一個主鍵範圍；名額持有到分片送進編碼佇列為止（佇列滿時不再放行新的讀取）"""
+        async with self.limiter:
+            if run.error is not None:
+                return
+            loop = asyncio.get_running_loop()
+            started = time.perf_counter()
+            try:
+                rows = await loop.run_in_executor(self.extract_threads, self._fetch_range,
+                                                  run.name, schema, key, bounds)
+            except Exception as e:
+                run.fail(f"抽取失敗：{e}")
+                return
+            seconds = time.perf_counter() - started
+            run.metrics.add_stage('fetch', seconds)
+            self.controller.record_chunk(run.name, len(rows), seconds)
+            if rows:
+                await self._enqueue_chunk(run, part, schema, rows)
+
+    async def _extract_chunked(self, run):
+        loop = asyncio.get_running_loop()
+        try:
+            # 規劃也需要一條連線池連線，同樣受並行上限控制
+            async with self.limiter:
+                logger.info(f"📥 抽取（分片）：{run.name}")
+                schema, key, ranges = await loop.run_in_executor(self.extract_threads, self._plan_chunks, run.name)
+            await asyncio.gather(*(self._read_chunk(run, part, schema, key, bounds)
+                                   for part, bounds in enumerate(ranges)))
+        except Exception as e:
+            run.fail(f"抽取失敗：{e}")
+        finally:
+            run.extract_done()
+
+    async def _enqueue_chunk(self, run, part, schema, records):
+        run.pending += 1
+        await self.encode_queue.put((run, part, schema, records))
+
+    async def _extract(self, run, semaphore, producer):
+        async with semaphore:
+            logger.info(f"📥 抽取：{run.name}")
+            loop = asyncio.get_running_loop()
+            try:
+                await loop.run_in_executor(self.extract_threads, producer, run, loop)
+            except Exception as e:
+                run.fail(f"抽取失敗：{e}")
+            finally:
+                run.extract_done()
+
+    # --------------------------------------------
+    # 編碼（子行程）
+    # --------------------------------------------
+    async def _encode_worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            run, part, schema, records = await self.encode_queue.get()
+            handed_off = False
+            try:
+                if run.error is None:
+                    path = os.path.join(self.staging_dir, f"{run.name}_{self.date_str}_part{part:05d}.parquet")
+                    stats = await loop.run_in_executor(
+                        self.processes, encode_chunk, run.source, run.name, schema, records, path
+                    )
+                    run.metrics.add_stage('convert', stats['convert'])
+                    run.metrics.add_stage('encode', stats['encode'])
+                    run.metrics.rows += stats['rows']
+                    run.metrics.raw_bytes += stats['raw_bytes']
+                    run.metrics.encoded_bytes += stats['encoded_bytes']
+                    await self.upload_queue.put((run, path))
+                    handed_off = True
+            except Exception as e:
+                run.fail(f"編碼失敗：{e}")
+            finally:
+                if not handed_off:
+                    run.part_done()
+                self.encode_queue.task_done()
+
+    # --------------------------------------------
+    # 上傳（執行緒）
+    # --------------------------------------------
+    def _upload(self, table_name, local_path):
+        """上傳單一分片，回傳 (目的路徑, bytes)"""
+        dest = f"{self.prefix}{table_name}/{os.path.basename(local_path)}"
+        size = os.path.getsize(local_path)
+        if self.local_dir:
+            target = os.path.join(self.local_dir, dest)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.move(local_path, target)
+            return target, size
+
+        if self._bucket is None:
+            self._bucket = storage.Client().bucket(self.bucket_name)
+        self._bucket.blob(dest).upload_from_filename(local_path)
+        return f"gs://{self.bucket_name}/{dest}", size
+
+    async def _upload_worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            run, path = await self.upload_queue.get()
+            try:
+                if run.error is None:
+                    started = time.perf_counter()
+                    dest, size = await loop.run_in_executor(self.upload_threads, self._upload, run.name, path)
+                    run.metrics.add_stage('upload', time.perf_counter() - started)
+                    run.parts.append(dest)
+                    run.bytes += size
+            except Exception as e:
+                run.fail(f"上傳失敗：{e}")
+            finally:
+                if os.path.exists(path):
+                    os.remove(path)
+                run.part_done()
+                self.upload_queue.task_done()
+
+    # --------------------------------------------
+    # 執行
+    # --------------------------------------------
+    async def run(self, tables=TABLES, collections=tuple(COLLECTIONS)):
+        runs = [TableRun('postgres', t) for t in tables] + [TableRun('mongodb', c) for c in collections]
+
+        self.encode_queue = asyncio.Queue(maxsize=self.queue_size)
+        self.upload_queue = asyncio.Queue(maxsize=self.queue_size)
+        self.staging_dir = tempfile.mkdtemp(prefix='learnhub_etl_')
+        pg_semaphore = asyncio.Semaphore(self.pg_concurrency)
+        mongo_semaphore = asyncio.Semaphore(self.mongo_concurrency)
+        pg_readers = self.pg_concurrency
+        controller_task = None
+        if self.adaptive:
+            self.limiter = AdaptiveLimiter(MIN_READERS)
+            self.controller = AimdController(self.limiter, PgLoadProbe(), maximum=self.max_readers,
+                                             budget_ms=self.oltp_budget_ms, chunk_rows=self.chunk_rows)
+            controller_task = asyncio.create_task(self.controller.run())
+            pg_readers = self.max_readers
+
+        try:
+            with ProcessPoolExecutor(self.encode_workers,
+                                     mp_context=multiprocessing.get_context(ENCODE_START_METHOD)) as self.processes, \
+                    ThreadPoolExecutor(pg_readers + self.mongo_concurrency,
+                                       thread_name_prefix='extract') as self.extract_threads, \
+                    ThreadPoolExecutor(self.upload_workers, thread_name_prefix='upload') as self.upload_threads:
+                workers = [asyncio.create_task(self._encode_worker()) for _ in range(self.encode_workers)]
+                workers += [asyncio.create_task(self._upload_worker()) for _ in range(self.upload_workers)]
+
+                await asyncio.gather(*(
+                    (self._extract_chunked(r) if self.adaptive
+                     else self._extract(r, pg_semaphore, self._produce_postgres)) if r.source == 'postgres'
+                    else self._extract(r, mongo_semaphore, self._produce_mongodb)
+                    for r in runs
+                ))
+                await self.encode_queue.join()
+                await self.upload_queue.join()
+
+                for worker in workers:
+                    worker.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+        finally:
+            if controller_task is not None:
+                controller_task.cancel()
+                await asyncio.gather(controller_task, return_exceptions=True)
+            shutil.rmtree(self.staging_dir, ignore_errors=True)
+
+        return runs
+
+# ============================================
+# 主程式
+# ============================================
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='LearnHub 非同步 ETL：PostgreSQL + MongoDB → GCS')
+    parser.add_argument('--tables', nargs='*', default=TABLES, help='要抽取的 PostgreSQL 資料表')
+    parser.add_argument('--collections', nargs='*', default=list(COLLECTIONS), help='要抽取的 MongoDB collection')
+    parser.add_argument('--bucket', default=GCS_BUCKET)
+    parser.add_argument('--prefix', default=GCS_PREFIX)
+    parser.add_argument('--local-dir', default=None, help='寫到本地目錄而非 GCS（測試用）')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS, help='PostgreSQL 每個分片的筆數')
+    parser.add_argument('--queue-size', type=int, default=QUEUE_SIZE, help='各階段間佇列可暫存的分片數')
+    parser.add_argument('--encode-workers', type=int, default=ENCODE_WORKERS, help='Parquet 編碼子行程數')
+    parser.add_argument('--upload-workers', type=int, default=UPLOAD_WORKERS, help='上傳執行緒數')
+    parser.add_argument('--pg-concurrency', type=int, default=PG_CONCURRENCY,
+                        help='同時抽取的資料表數（每張表佔用一條連線，不超過連線池大小 PG_POOL_MAX）')
+    parser.add_argument('--mongo-concurrency', type=int, default=MONGO_CONCURRENCY, help='同時抽取的 collection 數')
+    parser.add_argument('--events-layout', choices=list(EVENT_LAYOUTS), default='regular',
+                        help='user_events 的儲存版面（輸出欄位相同）')
+    parser.add_argument('--adaptive', action='store_true',
+                        help='PostgreSQL 依主鍵範圍分片讀取，並依線上負載自動調整並行數')
+    parser.add_argument('--oltp-budget-ms', type=float, default=OLTP_BUDGET_MS,
+                        help='--adaptive：canary 查詢 p95 延遲上限（毫秒）')
+    parser.add_argument('--max-readers', type=int, default=MAX_READERS,
+                        help='--adaptive：同時讀取的分片數上限（不超過連線池大小 PG_POOL_MAX）')
+    args = parser.parse_args(argv)
+    # 連線池用盡時 getconn 直接拋出 PoolError，不會等待
+    if args.pg_concurrency > PG_POOL_MAX:
+        parser.error(f"--pg-concurrency 不能超過連線池大小 PG_POOL_MAX={PG_POOL_MAX}")
+    if args.max_readers > PG_POOL_MAX:
+        parser.error(f"--max-readers 不能超過連線池大小 PG_POOL_MAX={PG_POOL_MAX}")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    logger.info("=" * 60)
+    logger.info("ETL Pipeline（非同步）: PostgreSQL + MongoDB → GCS")
+    logger.info("=" * 60)
+    logger.info(f"資料表 {len(args.tables)} 個、collection {len(args.collections)} 個；"
+                f"編碼 {args.encode_workers} 行程、上傳 {args.upload_workers} 執行緒、佇列 {args.queue_size}")
+
+    pipeline = AsyncPipeline(
+        bucket_name=args.bucket,
+        prefix=args.prefix,
+        local_dir=args.local_dir,
+        chunk_rows=args.chunk_rows,
+        queue_size=args.queue_size,
+        encode_workers=args.encode_workers,
+        upload_workers=args.upload_workers,
+        pg_concurrency=args.pg_concurrency,
+        mongo_concurrency=args.mongo_concurrency,
+        events_layout=args.events_layout,
+        adaptive=args.adaptive,
+        oltp_budget_ms=args.oltp_budget_ms,
+        max_readers=args.max_readers,
+    )
+
+    started = time.monotonic()
+    try:
+        runs = asyncio.run(pipeline.run(args.tables, args.collections))
+    except Exception as e:
+        logger.error(f"❌ ETL 失敗：{e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+    finally:
+        close_all()
+    elapsed = time.monotonic() - started
+
+    results = [r.result(args.prefix) for r in runs]
+    for r in runs:
+        if r.error is None:
+            log_metrics(r.metrics)
+    export_metrics([r.metrics for r in runs if r.error is None], 'async_pipeline')
+
+    # 總結
+    logger.info("=" * 60)
+    logger.info("ETL 完成總結")
+    logger.info("=" * 60)
+    total_rows = sum(r['rows'] for r in results)
+    logger.info(f"⏱️  總耗時：{elapsed:.1f}s，{total_rows:,} 筆（{total_rows / elapsed if elapsed else 0:,.0f} 筆/s）")
+
+    busy = {}
+    for r in runs:
+        for stage, seconds in r.metrics.stages.items():
+            busy[stage] = busy.get(stage, 0.0) + seconds
+    logger.info("各階段累計忙碌時間：" + ", ".join(f"{k} {v:.1f}s" for k, v in busy.items()))
+
+    if pipeline.controller is not None:
+        summary = pipeline.controller.summary()
+        if summary['samples']:
+            logger.info(f"🎚️  並行讀取：平均 {summary['avg_limit']}、最高 {summary['max_limit']}，"
+                        f"調降 {summary['decreases']} 次；canary p95 最高 {summary['max_canary_p95_ms']}ms，"
+                        f"超出預算 {summary['over_budget_samples']}/{summary['samples']} 次")
+
+    for r in results:
+        status_icon = "✅" if r['status'] == 'success' else "❌"
+        detail = f"{r['rows']:,} 筆, {r['parts']} 個分片, {r['duration_seconds']:.1f}s" \
+            if r['status'] == 'success' else r['error']
+        logger.info(f"  {status_icon} {r['table']}: {detail}")
+
+    return 0 if all(r['status'] == 'success' for r in results) else 1
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,535 @@
+#!/usr/bin/env python3
+"""
+PostgreSQL CDC：邏輯複寫（pgoutput）→ 變更 Parquet
+全量 / 水位抽取看不到 DELETE，也必須對 OLTP 資料表下查詢；CDC 改為讀取 WAL：
+- 以 publication 指定 TABLES 的八個資料表，replication slot 記錄已確認的 LSN
+- 解析 pgoutput 協定（Begin / Relation / Insert / Update / Delete / Truncate / Commit）
+- 依資料表累積已提交交易的變更，達到 --flush-rows 筆或 --flush-seconds 秒時寫出 Parquet
+- 進行中的交易超過 --flush-rows 筆時溢寫到暫存 Parquet（例如生成器單一交易的百萬筆付款），
+  記憶體只保留最多 --flush-rows 筆；COMMIT 後補上提交欄位並立即寫出
+- 所有檔案寫入完成（本地 fsync / GCS 上傳成功）後才回報 flush LSN，
+  中途當機時 PostgreSQL 會從上次確認的位置重送，不會遺失變更
+
+輸出：gs://<bucket>/cdc/<table>/<table>_<起始 LSN>_<結束 LSN>.parquet（LSN 為 16 位十六進位，檔名排序即 LSN 順序）
+欄位：_lsn、_commit_lsn、_seq、_commit_ts、_xid、_op（insert / update / delete / truncate）、
+     _unchanged_columns（未變更的 TOAST 欄位，值為 NULL）＋ 資料表欄位（型別同 schema_registry）
+_lsn 是 WAL 紀錄的 LSN，不能當成唯一鍵：multi-insert（COPY、load_postgres.sql 的 \copy）一筆 WAL 紀錄
+會寫入多列，這些列的 _lsn 相同；_seq 為變更在交易內的序號（從 0 起算）。
+當機重送可能讓同一筆變更出現在兩個檔案，下游以 (_commit_lsn, _seq) 去除重複。
+DELETE 只帶主鍵欄位；需要完整舊值時以 --setup --replica-identity-full 設定。
+
+前置條件：wal_level=logical（compose.yaml 的 postgres 已加上）
+
+用法：
+    python scripts/etl/cdc_capture.py --setup                     # 建立 publication 與 slot
+    python scripts/etl/cdc_capture.py --local-dir ./data_lake     # 持續擷取，Ctrl+C 結束
+    python scripts/etl/cdc_capture.py --idle-exit 30              # 30 秒沒有新變更即結束
+    python scripts/etl/cdc_capture.py --drop-slot                 # 停用 CDC（slot 未消費會讓 WAL 持續累積）
+"""
+
+import os
+import sys
+import time
+import shutil
+import select
+import signal
+import struct
+import logging
+import argparse
+import tempfile
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import psycopg2.extensions
+from psycopg2 import sql
+from google.cloud import storage
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from common.db import pg_connection, pg_replication_connection, close_all
+from extract_postgres_to_gcs import TABLES, GCS_BUCKET
+from schema_registry import JSON_TYPES, get_table_schema
+
+# 設定日誌
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# ============================================
+# 配置
+# ============================================
+SLOT_NAME = 'learnhub_cdc'
+PUBLICATION = 'learnhub_cdc'
+CDC_PREFIX = 'cdc/'
+
+FLUSH_ROWS = 50000
+FLUSH_SECONDS = 30
+# 回報 standby status（keepalive）的間隔秒數
+STATUS_INTERVAL = 10
+
+# PostgreSQL 時間戳以 2000-01-01 起算的微秒表示
+PG_EPOCH_US = 946684800 * 1000000
+
+OPS = {'I': 'insert', 'U': 'update', 'D': 'delete', 'T': 'truncate'}
+
+CHANGE_SCHEMA = pa.schema([
+    ('_lsn', pa.int64()),
+    ('_commit_lsn', pa.int64()),
+    # 交易內的變更序號；(_commit_lsn, _seq) 唯一識別一筆變更
+    ('_seq', pa.int32()),
+    ('_commit_ts', pa.timestamp('us', tz='UTC')),
+    ('_xid', pa.int64()),
+    ('_op', pa.string()),
+    ('_unchanged_columns', pa.list_(pa.string())),
+])
+
+# 未變更的 TOAST 欄位（pgoutput 不重送其值）
+UNCHANGED = object()
+
+# ============================================
+# pgoutput 協定解析
+# ============================================
+class Relation:
+    """Relation 訊息：資料表名稱與欄位（名稱、型別 OID）"""
+
+    def __init__(self, namespace, name, columns):
+        self.namespace = namespace
+        self.name = name
+        self.columns = columns
+
+
+class PgOutputDecoder:
+    """
+    將 pgoutput（proto_version 1）訊息解碼為 tuple：
+    ('begin', final_lsn, commit_ts, xid) / ('commit', commit_lsn, end_lsn, commit_ts) /
+    ('change', op, relation, {欄位: 文字值}) / ('truncate', [relation, ...]) / None（不處理的訊息）
+    """
+
+    def __init__(self):
+        self.relations = {}
+
+    def decode(self, payload):
+        self._buf = payload
+        self._pos = 1
+        kind = payload[:1]
+
+        if kind == b'B':
+            final_lsn, commit_ts, xid = self._unpack('>qqI')
+            return ('begin', final_lsn, commit_ts, xid)
+        if kind == b'C':
+            _, commit_lsn, end_lsn, commit_ts = self._unpack('>bqqq')
+            return ('commit', commit_lsn, end_lsn, commit_ts)
+        if kind == b'R':
+            oid, = self._unpack('>I')
+            namespace, name = self._string(), self._string()
+            _, ncols = self._unpack('>bh')
+            columns = []
+            for _ in range(ncols):
+                self._unpack('>b')
+                column = self._string()
+                type_oid, _ = self._unpack('>Ii')
+                columns.append((column, type_oid))
+            self.relations[oid] = Relation(namespace, name, columns)
+            return None
+        if kind == b'I':
+            relation = self._relation()
+            self._unpack('>c')
+            return ('change', 'I', relation, self._tuple(relation))
+        if kind == b'U':
+            relation = self._relation()
+            marker, = self._unpack('>c')
+            if marker in (b'K', b'O'):
+                # 舊值（主鍵或 REPLICA IDENTITY FULL），只保留新值
+                self._tuple(relation)
+                self._unpack('>c')
+            return ('change', 'U', relation, self._tuple(relation))
+        if kind == b'D':
+            relation = self._relation()
+            self._unpack('>c')
+            return ('change', 'D', relation, self._tuple(relation))
+        if kind == b'T':
+            nrels, _ = self._unpack('>ib')
+            return ('truncate', [self.relations[self._unpack('>I')[0]] for _ in range(nrels)])
+        # Origin / Type / Message 等不影響資料內容
+        return None
+
+    def _unpack(self, fmt):
+        values = struct.unpack_from(fmt, self._buf, self._pos)
+        self._pos += struct.calcsize(fmt)
+        return values
+
+    def _string(self):
+        end = self._buf.index(b'\0', self._pos)
+        value = bytes(self._buf[self._pos:end]).decode('utf-8')
+        self._pos = end + 1
+        return value
+
+    def _relation(self):
+        return self.relations[self._unpack('>I')[0]]
+
+    def _tuple(self, relation):
+        ncols, = self._unpack('>h')
+        values = {}
+        for column, _ in relation.columns[:ncols]:
+            kind, = self._unpack('>c')
+            if kind == b'n':
+                values[column] = None
+            elif kind == b'u':
+                values[column] = UNCHANGED
+            else:
+                length, = self._unpack('>i')
+                values[column] = bytes(self._buf[self._pos:self._pos + length]).decode('utf-8')
+                self._pos += length
+        return values
+
+# ============================================
+# 變更緩衝與寫出
+# ============================================
+class ChangeBuffer:
+    """
+    依資料表累積已提交的變更；flush 時以 psycopg2 的型別轉換把文字值轉回 Python 值
+    進行中的交易累積 spill_rows 筆即溢寫到暫存目錄（_commit_lsn / _commit_ts 暫為 0，COMMIT 後補上）
+    """
+
+    def __init__(self, conn, output_dir=None, bucket_name=GCS_BUCKET, prefix=CDC_PREFIX, spill_rows=FLUSH_ROWS):
+        self.conn = conn
+        self.cast_cursor = conn.cursor()
+        self.output_dir = output_dir
+        self.bucket_name = bucket_name
+        self.prefix = prefix
+        self.spill_rows = spill_rows
+        self.tables = {}
+        # 已提交、溢寫過的交易：(資料表, 暫存檔, 起始 LSN, 結束 LSN, commit LSN, commit 時間)
+        self.spilled = []
+        self._spill_dir = None
+        self.column_types = {}
+        self.rows = 0
+        self.transaction = None
+        self.last_commit_lsn = 0
+        self.last_flush = time.monotonic()
+        self._bucket = None
+
+    # --------------------------------------------
+    # 協定事件
+    # --------------------------------------------
+    def handle(self, event, lsn):
+        if event is None:
+            return
+        kind = event[0]
+        if kind == 'begin':
+            # seq：交易內的變更序號；spill：資料表 → 溢寫中的暫存檔
+            self.transaction = {'xid': event[3], 'changes': [], 'seq': 0, 'spill': {}}
+        elif kind == 'change':
+            _, op, relation, values = event
+            self.column_types[relation.name] = dict(relation.columns)
+            self._append(relation.name, lsn, op, values)
+        elif kind == 'truncate':
+            for relation in event[1]:
+                self._append(relation.name, lsn, 'T', {})
+        elif kind == 'commit':
+            _, commit_lsn, end_lsn, commit_ts = event
+            transaction = self.transaction
+            if transaction['spill']:
+                self._spill()
+                for table, spill in transaction['spill'].items():
+                    spill['writer'].close()
+                    self.spilled.append((table, spill['path'], spill['first_lsn'], spill['last_lsn'],
+                                         commit_lsn, commit_ts + PG_EPOCH_US))
+            else:
+                for table, change_lsn, seq, op, values in transaction['changes']:
+                    self.tables.setdefault(table, []).append(
+                        (change_lsn, commit_lsn, seq, commit_ts + PG_EPOCH_US, transaction['xid'], op, values))
+            self.rows += transaction['seq']
+            self.transaction = None
+            self.last_commit_lsn = end_lsn
+
+    def _append(self, table, lsn, op, values):
+        transaction = self.transaction
+        transaction['changes'].append((table, lsn, transaction['seq'], op, values))
+        transaction['seq'] += 1
+        if len(transaction['changes']) >= self.spill_rows:
+            self._spill()
+
+    def _spill(self):
+        """將進行中交易的變更依資料表附加到暫存 Parquet，清空記憶體中的變更"""
+        transaction = self.transaction
+        by_table = {}
+        for table, lsn, seq, op, values in transaction['changes']:
+            by_table.setdefault(table, []).append((lsn, 0, seq, 0, transaction['xid'], op, values))
+        if self._spill_dir is None:
+            self._spill_dir = tempfile.mkdtemp(prefix='learnhub_cdc_')
+
+        for table, changes in by_table.items():
+            arrow_table = self.to_table(table, changes)
+            spill = transaction['spill'].get(table)
+            if spill is None:
+                path = os.path.join(self._spill_dir, f"{table}_{changes[0][0]:016X}.parquet")
+                spill = transaction['spill'][table] = {
+                    'path': path, 'first_lsn': changes[0][0],
+                    'writer': pq.ParquetWriter(path, arrow_table.schema, compression='zstd'),
+                }
+            # 擷取期間新增欄位時 schema 不同，ParquetWriter 會直接拋出錯誤
+            spill['writer'].write_table(arrow_table)
+            spill['last_lsn'] = changes[-1][0]
+        logger.info(f"  📤 交易 {transaction['xid']} 已溢寫 {transaction['seq']:,} 筆變更")
+        transaction['changes'] = []
+
+    def close(self):
+        """刪除暫存目錄（未提交的交易會在下次啟動時重送）"""
+        if self.transaction:
+            for spill in self.transaction['spill'].values():
+                spill['writer'].close()
+        if self._spill_dir:
+            shutil.rmtree(self._spill_dir, ignore_errors=True)
+
+    @property
+    def in_transaction(self):
+        return self.transaction is not None
+
+    def should_flush(self, flush_rows, flush_seconds):
+        if self.in_transaction:
+            return False
+        if self.spilled:
+            return True
+        return self.rows >= flush_rows or (self.rows and time.monotonic() - self.last_flush >= flush_seconds)
+
+    # --------------------------------------------
+    # 寫出
+    # --------------------------------------------
+    def _cast(self, table, column, value, pg_type):
+        if value is None or value is UNCHANGED or pg_type in JSON_TYPES:
+            return None if value is UNCHANGED else value
+        caster = psycopg2.extensions.string_types.get(self.column_types[table].get(column))
+        return caster(value, self.cast_cursor) if caster else value
+
+    def to_table(self, table, changes):
+        """將一個資料表的變更轉為 Arrow Table（變更欄位在前）"""
+        schema = get_table_schema(self.conn, table)
+        if any(set(values) - set(schema.column_names) for *_, values in changes):
+            # 擷取期間新增了欄位
+            schema = get_table_schema(self.conn, table, refresh=True)
+
+        rows = [tuple(self._cast(table, c.name, values.get(c.name), c.pg_type) for c in schema.columns)
+                for *_, values in changes]
+        data = schema.rows_to_table(rows)
+        meta = pa.Table.from_arrays([
+            pa.array([c[0] for c in changes], pa.int64()),
+            pa.array([c[1] for c in changes], pa.int64()),
+            pa.array([c[2] for c in changes], pa.int32()),
+            pa.array([c[3] for c in changes], pa.int64()).cast(pa.timestamp('us', tz='UTC')),
+            pa.array([c[4] for c in changes], pa.int64()),
+            pa.array([OPS[c[5]] for c in changes], pa.string()),
+            pa.array([[k for k, v in c[6].items() if v is UNCHANGED] or None for c in changes],
+                     pa.list_(pa.string())),
+        ], schema=CHANGE_SCHEMA)
+        for field, column in zip(data.schema, data.columns):
+            meta = meta.append_column(field, column)
+        return meta
+
+    def _store(self, local_path, blob_path):
+        if self.output_dir:
+            dest = os.path.join(self.output_dir, blob_path)
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            os.replace(local_path, dest)
+            dir_fd = os.open(os.path.dirname(dest), os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+            return
+        if self._bucket is None:
+            self._bucket = storage.Client().bucket(self.bucket_name)
+        self._bucket.blob(blob_path).upload_from_filename(local_path)
+        os.remove(local_path)
+
+    def _publish(self, table, local_path, first_lsn, last_lsn, rows):
+        blob_path = f"{self.prefix}{table}/{table}_{first_lsn:016X}_{last_lsn:016X}.parquet"
+        with open(local_path, 'rb') as f:
+            os.fsync(f.fileno())
+        self._store(local_path, blob_path)
+        logger.info(f"  💾 {table}：{rows:,} 筆變更 → {blob_path}")
+
+    def _write_spilled(self, table, spill_path, first_lsn, last_lsn, commit_lsn, commit_ts):
+        """逐 row group 讀回暫存檔、補上 _commit_lsn / _commit_ts 後寫出（不整批讀入記憶體）"""
+        local_path = f"/tmp/cdc_{table}_{first_lsn:016X}.parquet"
+        spill_file = pq.ParquetFile(spill_path)
+        schema = spill_file.schema_arrow
+        lsn_index, ts_index = schema.get_field_index('_commit_lsn'), schema.get_field_index('_commit_ts')
+        with pq.ParquetWriter(local_path, schema, compression='zstd') as writer:
+            for batch in spill_file.iter_batches():
+                chunk = pa.Table.from_batches([batch], schema=schema)
+                chunk = chunk.set_column(lsn_index, schema.field(lsn_index),
+                                         pa.array([commit_lsn] * chunk.num_rows, pa.int64()))
+                chunk = chunk.set_column(ts_index, schema.field(ts_index),
+                                         pa.array([commit_ts] * chunk.num_rows, pa.int64())
+                                         .cast(pa.timestamp('us', tz='UTC')))
+                writer.write_table(chunk)
+        os.remove(spill_path)
+        self._publish(table, local_path, first_lsn, last_lsn, spill_file.metadata.num_rows)
+
+    def flush(self):
+        """寫出所有緩衝與溢寫的變更（依提交順序），回傳可回報給 PostgreSQL 的 flush LSN"""
+        for table, changes in self.tables.items():
+            first_lsn, last_lsn = changes[0][0], changes[-1][0]
+            local_path = f"/tmp/cdc_{table}_{first_lsn:016X}.parquet"
+            pq.write_table(self.to_table(table, changes), local_path, compression='zstd')
+            self._publish(table, local_path, first_lsn, last_lsn, len(changes))
+
+        for spilled in self.spilled:
+            self._write_spilled(*spilled)
+
+        self.tables = {}
+        self.spilled = []
+        self.rows = 0
+        self.last_flush = time.monotonic()
+        return self.last_commit_lsn
+
+# ============================================
+# 設定 publication / slot
+# ============================================
+def setup(replica_identity_full=False):
+    """建立（或更新）publication 與 replication slot"""
+    with pg_connection(autocommit=True) as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SHOW wal_level;")
+            wal_level = cursor.fetchone()[0]
+            if wal_level != 'logical':
+                raise RuntimeError(f"wal_level 為 {wal_level}，需設為 logical（見 compose.yaml）")
+
+            tables = sql.SQL(', ').join(sql.Identifier(t) for t in TABLES)
+            cursor.execute("SELECT 1 FROM pg_publication WHERE pubname = %s;", (PUBLICATION,))
+            if cursor.fetchone():
+                cursor.execute(sql.SQL("ALTER PUBLICATION {} SET TABLE {};").format(
+                    sql.Identifier(PUBLICATION), tables))
+            else:
+                cursor.execute(sql.SQL("CREATE PUBLICATION {} FOR TABLE {};").format(
+                    sql.Identifier(PUBLICATION), tables))
+            logger.info(f"✅ publication {PUBLICATION}：{', '.join(TABLES)}")
+
+            if replica_identity_full:
+                for table in TABLES:
+                    cursor.execute(sql.SQL("ALTER TABLE {} REPLICA IDENTITY FULL;").format(sql.Identifier(table)))
+                logger.info("✅ REPLICA IDENTITY FULL（UPDATE / DELETE 帶完整舊值）")
+
+            cursor.execute("SELECT 1 FROM pg_replication_slots WHERE slot_name = %s;", (SLOT_NAME,))
+            if cursor.fetchone():
+                logger.info(f"✅ slot {SLOT_NAME} 已存在")
+            else:
+                cursor.execute("SELECT lsn FROM pg_create_logical_replication_slot(%s, 'pgoutput');", (SLOT_NAME,))
+                logger.info(f"✅ 建立 slot {SLOT_NAME}（起始 LSN {cursor.fetchone()[0]}）")
+
+
+def drop_slot():
+    with pg_connection(autocommit=True) as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT pg_drop_replication_slot(slot_name) FROM pg_replication_slots "
+                           "WHERE slot_name = %s;", (SLOT_NAME,))
+            logger.info(f"🗑️  已刪除 slot {SLOT_NAME}" if cursor.rowcount else f"slot {SLOT_NAME} 不存在")
+
+# ============================================
+# 擷取迴圈
+# ============================================
+def capture(output_dir=None, bucket_name=GCS_BUCKET, prefix=CDC_PREFIX,
+            flush_rows=FLUSH_ROWS, flush_seconds=FLUSH_SECONDS, idle_exit=None):
+    """持續讀取 replication slot，直到收到 SIGINT / SIGTERM 或閒置超過 idle_exit 秒"""
+    stopping = []
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stopping.append(True))
+
+    decoder = PgOutputDecoder()
+    repl_conn = pg_replication_connection()
+    buffer = None
+    total = 0
+    try:
+        # autocommit：讀取 schema 後不留下閒置交易
+        with pg_connection(autocommit=True) as conn:
+            buffer = ChangeBuffer(conn, output_dir, bucket_name, prefix, spill_rows=flush_rows)
+            repl_cursor = repl_conn.cursor()
+            repl_cursor.start_replication(
+                slot_name=SLOT_NAME, decode=False, status_interval=STATUS_INTERVAL,
+                options={'proto_version': '1', 'publication_names': PUBLICATION},
+            )
+            logger.info(f"📡 開始擷取 slot {SLOT_NAME}")
+
+            last_message = time.monotonic()
+            acked_lsn = 0
+            while not stopping:
+                message = repl_cursor.read_message()
+                if message is not None:
+                    buffer.handle(decoder.decode(message.payload), message.data_start)
+                    last_message = time.monotonic()
+                else:
+                    if not buffer.in_transaction:
+                        if buffer.rows == 0 and buffer.last_commit_lsn > acked_lsn:
+                            # 沒有待寫出的變更（例如只有不在 publication 內的交易），直接推進 slot
+                            acked_lsn = buffer.last_commit_lsn
+                            repl_cursor.send_feedback(flush_lsn=acked_lsn)
+                        if idle_exit and time.monotonic() - last_message >= idle_exit:
+                            break
+                    # 交易進行中也要等待下一則訊息，否則 read_message 會空轉
+                    select.select([repl_cursor], [], [], 1.0)
+
+                if buffer.should_flush(flush_rows, flush_seconds):
+                    total += buffer.rows
+                    acked_lsn = buffer.flush()
+                    repl_cursor.send_feedback(flush_lsn=acked_lsn)
+
+            # 結束前寫出已提交的變更；未完成的交易會在下次啟動時重送
+            if buffer.rows:
+                total += buffer.rows
+                repl_cursor.send_feedback(flush_lsn=buffer.flush())
+    finally:
+        if buffer is not None:
+            buffer.close()
+        repl_conn.close()
+
+    return total
+
+# ============================================
+# 主程式
+# ============================================
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='PostgreSQL CDC：邏輯複寫 → 變更 Parquet')
+    parser.add_argument('--setup', action='store_true', help='建立 publication 與 replication slot 後結束')
+    parser.add_argument('--replica-identity-full', action='store_true', help='搭配 --setup：DELETE 帶完整舊值')
+    parser.add_argument('--drop-slot', action='store_true', help='刪除 replication slot 後結束')
+    parser.add_argument('--bucket', default=GCS_BUCKET)
+    parser.add_argument('--prefix', default=CDC_PREFIX)
+    parser.add_argument('--local-dir', default=None, help='寫到本地目錄而非 GCS')
+    parser.add_argument('--flush-rows', type=int, default=FLUSH_ROWS)
+    parser.add_argument('--flush-seconds', type=float, default=FLUSH_SECONDS)
+    parser.add_argument('--idle-exit', type=float, help='超過此秒數沒有新訊息即結束')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    logger.info("=" * 60)
+    logger.info("PostgreSQL CDC（pgoutput）")
+    logger.info("=" * 60)
+
+    try:
+        if args.setup:
+            setup(args.replica_identity_full)
+        elif args.drop_slot:
+            drop_slot()
+        else:
+            total = capture(args.local_dir, args.bucket, args.prefix,
+                            args.flush_rows, args.flush_seconds, args.idle_exit)
+            logger.info(f"✅ 擷取結束：共寫出 {total:,} 筆變更")
+    except Exception as e:
+        logger.error(f"❌ CDC 失敗：{e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+    finally:
+        close_all()
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
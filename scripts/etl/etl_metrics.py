@@ -0,0 +1,174 @@
+"""
+ETL 指標收集
+逐表記錄各階段 (fingerprint / fetch / convert / encode / upload) 耗時、吞吐量、峰值記憶體與壓縮比，
+輸出為結構化 JSON 日誌，並可選擇寫入 Prometheus textfile 或推送到 Pushgateway
+
+各抽取程式（postgres / mongodb / async_pipeline）以 extractor 區分：
+- 每個樣本帶 extractor 標籤
+- textfile 各自一個檔案（learnhub_etl.prom → learnhub_etl_postgres.prom）
+- Pushgateway 各自一個 group（/metrics/job/<job>/extractor/<名稱>）
+先後執行的抽取程式因此不會覆蓋彼此的指標。
+"""
+
+import os
+import json
+import time
+import logging
+import resource
+import sys
+import urllib.request
+from contextlib import contextmanager, nullcontext
+
+logger = logging.getLogger('learnhub.etl.metrics')
+
+# ============================================
+# 配置（皆為選用，未設定則只輸出 JSON 日誌）
+# ============================================
+# node_exporter textfile collector 目錄下的檔案，例如 ./logs/metrics/learnhub_etl.prom
+# （實際檔名加上 extractor，見 textfile_path）
+METRICS_TEXTFILE = os.environ.get('ETL_METRICS_TEXTFILE')
+# Pushgateway 位址，例如 http://localhost:9091（compose 的 metrics profile）
+PUSHGATEWAY_URL = os.environ.get('ETL_PUSHGATEWAY_URL')
+PUSHGATEWAY_JOB = os.environ.get('ETL_PUSHGATEWAY_JOB', 'learnhub_etl')
+
+STAGES = ('fingerprint', 'fetch', 'convert', 'encode', 'upload')
+
+
+def peak_rss_bytes():
+    """目前行程的峰值常駐記憶體 (RSS)；Linux 以 KB 回報，macOS 以 bytes 回報"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class TableMetrics:
+    """單一資料表的 ETL 指標；同名階段可多次進入（分批處理時累加）"""
+
+    def __init__(self, table):
+        self.table = table
+        self.stages = {}
+        self.rows = 0
+        self.raw_bytes = 0
+        self.encoded_bytes = 0
+        self.started_at = time.time()
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage(name, time.perf_counter() - started)
+
+    def add_stage(self, name, seconds):
+        """累加在其他執行緒 / 行程量測到的階段耗時"""
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def as_dict(self):
+        total = sum(self.stages.values())
+        encode = self.stages.get('encode', 0.0)
+        upload = self.stages.get('upload', 0.0)
+        return {
+            'table': self.table,
+            'rows': self.rows,
+            'raw_bytes': self.raw_bytes,
+            'encoded_bytes': self.encoded_bytes,
+            'stage_seconds': {k: round(v, 4) for k, v in self.stages.items()},
+            'total_seconds': round(total, 4),
+            'rows_per_sec': round(self.rows / total, 1) if total else None,
+            'encode_bytes_per_sec': round(self.raw_bytes / encode, 1) if encode else None,
+            'upload_bytes_per_sec': round(self.encoded_bytes / upload, 1) if upload else None,
+            'compression_ratio': round(self.raw_bytes / self.encoded_bytes, 3) if self.encoded_bytes else None,
+            'peak_rss_bytes': peak_rss_bytes(),
+        }
+
+
+def timed(metrics, name):
+    """metrics 為 None 時不計時（讓函式在沒有指標收集時照常運作）"""
+    return metrics.stage(name) if metrics is not None else nullcontext()
+
+# ============================================
+# 輸出
+# ============================================
+def log_metrics(metrics):
+    """以單行 JSON 輸出指標，方便日誌系統解析"""
+    logger.info(json.dumps({'event': 'etl_table_metrics', **metrics.as_dict()}, ensure_ascii=False))
+
+
+def render_prometheus(metrics_list, extractor=None):
+    """轉為 Prometheus text exposition format（extractor 加到每個樣本的標籤）"""
+    snapshots = [m.as_dict() for m in metrics_list]
+    lines = []
+
+    def family(name, help_text, metric_type, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for labels, value in samples:
+            if value is None:
+                continue
+            if extractor:
+                labels = {'extractor': extractor, **labels}
+            label_str = ','.join(f'{k}="{v}"' for k, v in labels.items())
+            lines.append(f"{name}{{{label_str}}} {value}" if label_str else f"{name} {value}")
+
+    family('learnhub_etl_stage_duration_seconds', 'ETL stage duration per table', 'gauge',
+           [({'table': s['table'], 'stage': stage}, s['stage_seconds'][stage])
+            for s in snapshots for stage in STAGES if stage in s['stage_seconds']])
+    family('learnhub_etl_rows', 'Rows extracted per table', 'gauge',
+           [({'table': s['table']}, s['rows']) for s in snapshots])
+    family('learnhub_etl_rows_per_second', 'End-to-end rows per second per table', 'gauge',
+           [({'table': s['table']}, s['rows_per_sec']) for s in snapshots])
+    family('learnhub_etl_encoded_bytes', 'Parquet bytes written per table', 'gauge',
+           [({'table': s['table']}, s['encoded_bytes']) for s in snapshots])
+    family('learnhub_etl_upload_bytes_per_second', 'Upload throughput per table', 'gauge',
+           [({'table': s['table']}, s['upload_bytes_per_sec']) for s in snapshots])
+    family('learnhub_etl_compression_ratio', 'In-memory bytes / Parquet bytes', 'gauge',
+           [({'table': s['table']}, s['compression_ratio']) for s in snapshots])
+    family('learnhub_etl_peak_rss_bytes', 'Peak resident memory after the table finished', 'gauge',
+           [({'table': s['table']}, s['peak_rss_bytes']) for s in snapshots])
+    family('learnhub_etl_last_run_timestamp_seconds', 'Unix time the run finished', 'gauge',
+           [({}, int(time.time()))])
+
+    return '\n'.join(lines) + '\n'
+
+
+def textfile_path(path, extractor):
+    """每個抽取程式一個 textfile：learnhub_etl.prom → learnhub_etl_<extractor>.prom"""
+    root, ext = os.path.splitext(path)
+    return f"{root}_{extractor}{ext}"
+
+
+def write_prometheus_textfile(metrics_list, path, extractor=None):
+    """原子寫入 textfile（先寫暫存檔再改名，避免 collector 讀到一半的檔案）"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(render_prometheus(metrics_list, extractor))
+    os.replace(tmp_path, path)
+    logger.info(f"📈 指標已寫入：{path}")
+
+
+def push_to_gateway(metrics_list, url, extractor, job=PUSHGATEWAY_JOB):
+    """以 PUT 推送到 Pushgateway（只取代同一 job + extractor group 的舊指標）"""
+    request = urllib.request.Request(
+        f"{url.rstrip('/')}/metrics/job/{job}/extractor/{extractor}",
+        data=render_prometheus(metrics_list, extractor).encode('utf-8'),
+        method='PUT',
+        headers={'Content-Type': 'text/plain; version=0.0.4'}
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        response.read()
+    logger.info(f"📈 指標已推送：{url} (job={job}, extractor={extractor})")
+
+
+def export_metrics(metrics_list, extractor):
+    """
+    依環境變數輸出 textfile / Pushgateway；失敗只記錄警告，不影響 ETL 結果
+    extractor 為抽取程式名稱（postgres / mongodb / async_pipeline），各自輸出到不同的 textfile 與 group
+    """
+    try:
+        if METRICS_TEXTFILE:
+            write_prometheus_textfile(metrics_list, textfile_path(METRICS_TEXTFILE, extractor), extractor)
+        if PUSHGATEWAY_URL:
+            push_to_gateway(metrics_list, PUSHGATEWAY_URL, extractor)
+    except Exception as e:
+        logger.warning(f"⚠️  指標輸出失敗：{e}")
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+ETL Pipeline: MongoDB → GCS
+從 MongoDB 抽取行為日誌、評論與工單並上傳到 Google Cloud Storage (Parquet 格式)
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+import itertools
+from datetime import datetime
+from pathlib import Path
+
+import pyarrow.parquet as pq
+from google.cloud import storage
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from common.db import get_mongo_db, close_all
+from common.event_layout import EVENT_LAYOUTS, find_events
+# 要抽取的 Collections 與欄位對照（archive_user_events、async_pipeline 也由此匯入）
+from common.document_schema import COLLECTIONS, collection_schema, documents_to_table
+from etl_metrics import TableMetrics, timed, log_metrics, export_metrics
+
+# 設定日誌
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# ============================================
+# 配置（資料庫連線設定見 scripts/common/db.py）
+# ============================================
+GCS_BUCKET = 'learnhub-raw-data-2025-0112'
+GCS_PREFIX = 'raw/'
+
+# 每次從 cursor 取出並寫入一個 row group 的文件數
+BATCH_SIZE = 100000
+
+# 設定 Service Account 金鑰路徑（Airflow 容器內由環境變數覆寫）
+os.environ.setdefault('GOOGLE_APPLICATION_CREDENTIALS', './config/gcp/service-account-key.json')
+
+# ============================================
+# 查詢
+# ============================================
+def collection_projection(collection_name):
+    """只取出設定中用到的頂層欄位"""
+    projection = {path.split('.')[0]: 1 for path, _ in COLLECTIONS[collection_name]}
+    projection['_id'] = 0
+    return projection
+
+
+def find_documents(db, collection_name, events_layout='regular'):
+    """
+    回傳 collection 的 cursor（只取設定中的欄位）
+    user_events 依 events_layout 讀取對應版面，輸出欄位相同
+    """
+    if collection_name == 'user_events':
+        return find_events(db[EVENT_LAYOUTS[events_layout]], events_layout,
+                           collection_projection(collection_name))
+    return db[collection_name].find({}, collection_projection(collection_name), batch_size=10000)
+
+# ============================================
+# 抽取 + 上傳
+# ============================================
+def extract_collection(db, collection_name, local_path, metrics=None, events_layout='regular'):
+    """分批讀取 collection 並寫入本地 Parquet，回傳筆數（讀取/轉換/編碼分批累計耗時）"""
+    logger.info(f"📥 抽取 collection：{collection_name}")
+
+    cursor = find_documents(db, collection_name, events_layout)
+
+    def write_batch(writer, batch):
+        with timed(metrics, 'convert'):
+            table = documents_to_table(batch, collection_name)
+        with timed(metrics, 'encode'):
+            writer.write_table(table)
+        if metrics is not None:
+            metrics.raw_bytes += table.nbytes
+        return len(batch)
+
+    rows = 0
+    with pq.ParquetWriter(local_path, collection_schema(collection_name), compression='snappy') as writer:
+        while True:
+            with timed(metrics, 'fetch'):
+                batch = list(itertools.islice(cursor, BATCH_SIZE))
+            if not batch:
+                break
+            rows += write_batch(writer, batch)
+
+    if metrics is not None:
+        metrics.rows = rows
+        metrics.encoded_bytes = os.path.getsize(local_path)
+
+    logger.info(f"  ✅ 抽取完成：{rows:,} 筆記錄")
+    return rows
+
+
+def upload_file_to_gcs(local_path, collection_name, bucket_name, prefix, metrics=None):
+    """上傳本地 Parquet 檔案到 GCS"""
+    logger.info(f"☁️  上傳到 GCS：{collection_name}")
+
+    client = storage.Client()
+    bucket = client.bucket(bucket_name)
+    blob_path = f"{prefix}{collection_name}/{os.path.basename(local_path)}"
+    blob = bucket.blob(blob_path)
+    with timed(metrics, 'upload'):
+        blob.upload_from_filename(local_path)
+
+    logger.info(f"  ✅ 上傳完成：gs://{bucket_name}/{blob_path}")
+    logger.info(f"  📊 檔案大小：{blob.size / 1024 / 1024:.2f} MB")
+
+    return blob_path, blob.size
+
+
+def process_collection(db, collection_name, bucket_name=GCS_BUCKET, prefix=GCS_PREFIX, metrics=None,
+                       events_layout='regular'):
+    """抽取並上傳單一 collection，回傳筆數、檔案大小、耗時與各階段指標（供 Airflow XCom 使用）"""
+    started = time.monotonic()
+    metrics = metrics or TableMetrics(collection_name)
+
+    date_str = datetime.now().strftime('%Y%m%d')
+    local_path = f"/tmp/{collection_name}_{date_str}.parquet"
+    try:
+        rows = extract_collection(db, collection_name, local_path, metrics, events_layout)
+        blob_path, size_bytes = upload_file_to_gcs(local_path, collection_name, bucket_name, prefix, metrics)
+    finally:
+        if os.path.exists(local_path):
+            os.remove(local_path)
+
+    log_metrics(metrics)
+
+    return {
+        'table': collection_name,
+        'rows': rows,
+        'bytes': size_bytes,
+        'duration_seconds': round(time.monotonic() - started, 3),
+        'status': 'success',
+        'path': blob_path,
+        'metrics': metrics.as_dict()
+    }
+
+# ============================================
+# 主程式
+# ============================================
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='ETL Pipeline: MongoDB → GCS')
+    parser.add_argument('--events-layout', choices=list(EVENT_LAYOUTS), default='regular',
+                        help='user_events 的儲存版面（輸出欄位相同）')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    logger.info("=" * 60)
+    logger.info("ETL Pipeline: MongoDB → GCS")
+    logger.info("=" * 60)
+
+    try:
+        logger.info("\n🔌 連接 MongoDB...")
+        db = get_mongo_db()
+        logger.info("✅ MongoDB 連線成功")
+
+        results = []
+        collection_metrics = []
+        for name in COLLECTIONS:
+            try:
+                metrics = TableMetrics(name)
+                collection_metrics.append(metrics)
+                results.append(process_collection(db, name, metrics=metrics,
+                                                  events_layout=args.events_layout))
+                logger.info("")
+            except Exception as e:
+                logger.error(f"❌ 處理 {name} 時發生錯誤：{e}")
+                results.append({'table': name, 'rows': 0, 'status': 'failed', 'error': str(e)})
+
+        close_all()
+
+        export_metrics(collection_metrics, 'mongodb')
+
+        logger.info("=" * 60)
+        logger.info("ETL 完成總結")
+        logger.info("=" * 60)
+        for r in results:
+            status_icon = "✅" if r['status'] == 'success' else "❌"
+            logger.info(f"  {status_icon} {r['table']}: {r['rows']:,} 筆")
+
+        if any(r['status'] != 'success' for r in results):
+            return 1
+
+    except Exception as e:
+        logger.error(f"❌ ETL 失敗：{e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+    return 0
+
+if __name__ == '__main__':
+    exit(main())
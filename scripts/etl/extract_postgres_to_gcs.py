@@ -5,13 +5,24 @@ ETL Pipeline: PostgreSQL → GCS
 """
 
 import os
-import psycopg2
-import pandas as pd
+import sys
+import json
+import time
+import hashlib
+import argparse
 from google.cloud import storage
 from datetime import datetime
 import logging
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from common.db import acquire_pg_connection, release_pg_connection, close_all
+from common.checkpoint import CheckpointStore
+from etl_metrics import TableMetrics, timed, log_metrics, export_metrics
+from schema_registry import get_table_schema, register_json_as_text
+from parquet_layout import write_parquet, log_layout_report
+
 # 設定日誌
 logging.basicConfig(
     level=logging.INFO,
@@ -20,21 +31,13 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # ============================================
-# 配置
+# 配置（資料庫連線設定見 scripts/common/db.py）
 # ============================================
-PG_CONFIG = {
-    'host': 'localhost',
-    'port': 5433,
-    'database': 'learnhub_prod',
-    'user': 'admin',
-    'password': 'admin123'
-}
-
 GCS_BUCKET = 'learnhub-raw-data-2025-0112'  
 GCS_PREFIX = 'raw/'
 
-# 設定 Service Account 金鑰路徑
-os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = './config/gcp/service-account-key.json'
+# 設定 Service Account 金鑰路徑（Airflow 容器內由環境變數覆寫）
+os.environ.setdefault('GOOGLE_APPLICATION_CREDENTIALS', './config/gcp/service-account-key.json')
 
 # ============================================
 # 要抽取的資料表
@@ -50,24 +53,113 @@ TABLES = [
     'course_enrollments'
 ]
 
+# ============================================
+# 變更偵測
+# 指紋 = 欄位定義 + 筆數 + MAX(updated_at) + pg_stat_user_tables 的累計寫入次數，
+# 與上次的 manifest 相同時不重新抽取，只寫一個指向上次檔案的 pointer
+# 只靠筆數與 MAX(updated_at) 會漏掉「刪一筆再插一筆」、停用觸發器的 UPDATE、
+# 以及 updated_at 寫入較舊時間的變更；寫入次數（n_tup_ins + n_tup_upd + n_tup_del）涵蓋這些情況
+# ============================================
+MANIFEST_NAME = '_manifest.json'
+
+def table_fingerprint(conn, table_name):
+    """
+    計算資料表的變更指紋，回傳 (sha256, 指紋來源)
+    在抽取前計算：之後才寫入的變更會讓下次的指紋不同，因此只會多抽一次，不會漏抽
+    統計重設（pg_stat_reset、當機復原）或 rollback 的交易只會讓指紋改變、多抽一次；
+    統計數據在交易結束後最多延遲約一秒才更新，剛寫入就抽取、或懷疑漏抽時請加 --force
+    """
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT column_name, data_type
+            FROM information_schema.columns
+            WHERE table_schema = 'public' AND table_name = %s
+            ORDER BY ordinal_position;
+        """, (table_name,))
+        columns = [list(c) for c in cursor.fetchall()]
+        cursor.execute(f"SELECT COUNT(*), MAX(updated_at) FROM {table_name};")
+        row_count, max_updated_at = cursor.fetchone()
+        cursor.execute("""
+            SELECT n_tup_ins + n_tup_upd + n_tup_del
+            FROM pg_stat_user_tables
+            WHERE schemaname = 'public' AND relname = %s;
+        """, (table_name,))
+        writes = cursor.fetchone()
+    
+    inputs = {
+        'columns': columns,
+        'rows': row_count,
+        'max_updated_at': max_updated_at.isoformat() if max_updated_at else None,
+        'tuple_writes': writes[0] if writes else None
+    }
+    digest = hashlib.sha256(json.dumps(inputs, sort_keys=True).encode('utf-8')).hexdigest()
+    return digest, inputs
+
+def load_manifest(bucket, table_name, prefix):
+    """讀取資料表上次抽取的 manifest（不存在時回傳 None）"""
+    blob = bucket.blob(f"{prefix}{table_name}/{MANIFEST_NAME}")
+    if not blob.exists():
+        return None
+    return json.loads(blob.download_as_text())
+
+def save_manifest(bucket, table_name, prefix, manifest):
+    """每張表一個 manifest，Airflow 平行任務之間不會互相覆寫"""
+    blob = bucket.blob(f"{prefix}{table_name}/{MANIFEST_NAME}")
+    blob.upload_from_string(json.dumps(manifest, ensure_ascii=False, indent=2),
+                            content_type='application/json')
+
+def write_pointer(bucket, table_name, prefix, manifest):
+    """寫入 <table>_<日期>.pointer.json 指向上次的 Parquet 檔案，回傳 pointer 路徑"""
+    date_str = datetime.now().strftime('%Y%m%d')
+    blob_path = f"{prefix}{table_name}/{table_name}_{date_str}.pointer.json"
+    pointer = {
+        'table': table_name,
+        'target': f"gs://{bucket.name}/{manifest['object']}",
+        'fingerprint': manifest['fingerprint'],
+        'rows': manifest['rows'],
+        'created_at': datetime.now().isoformat(timespec='seconds')
+    }
+    bucket.blob(blob_path).upload_from_string(json.dumps(pointer, ensure_ascii=False, indent=2),
+                                              content_type='application/json')
+    return blob_path
+
 # ============================================
 # 抽取數據
 # ============================================
-def extract_table(conn, table_name):
-    """從 PostgreSQL 抽取單一資料表"""
+def extract_table(conn, table_name, metrics=None):
+    """
+    從 PostgreSQL 抽取單一資料表為 Arrow Table（查詢與 Arrow 建構分開計時）
+    欄位型別由 schema_registry 決定（NUMERIC → decimal128、列舉 → dictionary 等）
+    """
     logger.info(f"📥 抽取資料表：{table_name}")
     
-    query = f"SELECT * FROM {table_name};"
-    df = pd.read_sql(query, conn)
+    schema = get_table_schema(conn, table_name)
+    query = f"SELECT {', '.join(schema.column_names)} FROM {table_name};"
+    with timed(metrics, 'fetch'):
+        with conn.cursor() as cursor:
+            register_json_as_text(cursor)
+            cursor.execute(query)
+            rows = cursor.fetchall()
+    
+    with timed(metrics, 'convert'):
+        table = schema.rows_to_table(rows)
+    del rows
+    
+    if metrics is not None:
+        metrics.rows = table.num_rows
+        metrics.raw_bytes = table.nbytes
     
-    logger.info(f"  ✅ 抽取完成：{len(df):,} 筆記錄")
-    return df
+    logger.info(f"  ✅ 抽取完成：{table.num_rows:,} 筆記錄")
+    return table
 
 # ============================================
 # 上傳到 GCS
 # ============================================
-def upload_to_gcs(df, table_name, bucket_name, prefix):
-    """上傳 DataFrame 到 GCS（Parquet 格式）"""
+def upload_to_gcs(table, table_name, bucket_name, prefix, metrics=None):
+    """
+    上傳 Arrow Table 到 GCS（Parquet 格式），回傳 (blob 路徑, 檔案大小, 版面報告)
+    低基數欄位轉為 dictionary、逐欄選擇 zstd / snappy（見 parquet_layout）
+    """
     logger.info(f"☁️  上傳到 GCS：{table_name}")
     
     # 生成檔案名稱（含日期）
@@ -76,7 +168,11 @@ def upload_to_gcs(df, table_name, bucket_name, prefix):
     
     # 暫存到本地
     local_path = f"/tmp/{filename}"
-    df.to_parquet(local_path, index=False, compression='snappy', engine='pyarrow', coerce_timestamps='us', allow_truncated_timestamps=True)
+    with timed(metrics, 'encode'):
+        layout = write_parquet(table, local_path)
+    if metrics is not None:
+        metrics.encoded_bytes = os.path.getsize(local_path)
+    log_layout_report(table_name, layout)
     
     # 上傳到 GCS
     client = storage.Client()
@@ -84,7 +180,8 @@ def upload_to_gcs(df, table_name, bucket_name, prefix):
     blob_path = f"{prefix}{table_name}/{filename}"
     blob = bucket.blob(blob_path)
     
-    blob.upload_from_filename(local_path)
+    with timed(metrics, 'upload'):
+        blob.upload_from_filename(local_path)
     
     # 清理暫存檔案
     os.remove(local_path)
@@ -92,12 +189,79 @@ def upload_to_gcs(df, table_name, bucket_name, prefix):
     logger.info(f"  ✅ 上傳完成：gs://{bucket_name}/{blob_path}")
     logger.info(f"  📊 檔案大小：{blob.size / 1024 / 1024:.2f} MB")
     
-    return blob_path
+    return blob_path, blob.size, layout
+
+# ============================================
+# 單一資料表 ETL
+# ============================================
+def process_table(conn, table_name, bucket_name=GCS_BUCKET, prefix=GCS_PREFIX, metrics=None, force=False):
+    """
+    抽取並上傳單一資料表，回傳筆數、檔案大小、耗時與各階段指標（供 Airflow XCom 使用）
+    指紋與上次相同且檔案仍存在時略過抽取（status='unchanged'），force=True 時一律重新抽取
+    """
+    started = time.monotonic()
+    metrics = metrics or TableMetrics(table_name)
+    bucket = storage.Client().bucket(bucket_name)
+    
+    with timed(metrics, 'fingerprint'):
+        fingerprint, inputs = table_fingerprint(conn, table_name)
+        manifest = None if force else load_manifest(bucket, table_name, prefix)
+    
+    if manifest and manifest['fingerprint'] == fingerprint and bucket.blob(manifest['object']).exists():
+        pointer_path = None
+        if not os.path.basename(manifest['object']).startswith(f"{table_name}_{datetime.now():%Y%m%d}"):
+            pointer_path = write_pointer(bucket, table_name, prefix, manifest)
+        logger.info(f"⏭️  {table_name} 未變更（{inputs['rows']:,} 筆），沿用 gs://{bucket_name}/{manifest['object']}")
+        log_metrics(metrics)
+        return {
+            'table': table_name,
+            'rows': manifest['rows'],
+            'bytes': manifest['bytes'],
+            'duration_seconds': round(time.monotonic() - started, 3),
+            'status': 'unchanged',
+            'path': manifest['object'],
+            'pointer': pointer_path,
+            'metrics': metrics.as_dict()
+        }
+    
+    table = extract_table(conn, table_name, metrics)
+    blob_path, size_bytes, layout = upload_to_gcs(table, table_name, bucket_name, prefix, metrics)
+    
+    save_manifest(bucket, table_name, prefix, {
+        'table': table_name,
+        'fingerprint': fingerprint,
+        'inputs': inputs,
+        'object': blob_path,
+        'rows': metrics.rows,
+        'bytes': size_bytes,
+        'extracted_at': datetime.now().isoformat(timespec='seconds')
+    })
+    
+    log_metrics(metrics)
+    
+    return {
+        'table': table_name,
+        'rows': metrics.rows,
+        'bytes': size_bytes,
+        'duration_seconds': round(time.monotonic() - started, 3),
+        'status': 'success',
+        'path': blob_path,
+        'metrics': metrics.as_dict(),
+        'layout': {k: layout[k] for k in ('dictionary_columns', 'codecs', 'estimated_saving_pct')}
+    }
 
 # ============================================
 # 主程式
 # ============================================
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='ETL Pipeline: PostgreSQL → GCS')
+    parser.add_argument('--force', action='store_true', help='忽略變更指紋，所有資料表都重新抽取')
+    parser.add_argument('--resume', action='store_true', help='接續當天中斷的執行，略過已完成的資料表')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    
     logger.info("=" * 60)
     logger.info("ETL Pipeline: PostgreSQL → GCS")
     logger.info("=" * 60)
@@ -105,7 +269,7 @@ def main():
     try:
         # 連接 PostgreSQL
         logger.info("\n🔌 連接 PostgreSQL...")
-        conn = psycopg2.connect(**PG_CONFIG)
+        conn = acquire_pg_connection()
         logger.info("✅ PostgreSQL 連線成功")
         
         # 測試 GCS 連線
@@ -121,27 +285,35 @@ def main():
         logger.info("\n🚀 開始 ETL 流程...")
         logger.info(f"將抽取 {len(TABLES)} 個資料表\n")
         
+        # 檢查點以日期區分：同一天的輸出檔名相同，隔天重跑一律重新開始
+        checkpoint = CheckpointStore(f"extract_postgres_{datetime.now():%Y%m%d}", params={
+            'tables': TABLES, 'bucket': GCS_BUCKET, 'prefix': GCS_PREFIX, 'force': args.force
+        })
+        if checkpoint.start(resume=args.resume):
+            logger.info(f"⏯️  接續先前的執行：{len(checkpoint.state['completed'])} 個資料表已完成\n")
+        
         results = []
+        table_metrics = []
         
         for table in TABLES:
+            if checkpoint.is_done(table):
+                result = checkpoint.get(table)['result']
+                logger.info(f"⏭️  {table} 已於先前的執行完成：gs://{GCS_BUCKET}/{result['path']}")
+                results.append(dict(result, resumed=True))
+                continue
             try:
-                # 抽取
-                df = extract_table(conn, table)
-                
-                # 上傳
-                blob_path = upload_to_gcs(df, table, GCS_BUCKET, GCS_PREFIX)
-                
-                results.append({
-                    'table': table,
-                    'rows': len(df),
-                    'status': 'success',
-                    'path': blob_path
-                })
+                # 抽取 + 上傳
+                metrics = TableMetrics(table)
+                table_metrics.append(metrics)
+                result = process_table(conn, table, metrics=metrics, force=args.force)
+                checkpoint.mark_done(table, result=result)
+                results.append(result)
                 
                 logger.info("")  # 空行分隔
                 
             except Exception as e:
                 logger.error(f"❌ 處理 {table} 時發生錯誤：{e}")
+                conn.rollback()  # 避免後續資料表卡在 aborted transaction
                 results.append({
                     'table': table,
                     'rows': 0,
@@ -149,27 +321,47 @@ def main():
                     'error': str(e)
                 })
         
-        # 關閉連線
-        conn.close()
+        # 歸還連線
+        release_pg_connection(conn)
+        close_all()
+        
+        if all(checkpoint.is_done(t) for t in TABLES):
+            checkpoint.finish()
+        
+        # 輸出 Prometheus 指標（依環境變數設定）
+        export_metrics(table_metrics, 'postgres')
         
         # 總結
         logger.info("=" * 60)
         logger.info("ETL 完成總結")
         logger.info("=" * 60)
         
-        success_count = sum(1 for r in results if r['status'] == 'success')
-        total_rows = sum(r['rows'] for r in results if r['status'] == 'success')
+        success_count = sum(1 for r in results if r['status'] in ('success', 'unchanged'))
+        unchanged_count = sum(1 for r in results if r['status'] == 'unchanged')
+        total_rows = sum(r['rows'] for r in results if r['status'] == 'success' and not r.get('resumed'))
         
-        logger.info(f"✅ 成功：{success_count}/{len(TABLES)} 個資料表")
-        logger.info(f"📊 總計：{total_rows:,} 筆記錄")
+        logger.info(f"✅ 成功：{success_count}/{len(TABLES)} 個資料表（其中 {unchanged_count} 個未變更、略過上傳）")
+        logger.info(f"📊 本次抽取：{total_rows:,} 筆記錄")
         
         if success_count < len(TABLES):
             logger.warning(f"⚠️  失敗：{len(TABLES) - success_count} 個資料表")
         
         logger.info("\n詳細結果：")
         for r in results:
-            status_icon = "✅" if r['status'] == 'success' else "❌"
-            logger.info(f"  {status_icon} {r['table']}: {r['rows']:,} 筆")
+            status_icon = {'success': "✅", 'unchanged': "⏭️ "}.get(r['status'], "❌")
+            note = "（先前的執行）" if r.get('resumed') else ""
+            logger.info(f"  {status_icon} {r['table']}: {r['rows']:,} 筆{note}")
+        
+        logger.info("\n各階段耗時（秒）：")
+        for m in table_metrics:
+            stages = ', '.join(f"{k} {v:.2f}" for k, v in m.stages.items())
+            logger.info(f"  {m.table}: {stages}")
+        
+        logger.info("\nParquet 版面（相對於全部 snappy、不轉 dictionary 的估計節省）：")
+        for r in results:
+            if 'layout' in r:
+                logger.info(f"  {r['table']}: {r['layout']['estimated_saving_pct']}%，"
+                            f"{r['bytes'] / 1024 / 1024:.2f} MB")
         
     except Exception as e:
         logger.error(f"❌ ETL 失敗：{e}")
@@ -0,0 +1,273 @@
+"""
+PostgreSQL 抽取的自適應並行控制（AIMD）
+抽取與線上交易共用 learnhub_prod；同時讀取的分片越多，ETL 越快，但也越可能拖慢應用程式。
+AimdController 定期量測資料庫負載，調整 AdaptiveLimiter 放行的並行讀取數：
+
+- 過載（任一條件成立）→ 乘法遞減：上限 × DECREASE_FACTOR（至少 1）
+  - canary 查詢（模擬線上的主鍵查詢）p95 超過 OLTP 延遲預算
+  - 應用程式連線中等待鎖（wait_event_type = 'Lock'）的數量超過上限
+  - 抽取本身每千筆的讀取時間超過該表基準（觀察到的最小值）的 ETL_SLOWDOWN 倍；
+    只比較至少 chunk_rows × MIN_CHUNK_FRACTION 筆的分片，主鍵稀疏或最後一個不滿的分片
+    固定成本占比高、每千筆時間不具代表性，不列入基準也不列入比較
+- 未過載且有分片在等待 → 加法遞增：上限 + 1（不超過 max_readers）
+
+起始上限為 1（與原本逐表循序抽取相同），負載允許時才逐步增加；
+調降時進行中的讀取不會中斷，只是不再放行新的分片。
+
+負載量測使用獨立連線（不佔用連線池），pg_stat_activity 以 application_name
+排除抽取本身的連線（common.db.pg_config 的 PG_APPLICATION_NAME）。
+
+用法（由 async_pipeline.py --adaptive 使用）：
+    limiter = AdaptiveLimiter(1)
+    controller = AimdController(limiter, PgLoadProbe(), maximum=4, budget_ms=50, chunk_rows=100000)
+    task = asyncio.create_task(controller.run())
+    async with limiter:
+        ...
+        controller.record_chunk(table, rows, seconds)
+"""
+
+import time
+import random
+import asyncio
+import logging
+import statistics
+
+import psycopg2
+
+from common.db import pg_config, PG_POOL_MAX
+
+logger = logging.getLogger(__name__)
+
+# ============================================
+# 配置
+# ============================================
+# canary 查詢 p95 的上限（毫秒）
+OLTP_BUDGET_MS = 50.0
+# 應用程式連線中允許等待鎖的數量
+MAX_LOCK_WAITS = 0
+# 抽取每千筆讀取時間相對於基準的容許倍數
+ETL_SLOWDOWN = 2.0
+# 筆數至少為 chunk_rows 的此比例的分片才用於基準與比較
+MIN_CHUNK_FRACTION = 0.5
+
+SAMPLE_INTERVAL = 2.0
+CANARY_SAMPLES = 5
+CANARY_QUERY = "SELECT user_id, email, last_login FROM users WHERE user_id = %s;"
+
+MIN_READERS = 1
+# 每個讀取需要一條連線池連線，上限不能超過連線池大小
+MAX_READERS = PG_POOL_MAX
+INCREASE_STEP = 1
+DECREASE_FACTOR = 0.5
+
+ACTIVITY_QUERY = """
+    SELECT
+        count(*) FILTER (WHERE wait_event_type = 'Lock'),
+        count(*) FILTER (WHERE state = 'active'),
+        coalesce(max(extract(epoch FROM now() - query_start) * 1000) FILTER (WHERE state = 'active'), 0)
+    FROM pg_stat_activity
+    WHERE datname = current_database()
+      AND backend_type = 'client backend'
+      AND pid <> pg_backend_pid()
+      AND application_name <> %s;
+"""
+
+# ============================================
+# 負載量測
+# ============================================
+class LoadSample:
+    """一次量測的結果；etl_slowdown 為本區間抽取每千筆耗時 / 基準（沒有讀取時為 None）"""
+
+    def __init__(self, canary_p95_ms, lock_waits, active_backends, longest_query_ms, etl_slowdown=None):
+        self.canary_p95_ms = canary_p95_ms
+        self.lock_waits = lock_waits
+        self.active_backends = active_backends
+        self.longest_query_ms = longest_query_ms
+        self.etl_slowdown = etl_slowdown
+
+    def as_dict(self):
+        return {
+            'canary_p95_ms': round(self.canary_p95_ms, 2),
+            'lock_waits': self.lock_waits,
+            'active_backends': self.active_backends,
+            'longest_query_ms': round(self.longest_query_ms, 1),
+            'etl_slowdown': round(self.etl_slowdown, 2) if self.etl_slowdown is not None else None,
+        }
+
+
+class PgLoadProbe:
+    """以獨立連線執行 canary 查詢並讀取 pg_stat_activity（在執行緒中呼叫）"""
+
+    def __init__(self, canary_query=CANARY_QUERY, canary_samples=CANARY_SAMPLES):
+        self.canary_query = canary_query
+        self.canary_samples = canary_samples
+        self.conn = None
+        self.max_user_id = 1
+
+    def open(self):
+        config = pg_config()
+        self.etl_application = config['application_name']
+        self.conn = psycopg2.connect(**config)
+        self.conn.autocommit = True
+        with self.conn.cursor() as cursor:
+            cursor.execute("SELECT max(user_id) FROM users;")
+            self.max_user_id = cursor.fetchone()[0] or 1
+
+    def sample(self):
+        timings = []
+        with self.conn.cursor() as cursor:
+            for _ in range(self.canary_samples):
+                started = time.perf_counter()
+                cursor.execute(self.canary_query, (random.randint(1, self.max_user_id),))
+                cursor.fetchall()
+                timings.append((time.perf_counter() - started) * 1000)
+            cursor.execute(ACTIVITY_QUERY, (self.etl_application,))
+            lock_waits, active, longest_ms = cursor.fetchone()
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        return LoadSample(p95, lock_waits, active, float(longest_ms))
+
+    def close(self):
+        if self.conn is not None and not self.conn.closed:
+            self.conn.close()
+
+# ============================================
+# 並行限制
+# ============================================
+class AdaptiveLimiter:
+    """上限可動態調整的 asyncio 並行限制（async with limiter: ...）"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_flight = 0
+        self.waiting = 0
+        self._condition = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self._condition:
+            self.waiting += 1
+            try:
+                await self._condition.wait_for(lambda: self.in_flight < self.limit)
+            finally:
+                self.waiting -= 1
+            self.in_flight += 1
+
+    async def __aexit__(self, *exc_info):
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    async def set_limit(self, limit):
+        async with self._condition:
+            self.limit = limit
+            self._condition.notify_all()
+
+    @property
+    def saturated(self):
+        """所有名額都在使用中且仍有讀取在等待"""
+        return self.in_flight >= self.limit and self.waiting > 0
+
+# ============================================
+# AIMD 控制
+# ============================================
+class AimdController:
+
+    def __init__(self, limiter, probe, minimum=MIN_READERS, maximum=MAX_READERS, budget_ms=OLTP_BUDGET_MS,
+                 max_lock_waits=MAX_LOCK_WAITS, slowdown=ETL_SLOWDOWN, interval=SAMPLE_INTERVAL,
+                 chunk_rows=None):
+        self.limiter = limiter
+        self.probe = probe
+        self.minimum = minimum
+        self.maximum = maximum
+        self.budget_ms = budget_ms
+        self.max_lock_waits = max_lock_waits
+        self.slowdown = slowdown
+        self.interval = interval
+        # None 表示不限制分片筆數（所有分片都列入）
+        self.min_chunk_rows = chunk_rows * MIN_CHUNK_FRACTION if chunk_rows else 0
+        self.baselines = {}
+        self.chunk_ratios = []
+        self.history = []
+        self.decreases = 0
+        self.started = time.monotonic()
+
+    def record_chunk(self, table_name, rows, seconds):
+        """記錄一個分片的讀取時間（event loop 執行緒中呼叫）；筆數不足 min_chunk_rows 的分片略過"""
+        if not rows or rows < self.min_chunk_rows:
+            return
+        ms_per_krows = seconds * 1000 / (rows / 1000)
+        baseline = self.baselines.get(table_name)
+        if baseline is None or ms_per_krows < baseline:
+            self.baselines[table_name] = ms_per_krows
+            baseline = ms_per_krows
+        self.chunk_ratios.append(ms_per_krows / baseline if baseline else 1.0)
+
+    def decide(self, limit, sample, saturated):
+        """回傳 (新上限, 原因)；sample 為 None 表示量測失敗，視為過載"""
+        reasons = []
+        if sample is None:
+            reasons.append("負載量測失敗")
+        else:
+            if sample.canary_p95_ms > self.budget_ms:
+                reasons.append(f"canary p95 {sample.canary_p95_ms:.1f}ms > {self.budget_ms:g}ms")
+            if sample.lock_waits > self.max_lock_waits:
+                reasons.append(f"{sample.lock_waits} 個應用程式連線等待鎖")
+            if sample.etl_slowdown is not None and sample.etl_slowdown > self.slowdown:
+                reasons.append(f"抽取變慢 {sample.etl_slowdown:.1f} 倍")
+
+        if reasons:
+            return max(self.minimum, int(limit * DECREASE_FACTOR)), '；'.join(reasons)
+        if saturated and limit < self.maximum:
+            return min(self.maximum, limit + INCREASE_STEP), "負載正常"
+        return limit, None
+
+    async def run(self):
+        """定期量測並調整上限，直到被 cancel"""
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, self.probe.open)
+        except Exception as e:
+            logger.warning(f"⚠️  無法連線量測負載，維持並行讀取 {self.limiter.limit}：{e}")
+            return
+        try:
+            while True:
+                await asyncio.sleep(self.interval)
+                try:
+                    sample = await loop.run_in_executor(None, self.probe.sample)
+                except Exception as e:
+                    logger.warning(f"⚠️  負載量測失敗：{e}")
+                    sample = None
+                if sample is not None and self.chunk_ratios:
+                    sample.etl_slowdown = statistics.median(self.chunk_ratios)
+                self.chunk_ratios = []
+
+                limit = self.limiter.limit
+                new_limit, reason = self.decide(limit, sample, self.limiter.saturated)
+                self.history.append({
+                    'elapsed_seconds': round(time.monotonic() - self.started, 1),
+                    'limit': new_limit,
+                    'in_flight': self.limiter.in_flight,
+                    'sample': sample.as_dict() if sample is not None else None,
+                })
+                if new_limit != limit:
+                    if new_limit < limit:
+                        self.decreases += 1
+                    icon = "🔼" if new_limit > limit else "🔽"
+                    logger.info(f"{icon} 並行讀取 {limit} → {new_limit}（{reason}）")
+                    await self.limiter.set_limit(new_limit)
+        finally:
+            self.probe.close()
+
+    def summary(self):
+        if not self.history:
+            return {'samples': 0, 'final_limit': self.limiter.limit}
+        limits = [h['limit'] for h in self.history]
+        canary = [h['sample']['canary_p95_ms'] for h in self.history if h['sample']]
+        return {
+            'samples': len(self.history),
+            'avg_limit': round(sum(limits) / len(limits), 2),
+            'max_limit': max(limits),
+            'decreases': self.decreases,
+            'max_canary_p95_ms': round(max(canary), 2) if canary else None,
+            'over_budget_samples': sum(1 for ms in canary if ms > self.budget_ms),
+        }
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+線上交易（OLTP）負載模擬
+在本機 learnhub_prod 上以多條連線重複執行類似應用程式的短查詢，並逐區間回報延遲，
+用來在沒有真實流量時測試 async_pipeline.py --adaptive 的並行控制：
+
+- read_user        ：users 主鍵查詢
+- read_enrollments ：用戶的選課紀錄（course_enrollments.user_id 索引）
+- read_payments    ：用戶最近 10 筆付款
+- update_login     ：UPDATE users.last_login 並持有列鎖 --hold-ms 後 ROLLBACK（不改變資料）
+
+每條連線為封閉迴圈（查詢 → 等待 --think-ms → 下一個查詢），連線的 application_name 為
+learnhub_oltp_sim，load_governor 會把它視為應用程式流量。
+
+用法（兩個終端機）：
+    python scripts/etl/oltp_load_simulator.py --clients 16 --duration 300
+    python scripts/etl/async_pipeline.py --adaptive --oltp-budget-ms 20 --local-dir ./data_lake
+
+    python scripts/etl/oltp_load_simulator.py --write-ratio 0.3 --hold-ms 50 --output oltp.json
+"""
+
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import threading
+from pathlib import Path
+
+import psycopg2
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from common.db import pg_config
+
+# 設定日誌
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# ============================================
+# 配置
+# ============================================
+APPLICATION_NAME = 'learnhub_oltp_sim'
+
+CLIENTS = 8
+THINK_MS = 10
+HOLD_MS = 20
+WRITE_RATIO = 0.1
+REPORT_INTERVAL = 5.0
+
+READ_QUERIES = {
+    'read_user': "SELECT user_id, email, full_name, last_login FROM users WHERE user_id = %s;",
+    'read_enrollments': """
+        SELECT course_id, progress_percentage, enrolled_at
+        FROM course_enrollments WHERE user_id = %s;
+    """,
+    'read_payments': """
+        SELECT payment_id, amount, payment_status, paid_at
+        FROM payments WHERE user_id = %s
+        ORDER BY paid_at DESC LIMIT 10;
+    """,
+}
+UPDATE_QUERY = "UPDATE users SET last_login = now() WHERE user_id = %s;"
+
+# ============================================
+# 統計
+# ============================================
+class LatencyStats:
+    """各執行緒共用的延遲紀錄；report() 取出並清空本區間的資料"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._interval = []
+        self._errors = 0
+        self.all_samples = []
+        self.total_errors = 0
+
+    def add(self, ms):
+        with self._lock:
+            self._interval.append(ms)
+
+    def error(self):
+        with self._lock:
+            self._errors += 1
+
+    def report(self):
+        with self._lock:
+            samples, errors = self._interval, self._errors
+            self._interval, self._errors = [], 0
+        self.all_samples.extend(samples)
+        self.total_errors += errors
+        return summarize(samples, errors)
+
+
+def summarize(samples, errors):
+    if not samples:
+        return {'ops': 0, 'errors': errors}
+    ordered = sorted(samples)
+    pick = lambda q: round(ordered[min(len(ordered) - 1, int(len(ordered) * q))], 2)
+    return {'ops': len(ordered), 'errors': errors, 'p50_ms': pick(0.5), 'p95_ms': pick(0.95), 'p99_ms': pick(0.99)}
+
+# ============================================
+# 用戶端
+# ============================================
+def run_client(stats, stop, user_ids, args, seed):
+    rng = random.Random(seed)
+    conn = psycopg2.connect(**dict(pg_config(), application_name=APPLICATION_NAME))
+    try:
+        with conn.cursor() as cursor:
+            while not stop.is_set():
+                user_id = rng.choice(user_ids)
+                started = time.perf_counter()
+                try:
+                    if rng.random() < args.write_ratio:
+                        cursor.execute(UPDATE_QUERY, (user_id,))
+                        time.sleep(args.hold_ms / 1000)
+                    else:
+                        cursor.execute(READ_QUERIES[rng.choice(list(READ_QUERIES))], (user_id,))
+                        cursor.fetchall()
+                    conn.rollback()
+                    stats.add((time.perf_counter() - started) * 1000)
+                except psycopg2.Error:
+                    conn.rollback()
+                    stats.error()
+                stop.wait(args.think_ms / 1000)
+    finally:
+        conn.close()
+
+
+def load_user_ids():
+    conn = psycopg2.connect(**dict(pg_config(), application_name=APPLICATION_NAME))
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT user_id FROM users ORDER BY user_id;")
+            return [row[0] for row in cursor.fetchall()]
+    finally:
+        conn.close()
+
+# ============================================
+# 主程式
+# ============================================
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='線上交易負載模擬')
+    parser.add_argument('--clients', type=int, default=CLIENTS, help='同時連線數')
+    parser.add_argument('--duration', type=float, default=60, help='執行秒數')
+    parser.add_argument('--think-ms', type=float, default=THINK_MS, help='每條連線兩次查詢之間的等待')
+    parser.add_argument('--write-ratio', type=float, default=WRITE_RATIO, help='update_login 的比例')
+    parser.add_argument('--hold-ms', type=float, default=HOLD_MS, help='update_login 持有列鎖的時間')
+    parser.add_argument('--report-interval', type=float, default=REPORT_INTERVAL)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='將各區間結果寫入 JSON 檔案')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    logger.info("=" * 60)
+    logger.info(f"OLTP 負載模擬：{args.clients} 條連線，{args.duration:g}s，寫入比例 {args.write_ratio:.0%}")
+    logger.info("=" * 60)
+
+    try:
+        user_ids = load_user_ids()
+    except psycopg2.Error as e:
+        logger.error(f"❌ 無法連線 PostgreSQL：{e}")
+        return 1
+    if not user_ids:
+        logger.error("❌ users 沒有資料，請先執行 generate_postgres_data.py")
+        return 1
+
+    stats = LatencyStats()
+    stop = threading.Event()
+    threads = [threading.Thread(target=run_client, args=(stats, stop, user_ids, args, args.seed + i),
+                                name=f"oltp-{i}", daemon=True)
+               for i in range(args.clients)]
+    for thread in threads:
+        thread.start()
+
+    intervals = []
+    started = last = time.monotonic()
+    try:
+        while time.monotonic() - started < args.duration:
+            stop.wait(min(args.report_interval, args.duration - (time.monotonic() - started)))
+            now = time.monotonic()
+            report = stats.report()
+            report['elapsed_seconds'] = round(now - started, 1)
+            report['ops_per_second'] = round(report['ops'] / (now - last), 1) if now > last else 0
+            last = now
+            intervals.append(report)
+            if report['ops']:
+                logger.info(f"  {report['elapsed_seconds']:>6.1f}s  {report['ops_per_second']:>8,.0f} ops/s  "
+                            f"p50 {report['p50_ms']:>7.2f}ms  p95 {report['p95_ms']:>7.2f}ms  "
+                            f"p99 {report['p99_ms']:>7.2f}ms  錯誤 {report['errors']}")
+            else:
+                logger.warning(f"  {report['elapsed_seconds']:>6.1f}s  沒有完成的查詢（錯誤 {report['errors']}）")
+    except KeyboardInterrupt:
+        logger.info("⏹️  中斷")
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+    total = summarize(stats.all_samples, stats.total_errors)
+    logger.info("=" * 60)
+    if total['ops']:
+        logger.info(f"📊 共 {total['ops']:,} 次查詢：p50 {total['p50_ms']}ms、p95 {total['p95_ms']}ms、"
+                    f"p99 {total['p99_ms']}ms，錯誤 {total['errors']}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'args': vars(args), 'total': total, 'intervals': intervals}, f, ensure_ascii=False, indent=2)
+        logger.info(f"📝 結果已寫入：{args.output}")
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
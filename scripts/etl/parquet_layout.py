@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Parquet 欄位版面最佳化
+- 低基數字串欄位（country、currency、payment_method…）自動轉為 Arrow dictionary 型別，
+  讀回時仍是 dictionary，下游 group by / filter 直接以整數索引運算
+  （CHECK 約束的列舉欄位已由 schema_registry 轉為固定字典，這裡不再處理）
+- 逐欄以取樣資料試寫 zstd 與 snappy，zstd 明顯較小才採用，否則保留解壓較快的 snappy
+- 回傳逐欄大小報告，估算相對於「全部 snappy、不轉 dictionary」的節省比例
+
+用法：
+    report = write_parquet(table, '/tmp/payments.parquet')
+    log_layout_report('payments', report)
+
+    python scripts/etl/parquet_layout.py data_lake/raw/payments/payments_20250112.parquet
+"""
+
+import sys
+import logging
+import argparse
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+logger = logging.getLogger(__name__)
+
+# ============================================
+# 配置
+# ============================================
+# 相異值不超過此數量、且相異值比例不超過 LOW_CARDINALITY_MAX_RATIO 的字串欄位視為低基數
+LOW_CARDINALITY_MAX_DISTINCT = 1000
+LOW_CARDINALITY_MAX_RATIO = 0.2
+
+# 試寫壓縮時取樣的筆數
+SAMPLE_ROWS = 50000
+
+ZSTD_LEVEL = 3
+# zstd 至少比 snappy 小這個比例才採用
+ZSTD_MIN_SAVING = 0.10
+
+# ============================================
+# Dictionary 編碼
+# ============================================
+def is_low_cardinality(column, num_rows):
+    """判斷字串欄位是否為低基數"""
+    if num_rows == 0:
+        return False
+    distinct = pc.count_distinct(column, mode='only_valid').as_py()
+    return distinct <= LOW_CARDINALITY_MAX_DISTINCT and distinct / num_rows <= LOW_CARDINALITY_MAX_RATIO
+
+
+def dictionary_encode_low_cardinality(table):
+    """將低基數字串欄位轉為 dictionary<int32, string>，回傳 (新 table, 轉換的欄位)"""
+    encoded = []
+    for idx, field in enumerate(table.schema):
+        if not pa.types.is_string(field.type):
+            continue
+        column = table.column(idx)
+        if is_low_cardinality(column, table.num_rows):
+            table = table.set_column(idx, field.name, pc.dictionary_encode(column))
+            encoded.append(field.name)
+    return table, encoded
+
+# ============================================
+# 逐欄壓縮選擇
+# ============================================
+def encoded_size(table, compression):
+    """將 table 寫入記憶體並回傳 Parquet 大小（含固定的 footer 開銷）"""
+    sink = pa.BufferOutputStream()
+    pq.write_table(table, sink, compression=compression,
+                   compression_level=ZSTD_LEVEL if compression == 'zstd' else None)
+    return sink.getvalue().size
+
+
+def sample_rows(table, limit=SAMPLE_ROWS):
+    """從頭、中、尾各取一段，避免只看到依主鍵排序的前段資料"""
+    if table.num_rows <= limit:
+        return table
+    part = limit // 3
+    middle = (table.num_rows - part) // 2
+    return pa.concat_tables([
+        table.slice(0, part),
+        table.slice(middle, part),
+        table.slice(table.num_rows - part, part),
+    ])
+
+
+def choose_compression(table, baseline=None):
+    """
+    以取樣資料逐欄試寫 snappy / zstd，回傳 ({欄位: 壓縮法}, 逐欄報告)
+    baseline 為轉 dictionary 前的 table，用於估算節省比例
+    """
+    sample = sample_rows(table)
+    baseline_sample = sample_rows(baseline) if baseline is not None else sample
+
+    codecs, columns = {}, []
+    for name in table.column_names:
+        single = sample.select([name])
+        snappy = encoded_size(single, 'snappy')
+        zstd = encoded_size(single, 'zstd')
+        codec = 'zstd' if zstd <= snappy * (1 - ZSTD_MIN_SAVING) else 'snappy'
+        codecs[name] = codec
+
+        before = encoded_size(baseline_sample.select([name]), 'snappy') if baseline is not None else snappy
+        columns.append({
+            'column': name,
+            'type': str(table.schema.field(name).type),
+            'codec': codec,
+            'sample_bytes_before': before,
+            'sample_bytes_after': zstd if codec == 'zstd' else snappy,
+        })
+    return codecs, columns
+
+# ============================================
+# 寫入
+# ============================================
+def optimize_layout(table, auto_dictionary=True):
+    """
+    決定欄位型別與壓縮法，回傳 (新 table, pq.write_table 參數, 報告)
+    分片輸出（同一資料表多個檔案）請用 auto_dictionary=False，避免各分片的欄位型別不一致
+    """
+    baseline = table
+    encoded = []
+    if auto_dictionary:
+        table, encoded = dictionary_encode_low_cardinality(table)
+    codecs, columns = choose_compression(table, baseline)
+
+    before = sum(c['sample_bytes_before'] for c in columns)
+    after = sum(c['sample_bytes_after'] for c in columns)
+    report = {
+        'dictionary_columns': encoded,
+        'codecs': codecs,
+        'columns': columns,
+        'estimated_saving_pct': round((1 - after / before) * 100, 1) if before else 0.0,
+    }
+    write_options = {
+        'compression': codecs,
+        'compression_level': {name: ZSTD_LEVEL for name, codec in codecs.items() if codec == 'zstd'} or None,
+    }
+    return table, write_options, report
+
+
+def write_parquet(table, path, auto_dictionary=True):
+    """以最佳化的版面寫出 Parquet，回傳報告（含實際檔案大小）"""
+    table, write_options, report = optimize_layout(table, auto_dictionary)
+    pq.write_table(table, path, **write_options)
+    return report
+
+
+def log_layout_report(table_name, report):
+    """輸出單一資料表的版面摘要"""
+    zstd_columns = [name for name, codec in report['codecs'].items() if codec == 'zstd']
+    logger.info(f"  🗜️  {table_name}：dictionary {report['dictionary_columns'] or '-'}，"
+                f"zstd {zstd_columns or '-'}，估計節省 {report['estimated_saving_pct']}%")
+
+# ============================================
+# 主程式：對既有 Parquet 檔案產生報告
+# ============================================
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Parquet 欄位版面最佳化報告')
+    parser.add_argument('paths', nargs='+', help='Parquet 檔案')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    for path in args.paths:
+        table = pq.read_table(path)
+        baseline_size = encoded_size(table, 'snappy')
+        optimized, write_options, report = optimize_layout(table)
+        sink = pa.BufferOutputStream()
+        pq.write_table(optimized, sink, **write_options)
+        optimized_size = sink.getvalue().size
+
+        print(f"\n📋 {path}（{table.num_rows:,} 筆）")
+        print(f"  {'欄位':<28} {'型別':<40} {'壓縮':<7} {'取樣前':>10} {'取樣後':>10}")
+        for c in report['columns']:
+            print(f"  {c['column']:<28} {c['type'][:40]:<40} {c['codec']:<7} "
+                  f"{c['sample_bytes_before']:>10,} {c['sample_bytes_after']:>10,}")
+        saving = (1 - optimized_size / baseline_size) * 100 if baseline_size else 0.0
+        print(f"  全部 snappy：{baseline_size / 1024 / 1024:.2f} MB → 最佳化：{optimized_size / 1024 / 1024:.2f} MB"
+              f"（節省 {saving:.1f}%）")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
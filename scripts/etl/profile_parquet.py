@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+數據品質剖析：Parquet (GCS / 本地) → 品質報告
+直接在 extract_postgres_to_gcs 產出的 Parquet 檔案上執行品質檢查，
+不再對 PostgreSQL 正式庫發送任何查詢
+"""
+
+import argparse
+import json
+import logging
+import re
+import sys
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+
+# 設定日誌
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# ============================================
+# 配置
+# ============================================
+GCS_BUCKET = 'learnhub-raw-data-2025-0112'
+GCS_PREFIX = 'raw/'
+DEFAULT_SOURCE = f"gs://{GCS_BUCKET}/{GCS_PREFIX}"
+
+# 分布統計最多列出的值數量
+TOP_N = 10
+
+# ============================================
+# 要剖析的欄位（只讀取這些欄位）
+# ============================================
+PROFILE_COLUMNS = {
+    'users': ['user_id', 'email', 'country', 'signup_date', 'is_active', 'email_verified'],
+    'subscriptions': ['subscription_id', 'user_id', 'plan_id', 'status', 'billing_cycle',
+                      'start_date', 'end_date'],
+    'payments': ['payment_id', 'subscription_id', 'user_id', 'amount', 'currency',
+                 'payment_method', 'payment_status', 'payment_gateway', 'paid_at'],
+    'course_enrollments': ['enrollment_id', 'user_id', 'course_id', 'progress_percentage',
+                           'completed_at'],
+    'courses': ['course_id', 'instructor_id', 'category_id', 'difficulty_level', 'language',
+                'price_usd', 'is_published'],
+}
+
+# ============================================
+# 參照完整性檢查：(子表, 子欄位, 父表, 父欄位)
+# ============================================
+REFERENTIAL_CHECKS = [
+    ('subscriptions', 'user_id', 'users', 'user_id'),
+    ('subscriptions', 'plan_id', 'subscription_plans', 'plan_id'),
+    ('payments', 'subscription_id', 'subscriptions', 'subscription_id'),
+    ('payments', 'user_id', 'users', 'user_id'),
+    ('course_enrollments', 'user_id', 'users', 'user_id'),
+    ('course_enrollments', 'course_id', 'courses', 'course_id'),
+    ('courses', 'instructor_id', 'instructors', 'instructor_id'),
+    ('courses', 'category_id', 'course_categories', 'category_id'),
+]
+
+# ============================================
+# 時間邏輯檢查：(資料表, 較早欄位, 較晚欄位)
+# ============================================
+TEMPORAL_CHECKS = [
+    ('subscriptions', 'start_date', 'end_date'),
+]
+
+# ============================================
+# 檔案定位
+# ============================================
+def resolve_table_files(fs, root, table_name, date_str=None):
+    """找出資料表最新（或指定日期）的 Parquet 檔案，回傳路徑列表"""
+    selector = pafs.FileSelector(f"{root}/{table_name}", allow_not_found=True)
+    pattern = re.compile(rf"^{re.escape(table_name)}_(\d{{8}}).*\.parquet$")
+
+    by_date = {}
+    for info in fs.get_file_info(selector):
+        if info.type != pafs.FileType.File:
+            continue
+        match = pattern.match(info.base_name)
+        if match:
+            by_date.setdefault(match.group(1), []).append(info.path)
+
+    if not by_date:
+        return []
+    target = date_str or max(by_date)
+    return sorted(by_date.get(target, []))
+
+
+class ParquetTable:
+    """單一資料表的 Parquet 檔案集合（延遲讀取欄位）"""
+
+    def __init__(self, fs, paths):
+        self.fs = fs
+        self.paths = paths
+        self.files = [pq.ParquetFile(fs.open_input_file(p)) for p in paths]
+        self._columns = {}
+
+    @property
+    def num_rows(self):
+        return sum(f.metadata.num_rows for f in self.files)
+
+    @property
+    def schema(self):
+        return self.files[0].schema_arrow
+
+    def column(self, name):
+        """只讀取單一欄位（所有 row group）"""
+        if name not in self._columns:
+            chunks = []
+            for f in self.files:
+                chunks.extend(f.read(columns=[name]).column(0).chunks)
+            self._columns[name] = pa.chunked_array(chunks, type=self.schema.field(name).type)
+        return self._columns[name]
+
+    def column_statistics(self, name):
+        """
+        從 row group 統計資訊取得 null 數與最小/最大值，不讀取資料頁
+        任一 row group 缺少統計資訊時回傳 None
+        """
+        null_count, minimum, maximum = 0, None, None
+        for f in self.files:
+            col_idx = f.schema_arrow.get_field_index(name)
+            for rg in range(f.metadata.num_row_groups):
+                stats = f.metadata.row_group(rg).column(col_idx).statistics
+                if stats is None or not stats.has_null_count:
+                    return None
+                null_count += stats.null_count
+                if stats.has_min_max:
+                    minimum = stats.min if minimum is None else min(minimum, stats.min)
+                    maximum = stats.max if maximum is None else max(maximum, stats.max)
+        return {'null_count': null_count, 'min': minimum, 'max': maximum}
+
+# ============================================
+# 欄位剖析
+# ============================================
+def profile_column(table, name):
+    """計算單一欄位的 null 數、相異值數與分布"""
+    total = table.num_rows
+    result = {'column': name, 'type': str(table.schema.field(name).type)}
+
+    stats = table.column_statistics(name)
+    if stats is not None:
+        result.update(null_count=stats['null_count'], min=stats['min'], max=stats['max'])
+
+    arr = table.column(name)
+    if stats is None:
+        min_max = pc.min_max(arr)
+        result.update(
+            null_count=arr.null_count,
+            min=min_max['min'].as_py(),
+            max=min_max['max'].as_py()
+        )
+
+    result['null_pct'] = round(result['null_count'] * 100.0 / total, 2) if total else 0.0
+    result['distinct_count'] = pc.count_distinct(arr, mode='only_valid').as_py()
+
+    arr_type = arr.type
+    if pa.types.is_dictionary(arr_type):
+        arr_type = arr_type.value_type
+
+    if pa.types.is_string(arr_type) or pa.types.is_large_string(arr_type) or pa.types.is_boolean(arr_type):
+        # 類別型欄位：值分布（與 verify_data 的 GROUP BY 統計相同）
+        if result['distinct_count'] <= TOP_N * 10:
+            counts = pc.value_counts(arr)
+            values = counts.field('values').to_pylist()
+            freqs = counts.field('counts').to_numpy()
+            order = np.argsort(-freqs)[:TOP_N]
+            result['distribution'] = [
+                {
+                    'value': values[i],
+                    'count': int(freqs[i]),
+                    'pct': round(float(freqs[i]) * 100.0 / total, 2) if total else 0.0
+                }
+                for i in order
+            ]
+    elif pa.types.is_integer(arr_type) or pa.types.is_floating(arr_type) or pa.types.is_decimal(arr_type):
+        numeric = pc.cast(arr, pa.float64()) if pa.types.is_decimal(arr_type) else arr
+        if len(numeric) - numeric.null_count > 0:
+            result['mean'] = pc.mean(numeric).as_py()
+            result['quantiles'] = dict(zip(
+                ['p25', 'p50', 'p75', 'p95'],
+                pc.tdigest(numeric, q=[0.25, 0.5, 0.75, 0.95]).to_pylist()
+            ))
+
+    return result
+
+# ============================================
+# 參照完整性檢查
+# ============================================
+def find_orphans(child_keys, parent_keys):
+    """
+    計算子表中找不到父表對應鍵的筆數
+    整數鍵使用 bitset（父表鍵最大值 + 1 個位元組），其他型別使用 hash 集合
+    """
+    child_keys = child_keys.drop_null()
+    parent_keys = parent_keys.drop_null()
+
+    if pa.types.is_integer(child_keys.type) and pa.types.is_integer(parent_keys.type):
+        parent = parent_keys.to_numpy().astype(np.int64, copy=False)
+        child = child_keys.to_numpy().astype(np.int64, copy=False)
+        if len(child) == 0:
+            return 0
+        if len(parent) == 0 or parent.min() < 0:
+            return int(len(child) - np.isin(child, parent).sum())
+
+        bitset = np.zeros(int(parent.max()) + 1, dtype=bool)
+        bitset[parent] = True
+        in_range = (child >= 0) & (child < len(bitset))
+        found = np.zeros(len(child), dtype=bool)
+        found[in_range] = bitset[child[in_range]]
+        return int(len(child) - found.sum())
+
+    matched = pc.is_in(child_keys, value_set=pc.unique(parent_keys))
+    return int(len(child_keys) - (pc.sum(matched).as_py() or 0))
+
+
+def check_referential(tables, child, child_col, parent, parent_col):
+    """檢查單一外鍵關係"""
+    orphans = find_orphans(tables[child].column(child_col), tables[parent].column(parent_col))
+    return {
+        'check': f"{child}.{child_col} → {parent}.{parent_col}",
+        'orphans': orphans,
+        'passed': orphans == 0
+    }
+
+
+def check_temporal(table, table_name, earlier, later):
+    """檢查較晚欄位不早於較早欄位（null 略過）"""
+    invalid = pc.sum(pc.less(table.column(later), table.column(earlier))).as_py() or 0
+    return {
+        'check': f"{table_name}.{later} >= {table_name}.{earlier}",
+        'violations': invalid,
+        'passed': invalid == 0
+    }
+
+# ============================================
+# 主程式
+# ============================================
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='在 Parquet 檔案上執行數據品質剖析')
+    parser.add_argument('--source', default=DEFAULT_SOURCE,
+                        help='Parquet 根目錄（本地路徑或 gs://bucket/prefix/）')
+    parser.add_argument('--date', help='指定抽取日期（YYYYMMDD），預設使用最新檔案')
+    parser.add_argument('--output', help='將完整報告寫入 JSON 檔案')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    logger.info("=" * 60)
+    logger.info("數據品質剖析：Parquet → 報告")
+    logger.info("=" * 60)
+
+    try:
+        fs, root = pafs.FileSystem.from_uri(args.source)
+        root = root.rstrip('/')
+
+        needed = set(PROFILE_COLUMNS)
+        for child, _, parent, _ in REFERENTIAL_CHECKS:
+            needed.update([child, parent])
+
+        tables = {}
+        for table_name in sorted(needed):
+            paths = resolve_table_files(fs, root, table_name, args.date)
+            if not paths:
+                logger.warning(f"⚠️  找不到 {table_name} 的 Parquet 檔案，略過")
+                continue
+            tables[table_name] = ParquetTable(fs, paths)
+            logger.info(f"📂 {table_name}: {len(paths)} 個檔案，{tables[table_name].num_rows:,} 筆記錄")
+
+        report = {'source': args.source, 'tables': {}, 'checks': []}
+
+        # 1. 欄位剖析
+        for table_name, columns in PROFILE_COLUMNS.items():
+            if table_name not in tables:
+                continue
+            logger.info(f"\n📊 {table_name}")
+            table = tables[table_name]
+            available = [c for c in columns if c in table.schema.names]
+            profiles = [profile_column(table, c) for c in available]
+            report['tables'][table_name] = {'rows': table.num_rows, 'columns': profiles}
+
+            for p in profiles:
+                logger.info(f"  {p['column']}: null {p['null_count']:,} ({p['null_pct']}%)，"
+                            f"相異值 {p['distinct_count']:,}")
+                for d in p.get('distribution', []):
+                    logger.info(f"    {d['value']}: {d['count']:,} ({d['pct']}%)")
+
+        # 2. 參照完整性
+        logger.info("\n✅ 數據完整性檢查：")
+        for child, child_col, parent, parent_col in REFERENTIAL_CHECKS:
+            if child not in tables or parent not in tables:
+                continue
+            result = check_referential(tables, child, child_col, parent, parent_col)
+            report['checks'].append(result)
+            logger.info(f"  {result['check']}: 孤立 {result['orphans']:,} "
+                        f"{'✅' if result['passed'] else '❌'}")
+
+        # 3. 時間邏輯
+        logger.info("\n⏰ 時間邏輯檢查：")
+        for table_name, earlier, later in TEMPORAL_CHECKS:
+            if table_name not in tables:
+                continue
+            result = check_temporal(tables[table_name], table_name, earlier, later)
+            report['checks'].append(result)
+            logger.info(f"  {result['check']}: 違規 {result['violations']:,} "
+                        f"{'✅' if result['passed'] else '❌'}")
+
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2, default=str)
+            logger.info(f"\n📝 報告已寫入：{args.output}")
+
+        failed = [c for c in report['checks'] if not c['passed']]
+        if failed:
+            logger.warning(f"⚠️  {len(failed)} 項檢查未通過")
+            return 1
+
+    except Exception as e:
+        logger.error(f"❌ 剖析失敗：{e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+PostgreSQL → Arrow 型別對照
+依 information_schema 與 CHECK 約束為每個欄位決定精確的 Arrow 型別，
+直接由 psycopg2 的 tuple 列建構 Arrow Table，不經過 pandas 的 object 欄位：
+- NUMERIC(p,s)  → decimal128(p, s)（不再轉成 float）
+- TEXT[]        → list<string>
+- CHECK (col IN (...)) 的列舉欄位 → dictionary<int8, string>（所有分片使用同一組字典）
+- TIMESTAMP     → timestamp[us]
+- JSON / JSONB  → string（以 register_json_as_text 讓 psycopg2 直接回傳原始 JSON 字串）
+- GENERATED 欄位（courses.search_en / search_zh 等搜尋向量）可由其他欄位重算，不抽取
+
+用法：
+    schema = get_table_schema(conn, 'payments')
+    with conn.cursor() as cursor:
+        register_json_as_text(cursor)
+        cursor.execute("SELECT * FROM payments;")
+        table = schema.rows_to_table(cursor.fetchall())
+
+    python scripts/etl/schema_registry.py            # 列出所有資料表的對照結果
+"""
+
+import re
+import sys
+import json
+from decimal import Decimal
+from pathlib import Path
+
+import pyarrow as pa
+import psycopg2.extras
+
+# ============================================
+# 型別對照（information_schema.columns.udt_name → Arrow）
+# ============================================
+PG_ARROW_TYPES = {
+    'int2': pa.int16(),
+    'int4': pa.int32(),
+    'int8': pa.int64(),
+    'float4': pa.float32(),
+    'float8': pa.float64(),
+    'bool': pa.bool_(),
+    'date': pa.date32(),
+    'timestamp': pa.timestamp('us'),
+    'timestamptz': pa.timestamp('us', tz='UTC'),
+    'varchar': pa.string(),
+    'bpchar': pa.string(),
+    'text': pa.string(),
+    'uuid': pa.string(),
+    'json': pa.string(),
+    'jsonb': pa.string(),
+}
+
+# 未指定精度的 NUMERIC
+DEFAULT_DECIMAL = pa.decimal128(38, 10)
+
+JSON_TYPES = ('json', 'jsonb')
+
+# CHECK 約束中的字串常值，例如 ARRAY['active'::character varying, ...]
+_CHECK_LITERAL = re.compile(r"'((?:[^']|'')*)'::")
+
+_registry = {}
+
+
+def register_json_as_text(conn_or_cursor):
+    """讓 json / jsonb 欄位回傳原始字串（省去 json.loads 再 json.dumps）；只影響該 cursor 或連線"""
+    psycopg2.extras.register_default_json(conn_or_cursor, loads=lambda value: value)
+    psycopg2.extras.register_default_jsonb(conn_or_cursor, loads=lambda value: value)
+
+# ============================================
+# 欄位 / 資料表 schema
+# ============================================
+class Column:
+    """單一欄位的 PostgreSQL 型別與對應的 Arrow 型別"""
+
+    def __init__(self, name, pg_type, arrow_type, enum_values=None):
+        self.name = name
+        self.pg_type = pg_type
+        self.enum_values = list(enum_values) if enum_values else None
+        if self.enum_values:
+            index_type = pa.int8() if len(self.enum_values) <= 127 else pa.int16()
+            arrow_type = pa.dictionary(index_type, pa.string())
+            self._enum_index = {v: i for i, v in enumerate(self.enum_values)}
+        self.arrow_type = arrow_type
+
+    @property
+    def field(self):
+        return pa.field(self.name, self.arrow_type)
+
+    def to_arrow(self, values):
+        """將一欄 Python 值轉為 Arrow 陣列"""
+        if self.enum_values:
+            try:
+                indices = [None if v is None else self._enum_index[v] for v in values]
+            except KeyError as e:
+                raise ValueError(f"{self.name} 出現不在 CHECK 約束內的值：{e.args[0]!r}") from None
+            return pa.DictionaryArray.from_arrays(
+                pa.array(indices, type=self.arrow_type.index_type),
+                pa.array(self.enum_values, type=pa.string())
+            )
+        if self.pg_type in JSON_TYPES:
+            # 未呼叫 register_json_as_text 時 psycopg2 會回傳 dict / list
+            values = [v if v is None or isinstance(v, str) else json.dumps(v, ensure_ascii=False, default=str)
+                      for v in values]
+        elif pa.types.is_string(self.arrow_type):
+            values = [v if v is None or isinstance(v, str) else str(v) for v in values]
+        elif pa.types.is_decimal(self.arrow_type):
+            values = [v if v is None or isinstance(v, Decimal) else Decimal(str(v)) for v in values]
+        return pa.array(values, type=self.arrow_type)
+
+    def __repr__(self):
+        return f"Column({self.name!r}, {self.pg_type!r} → {self.arrow_type})"
+
+
+class TableSchema:
+    """資料表的欄位對照；可被 pickle，供 ProcessPoolExecutor 的子行程使用"""
+
+    def __init__(self, table, columns):
+        self.table = table
+        self.columns = columns
+        self.arrow_schema = pa.schema([c.field for c in columns])
+
+    @property
+    def column_names(self):
+        return [c.name for c in self.columns]
+
+    def rows_to_table(self, rows):
+        """psycopg2 的 tuple 列（欄位順序同 SELECT *）→ Arrow Table"""
+        columns = list(zip(*rows)) if rows else [()] * len(self.columns)
+        arrays = [col.to_arrow(values) for col, values in zip(self.columns, columns)]
+        return pa.Table.from_arrays(arrays, schema=self.arrow_schema)
+
+# ============================================
+# 從資料庫讀取
+# ============================================
+def arrow_type_for(udt_name, numeric_precision=None, numeric_scale=None):
+    """單一 PostgreSQL 型別（udt_name）→ Arrow 型別；陣列型別以 _ 開頭"""
+    if udt_name.startswith('_'):
+        return pa.list_(arrow_type_for(udt_name[1:]))
+    if udt_name == 'numeric':
+        if numeric_precision is None:
+            return DEFAULT_DECIMAL
+        return pa.decimal128(numeric_precision, numeric_scale or 0)
+    return PG_ARROW_TYPES.get(udt_name, pa.string())
+
+
+def load_enum_columns(cursor, table_name):
+    """解析單一欄位的 CHECK (col IN (...)) 約束，回傳 {欄位: [允許值, ...]}"""
+    cursor.execute("""
+        SELECT a.attname, pg_get_constraintdef(c.oid)
+        FROM pg_constraint c
+        JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = c.conkey[1]
+        WHERE c.conrelid = %s::regclass
+          AND c.contype = 'c'
+          AND array_length(c.conkey, 1) = 1;
+    """, (table_name,))
+    enums = {}
+    for column, definition in cursor.fetchall():
+        if '= ANY' not in definition:
+            continue
+        values = [v.replace("''", "'") for v in _CHECK_LITERAL.findall(definition)]
+        if values:
+            enums[column] = values
+    return enums
+
+
+def integer_primary_key(conn, table_name):
+    """單欄整數主鍵的欄位名稱（供依主鍵範圍切分讀取）；複合或非整數主鍵回傳 None"""
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT a.attname, format_type(a.atttypid, a.atttypmod)
+            FROM pg_index i
+            JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
+            WHERE i.indrelid = %s::regclass AND i.indisprimary;
+        """, (table_name,))
+        rows = cursor.fetchall()
+    if len(rows) != 1 or rows[0][1] not in ('integer', 'bigint', 'smallint'):
+        return None
+    return rows[0][0]
+
+
+def get_table_schema(conn, table_name, refresh=False):
+    """取得資料表的 TableSchema（同一行程內快取；schema 變更後以 refresh=True 重新讀取）"""
+    if table_name in _registry and not refresh:
+        return _registry[table_name]
+
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT column_name, udt_name, numeric_precision, numeric_scale
+            FROM information_schema.columns
+            WHERE table_schema = 'public' AND table_name = %s
+              AND is_generated = 'NEVER'
+            ORDER BY ordinal_position;
+        """, (table_name,))
+        rows = cursor.fetchall()
+        if not rows:
+            raise ValueError(f"找不到資料表：{table_name}")
+        enums = load_enum_columns(cursor, table_name)
+
+    columns = []
+    for name, udt_name, precision, scale in rows:
+        columns.append(Column(name, udt_name, arrow_type_for(udt_name, precision, scale), enums.get(name)))
+
+    schema = TableSchema(table_name, columns)
+    _registry[table_name] = schema
+    return schema
+
+# ============================================
+# 主程式：列出對照結果
+# ============================================
+def main():
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+    from common.db import pg_connection, close_all
+    from extract_postgres_to_gcs import TABLES
+
+    with pg_connection() as conn:
+        for table in TABLES:
+            schema = get_table_schema(conn, table)
+            print(f"\n📋 {table}")
+            for col in schema.columns:
+                enum_note = f"  {col.enum_values}" if col.enum_values else ""
+                print(f"  {col.name:<28} {col.pg_type:<12} → {col.arrow_type}{enum_note}")
+    close_all()
+    return 0
+
+if __name__ == '__main__':
+    exit(main())
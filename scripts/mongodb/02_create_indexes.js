@@ -36,9 +36,12 @@ db.course_reviews.createIndex({ helpful_count: -1 });
 // 複合索引
 db.course_reviews.createIndex({ course_id: 1, rating: -1 });
 
-// 文字搜尋索引
+// 文字搜尋索引（英文，含詞幹）
 db.course_reviews.createIndex({ title: 'text', comment: 'text' });
 
+// 中英文搜尋詞（CJK 二字組 + 英文單字，見 scripts/common/search_text.py）
+db.course_reviews.createIndex({ search_terms: 1 });
+
 print('✅ course_reviews 索引創建完成\n');
 
 // ============================================
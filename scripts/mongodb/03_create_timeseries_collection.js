@@ -0,0 +1,42 @@
+// LearnHub MongoDB user_events 時間序列版面
+// 與 user_events 並存；設定需與 scripts/common/event_layout.py 同步
+
+db = db.getSiblingDB('learnhub_logs');
+
+print('===========================================');
+print('創建 user_events_ts 時間序列 Collection');
+print('===========================================\n');
+
+// ============================================
+// 1. user_events_ts Collection
+// meta = { user_id, device }：同一用戶、同一設備的事件壓縮在同一個 bucket
+// ============================================
+const BUCKET_SECONDS = 7 * 86400;
+
+if (db.getCollectionNames().includes('user_events_ts')) {
+    print('user_events_ts 已存在，略過創建');
+} else {
+    db.createCollection('user_events_ts', {
+        timeseries: {
+            timeField: 'timestamp',
+            metaField: 'meta',
+            bucketMaxSpanSeconds: BUCKET_SECONDS,
+            bucketRoundingSeconds: BUCKET_SECONDS
+        }
+    });
+    print('✅ user_events_ts 創建完成');
+}
+
+// ============================================
+// 2. Indexes（bucket 本身已依 meta + timestamp 排列）
+// ============================================
+db.user_events_ts.createIndex({ 'meta.user_id': 1, timestamp: -1 });
+db.user_events_ts.createIndex({ event_type: 1, timestamp: -1 });
+db.user_events_ts.createIndex({ 'properties.course_id': 1 });
+
+print('\nuser_events_ts 索引列表:');
+db.user_events_ts.getIndexes().forEach(function(idx) {
+    print(`  - ${idx.name}: ${JSON.stringify(idx.key)}`);
+});
+
+print('\n✅ 時間序列 Collection 設定完成！');
@@ -0,0 +1,96 @@
+-- LearnHub PostgreSQL 課程搜尋
+-- 課程內容為 zh-TW / zh-CN / en-US 混合：
+--   search_en ：english 設定（詞幹、停用字），供英文查詢
+--   search_zh ：CJK 連續字元展開為相鄰二字組後以 simple 設定建立，供中文查詢
+--   pg_trgm   ：title / description 的三字組索引，供子字串與拼字容錯查詢
+-- 兩個 tsvector 皆為 STORED 生成欄位，寫入時計算一次，查詢不再逐列呼叫 to_tsvector
+-- 查詢端請使用 scripts/analytics/course_search.py
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- ============================================
+-- 1. CJK 二字組展開
+-- '資料工程 with Python' → '資料 料工 工程 with Python'
+-- 非 CJK 片段保留原樣；單一 CJK 字元保留為單字
+-- 生成欄位只能呼叫 IMMUTABLE 函式；修改此函式後需重建 search_zh（見第 4 節）
+-- ============================================
+CREATE OR REPLACE FUNCTION learnhub_cjk_bigrams(input TEXT)
+RETURNS TEXT
+LANGUAGE plpgsql IMMUTABLE STRICT PARALLEL SAFE
+AS $$
+DECLARE
+    piece TEXT;
+    parts TEXT[] := '{}';
+    i INTEGER;
+BEGIN
+    FOR piece IN
+        SELECT m[1]
+        FROM regexp_matches(input, '([㐀-䶿一-鿿豈-﫿]+|[^㐀-䶿一-鿿豈-﫿]+)', 'g') AS m
+    LOOP
+        IF piece ~ '^[㐀-䶿一-鿿豈-﫿]' THEN
+            IF char_length(piece) = 1 THEN
+                parts := parts || piece;
+            ELSE
+                FOR i IN 1 .. char_length(piece) - 1 LOOP
+                    parts := parts || substr(piece, i, 2);
+                END LOOP;
+            END IF;
+        ELSE
+            parts := parts || piece;
+        END IF;
+    END LOOP;
+    RETURN array_to_string(parts, ' ');
+END;
+$$;
+
+COMMENT ON FUNCTION learnhub_cjk_bigrams(TEXT) IS 'CJK 連續字元展開為相鄰二字組（中文全文檢索用）';
+
+-- ============================================
+-- 2. courses 搜尋欄位（標題權重 A、描述權重 B）
+-- 課程的 language 標籤與實際內容不一定一致，兩個欄位對每門課程都建立
+-- ============================================
+ALTER TABLE courses ADD COLUMN IF NOT EXISTS search_en TSVECTOR
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'B')
+    ) STORED;
+
+ALTER TABLE courses ADD COLUMN IF NOT EXISTS search_zh TSVECTOR
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', learnhub_cjk_bigrams(coalesce(title, ''))), 'A') ||
+        setweight(to_tsvector('simple', learnhub_cjk_bigrams(coalesce(description, ''))), 'B')
+    ) STORED;
+
+COMMENT ON COLUMN courses.search_en IS '英文全文檢索向量（生成欄位）';
+COMMENT ON COLUMN courses.search_zh IS '中文二字組全文檢索向量（生成欄位）';
+
+-- ============================================
+-- 3. 索引
+-- ============================================
+-- 取代 02_create_indexes.sql 的 to_tsvector('english', ...) 運算式索引
+DROP INDEX IF EXISTS idx_courses_title_search;
+DROP INDEX IF EXISTS idx_courses_description_search;
+
+CREATE INDEX IF NOT EXISTS idx_courses_search_en ON courses USING gin(search_en);
+CREATE INDEX IF NOT EXISTS idx_courses_search_zh ON courses USING gin(search_zh);
+
+-- 子字串（ILIKE '%...%'）與相似度（%、<%）查詢
+CREATE INDEX IF NOT EXISTS idx_courses_title_trgm ON courses USING gin(title gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_courses_description_trgm ON courses USING gin(description gin_trgm_ops);
+
+-- ============================================
+-- 4. 修改 learnhub_cjk_bigrams 後重建 search_zh：
+--   ALTER TABLE courses DROP COLUMN search_zh;
+--   再重新執行本檔案
+-- ============================================
+
+-- ============================================
+-- 驗證
+-- ============================================
+SELECT learnhub_cjk_bigrams('資料工程 with Python 入門') AS bigrams;
+
+SELECT indexname, indexdef
+FROM pg_indexes
+WHERE schemaname = 'public' AND tablename = 'courses'
+  AND (indexname LIKE '%search%' OR indexname LIKE '%trgm%')
+ORDER BY indexname;